@@ -0,0 +1,439 @@
+import argparse
+import codecs
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from bisect import bisect_right
+from multiprocessing import Pool
+
+from recipe import default_recipe_path, load_recipe
+from task1 import AUXILIARY_MOVE_DURATION, IDLE_CLEAN_DURATION, WAFER_COUNT_CLEAN_DURATION
+from trajectory import CHUNK_HEADER, COLUMN_TYPECODES, COLUMNAR_MAGIC, format_for_path
+from validator import DWELL_LIMIT, TRANSFER_LIMIT
+
+# 轨迹流式分析：一遍扫描 MoveList（JSON/NDJSON 增量解析，列式文件内存映射），得到
+#   各模块利用率、各晶圆周期时间、各模块排队延迟分布、按原因分类的清洗开销、JIT 违例数。
+# 内存只与晶圆数有关，与动作条数无关；文件可按字节区间（文本）或数据块（列式）切分给多个进程，
+# 各分片的部分结果按文件顺序合并，与单进程结果一致。
+#
+# 约定（与 task1/task2 的输出一致）：
+#   MatID 为 "晶圆号.步骤名"，同一晶圆一步的各动作连续输出、MatID 相同；清洗动作的 MatID 为 "CLEAN.模块名"
+#   同一晶圆的各步按路线顺序输出
+
+READ_BLOCK = 1 << 20
+# 排队延迟（晶圆到达下一步的开始时间 - 上一步结束时间）直方图的区间下界（秒）
+QUEUE_BINS = (0, 1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 1800, 3600)
+CLEAN_MOVE_TYPE = 9  # 清洗主动作，前后各有一个辅助动作
+CLEAN_REASONS = {IDLE_CLEAN_DURATION: 'idle', WAFER_COUNT_CLEAN_DURATION: 'wafer_count'}
+
+_OBJECT_START = re.compile(rb'\{\s*"StartTime"')
+
+
+class TrajectoryStats:
+    # 一个分片（或整个文件）的部分统计，可按文件顺序 merge()。
+    # 每片晶圆的 JIT 状态为 (MatID, 模块, 上一步结束时间, 本次搬运的取片时间)，规则同 validator.Validator.step。
+    # 非首个分片看不到晶圆之前的历史：在遇到第一个已结束的非传输步骤之前，晶圆的各步先缓存在
+    # prefixes 中，合并时接在前一分片的状态之后重放；之后的步骤只依赖本分片内的数据，可直接统计。
+    def __init__(self, transport, head=True, dwell_limit=DWELL_LIMIT, transfer_limit=TRANSFER_LIMIT):
+        self.transport = frozenset(transport)
+        self.head = head  # 是否从文件开头读起
+        self.dwell_limit = dwell_limit
+        self.transfer_limit = transfer_limit
+        self.moves = 0
+        self.t_min = float('inf')
+        self.t_max = float('-inf')
+        self.busy = {}  # 模块 -> 占用秒数（含清洗）
+        self.slots = {}  # 模块 -> 出现过的 SlotID
+        self.queue = {}  # 模块 -> [直方图计数..., 次数, 总和, 最大值]
+        self.cleaning = {}  # 原因 -> [次数, 秒数]
+        self.cleaning_busy = {}  # 模块 -> 清洗秒数
+        self.jit = {'dwell': 0, 'transfer': 0}
+        self.states = {}
+        self.prefixes = {}
+        self.spans = {}  # 晶圆 -> [首个动作开始, 最后动作结束]
+
+    def add(self, start, end, move_type, module, mat, slot):
+        self.moves += 1
+        if start < self.t_min:
+            self.t_min = start
+        if end > self.t_max:
+            self.t_max = end
+        duration = end - start
+        self.busy[module] = self.busy.get(module, 0) + duration
+        slots = self.slots.get(module)
+        if slots is None:
+            slots = self.slots[module] = set()
+        slots.add(slot)
+
+        wafer, _, _ = mat.partition('.')
+        if wafer == 'CLEAN':
+            self.cleaning_busy[module] = self.cleaning_busy.get(module, 0) + duration
+            if move_type == CLEAN_MOVE_TYPE:
+                reason = CLEAN_REASONS.get(duration + 2 * AUXILIARY_MOVE_DURATION, 'other')
+                total = self.cleaning.setdefault(reason, [0, 0])
+                total[0] += 1
+                total[1] += duration + 2 * AUXILIARY_MOVE_DURATION
+            return
+
+        span = self.spans.get(wafer)
+        if span is None:
+            self.spans[wafer] = [start, end]
+        else:
+            if start < span[0]:
+                span[0] = start
+            if end > span[1]:
+                span[1] = end
+        self._step(wafer, mat, module, start, end)
+
+    def _step(self, wafer, mat, module, start, end):
+        state = self.states.get(wafer)
+        if state is not None:
+            self.states[wafer] = self._advance(state, mat, module, start, end)
+            return
+        prefix = self.prefixes.get(wafer)
+        if prefix is None:
+            if self.head:
+                self.states[wafer] = (mat, module, end, None)
+            else:
+                self.prefixes[wafer] = [[mat, module, start, end]]
+            return
+        last = prefix[-1]
+        if last[0] == mat:
+            if end > last[3]:
+                last[3] = end
+        elif last[1] not in self.transport:
+            # 上一步已结束且不是传输：此后的取片/驻留判断不再依赖前一分片
+            state = (last[0], last[1], last[3], None)
+            self.states[wafer] = self._advance(state, mat, module, start, end)
+        else:
+            prefix.append([mat, module, start, end])
+
+    def _advance(self, state, mat, module, start, end):
+        prev_mat, prev_module, prev_end, pickup = state
+        if mat == prev_mat:
+            return (mat, module, end if end > prev_end else prev_end, pickup)
+
+        # 新的一步：记录排队延迟，再按 Validator.step 的规则检查驻留和搬运时间
+        wait = start - prev_end
+        queue = self.queue.get(module)
+        if queue is None:
+            queue = self.queue[module] = [0] * len(QUEUE_BINS) + [0, 0, 0]
+        queue[max(bisect_right(QUEUE_BINS, wait) - 1, 0)] += 1
+        queue[-3] += 1
+        queue[-2] += wait
+        if wait > queue[-1]:
+            queue[-1] = wait
+        if prev_module not in self.transport:
+            if wait > self.dwell_limit:
+                self.jit['dwell'] += 1
+            pickup = start
+        elif module not in self.transport and pickup is not None:
+            if start - pickup > self.transfer_limit:
+                self.jit['transfer'] += 1
+        return (mat, module, end, pickup)
+
+    def merge(self, other):
+        # other 是紧随其后的分片
+        self.moves += other.moves
+        self.t_min = min(self.t_min, other.t_min)
+        self.t_max = max(self.t_max, other.t_max)
+        for module, busy in other.busy.items():
+            self.busy[module] = self.busy.get(module, 0) + busy
+        for module, slots in other.slots.items():
+            self.slots.setdefault(module, set()).update(slots)
+        for module, queue in other.queue.items():
+            mine = self.queue.get(module)
+            if mine is None:
+                self.queue[module] = list(queue)
+                continue
+            for i in range(len(mine) - 1):
+                mine[i] += queue[i]
+            mine[-1] = max(mine[-1], queue[-1])
+        for reason, (count, seconds) in other.cleaning.items():
+            total = self.cleaning.setdefault(reason, [0, 0])
+            total[0] += count
+            total[1] += seconds
+        for module, seconds in other.cleaning_busy.items():
+            self.cleaning_busy[module] = self.cleaning_busy.get(module, 0) + seconds
+        for kind, n in other.jit.items():
+            self.jit[kind] += n
+        for wafer, (first, last) in other.spans.items():
+            span = self.spans.get(wafer)
+            if span is None:
+                self.spans[wafer] = [first, last]
+            else:
+                span[0] = min(span[0], first)
+                span[1] = max(span[1], last)
+        # 先把对方缓存的开头几步接在本方状态之后重放，再采用对方分片末尾的状态
+        for wafer, prefix in other.prefixes.items():
+            for mat, module, start, end in prefix:
+                self._step(wafer, mat, module, start, end)
+        for wafer, state in other.states.items():
+            self.states[wafer] = state
+            self.prefixes.pop(wafer, None)
+        return self
+
+    def report(self, unit_slots=None):
+        unit_slots = unit_slots or {}
+        horizon = self.t_max - self.t_min if self.moves else 0
+        modules = {}
+        for module in sorted(self.busy):
+            capacity = unit_slots.get(module) or len(self.slots[module])
+            queue = self.queue.get(module)
+            entry = {
+                'slots': capacity,
+                'busy': self.busy[module],
+                'cleaning': self.cleaning_busy.get(module, 0),
+                'utilization': self.busy[module] / (capacity * horizon) if horizon > 0 else 0,
+            }
+            if queue is not None:
+                entry['queue_delay'] = queue_summary(queue)
+            modules[module] = entry
+        cycle_times = sorted(last - first for first, last in self.spans.values())
+        return {
+            'moves': self.moves,
+            'wafers': len(self.spans),
+            'start_time': self.t_min if self.moves else 0,
+            'end_time': self.t_max if self.moves else 0,
+            'modules': modules,
+            'cycle_time': distribution(cycle_times),
+            'cleaning': {reason: {'count': count, 'seconds': seconds}
+                         for reason, (count, seconds) in sorted(self.cleaning.items())},
+            'jit_violations': {**self.jit, 'dwell_limit': self.dwell_limit, 'transfer_limit': self.transfer_limit}
+        }
+
+
+def queue_summary(queue):
+    n = queue[-3]
+    labels = [f'{lo}-{hi}' for lo, hi in zip(QUEUE_BINS, QUEUE_BINS[1:])] + [f'{QUEUE_BINS[-1]}+']
+    return {
+        'count': n,
+        'mean': queue[-2] / n if n else 0,
+        'max': queue[-1],
+        'histogram': {label: c for label, c in zip(labels, queue) if c}
+    }
+
+
+def distribution(values):
+    # values 已排序
+    if not values:
+        return {'count': 0}
+
+    def pct(p):
+        return values[min(len(values) - 1, int(p * len(values)))]
+    return {'count': len(values), 'mean': sum(values) / len(values), 'min': values[0], 'max': values[-1],
+            'p50': pct(0.5), 'p90': pct(0.9), 'p99': pct(0.99)}
+
+
+def detect_format(path):
+    with open(path, 'rb') as f:
+        if f.read(len(COLUMNAR_MAGIC)) == COLUMNAR_MAGIC:
+            return 'columnar'
+    return format_for_path(path)
+
+
+# ---------- 分片 ----------
+
+def text_shards(path, fmt, num_shards):
+    # 文本格式按字节切分，边界对齐到下一条记录的开头（JSON 为 '{"StartTime"'，NDJSON 为行首）
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if fmt == 'json':
+            first = _OBJECT_START.search(mm)
+            if first is None:
+                return []
+            begin = first.start()
+        else:
+            begin = 0
+        bounds = [begin]
+        for k in range(1, num_shards):
+            pos = max(begin + (size - begin) * k // num_shards, bounds[-1])
+            if fmt == 'json':
+                m = _OBJECT_START.search(mm, pos)
+                pos = m.start() if m else size
+            else:
+                pos = mm.find(b'\n', pos - 1) + 1 or size
+            bounds.append(pos)
+        bounds.append(size)
+    return [(lo, hi) for lo, hi in zip(bounds, bounds[1:]) if hi > lo]
+
+
+def columnar_chunks(path):
+    # 扫描各块块头，返回每块的 (偏移, 行数, 字符串条目数, 字符串表字节数)
+    chunks = []
+    with open(path, 'rb') as f:
+        if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError(f"{path} 不是列式轨迹文件")
+        row_bytes = sum(struct.calcsize(tc) for _, tc in COLUMN_TYPECODES)
+        while True:
+            offset = f.tell()
+            header = f.read(CHUNK_HEADER.size)
+            if not header:
+                return chunks
+            n, m, table_size = CHUNK_HEADER.unpack(header)
+            chunks.append((offset, n, m, table_size))
+            f.seek(n * row_bytes + table_size, os.SEEK_CUR)
+
+
+def columnar_shards(path, num_shards):
+    chunks = columnar_chunks(path)
+    per_shard = -(-len(chunks) // num_shards) if chunks else 1
+    return [chunks[i:i + per_shard] for i in range(0, len(chunks), per_shard)]
+
+
+# ---------- 读取 ----------
+
+def feed_json(stats, path, lo, hi):
+    # 增量解析 [lo, hi) 中逗号分隔的动作对象；缓冲区只保留尚未解析完的尾部
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    add = stats.add
+    buf = ''
+    pos = 0
+    with open(path, 'rb') as f:
+        f.seek(lo)
+        remaining = hi - lo
+        eof = False
+        while True:
+            n = len(buf)
+            while pos < n and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < n and buf[pos] == ']':
+                return
+            if pos < n:
+                try:
+                    m, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    add(m['StartTime'], m['EndTime'], m['MoveType'], m['ModuleName'], m['MatID'], m['SlotID'])
+                    pos = end
+                    continue
+            elif eof:
+                return
+            data = f.read(min(READ_BLOCK, remaining))
+            remaining -= len(data)
+            eof = not data
+            buf = buf[pos:] + utf8.decode(data, final=eof)
+            pos = 0
+
+
+def feed_ndjson(stats, path, lo, hi):
+    add = stats.add
+    loads = json.loads
+    with open(path, 'rb') as f:
+        f.seek(lo)
+        pos = lo
+        while pos < hi:
+            line = f.readline()
+            if not line:
+                return
+            pos += len(line)
+            if line.strip():
+                m = loads(line)
+                add(m['StartTime'], m['EndTime'], m['MoveType'], m['ModuleName'], m['MatID'], m['SlotID'])
+
+
+def feed_columnar(stats, path, chunks):
+    # 内存映射后直接把各列视为定宽数组，不复制数据（大端机器上退回到 array + byteswap）
+    from array import array
+
+    add = stats.add
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        try:
+            for offset, n, m, table_size in chunks:
+                pos = offset + CHUNK_HEADER.size
+                columns = {}
+                for name, tc in COLUMN_TYPECODES:
+                    size = n * struct.calcsize(tc)
+                    if sys.byteorder == 'little':
+                        columns[name] = view[pos:pos + size].cast(tc)
+                    else:
+                        col = columns[name] = array(tc)
+                        col.frombytes(view[pos:pos + size])
+                        col.byteswap()
+                    pos += size
+                strings = []
+                for _ in range(m):
+                    (length,) = struct.unpack_from('<H', mm, pos)
+                    strings.append(bytes(view[pos + 2:pos + 2 + length]).decode('utf-8'))
+                    pos += 2 + length
+                for start, end, move_type, module, mat, slot in zip(
+                        columns['StartTime'], columns['EndTime'], columns['MoveType'],
+                        columns['ModuleName'], columns['MatID'], columns['SlotID']):
+                    add(start, end, move_type, strings[module], strings[mat], slot)
+                for col in columns.values():
+                    if isinstance(col, memoryview):
+                        col.release()
+        finally:
+            view.release()
+
+
+def analyze_shard(task):
+    path, fmt, shard, head, transport = task
+    stats = TrajectoryStats(transport, head=head)
+    if fmt == 'columnar':
+        feed_columnar(stats, path, shard)
+    elif fmt == 'ndjson':
+        feed_ndjson(stats, path, *shard)
+    else:
+        feed_json(stats, path, *shard)
+    return stats
+
+
+def analyze(path, fmt=None, jobs=1, recipe=None):
+    # recipe 提供传输模块（JIT 判断）和各模块槽位数（利用率的分母）
+    fmt = fmt or detect_format(path)
+    transport = [u for u, t in zip(recipe.unit_names, recipe.unit_transport) if t] if recipe else []
+    if fmt == 'columnar':
+        shards = columnar_shards(path, jobs)
+    else:
+        shards = text_shards(path, fmt, jobs)
+    tasks = [(path, fmt, shard, i == 0, transport) for i, shard in enumerate(shards)]
+    if not tasks:
+        stats = TrajectoryStats(transport)
+    elif jobs > 1 and len(tasks) > 1:
+        with Pool(min(jobs, len(tasks))) as pool:
+            parts = pool.map(analyze_shard, tasks)
+        stats = parts[0]
+        for part in parts[1:]:
+            stats.merge(part)
+    else:
+        stats = analyze_shard(tasks[0])
+        for task in tasks[1:]:
+            stats.merge(analyze_shard(task))
+    unit_slots = dict(zip(recipe.unit_names, recipe.unit_slots)) if recipe else None
+    return stats.report(unit_slots)
+
+
+def resolve_recipe(name):
+    # 接受配方名（recipes/ 下的文件名）或路径
+    if name is None:
+        return None
+    return load_recipe(name if os.path.exists(name) else default_recipe_path(name))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='轨迹文件流式分析：利用率、周期时间、排队延迟、清洗开销、JIT 违例')
+    parser.add_argument('path', help='task1/task2 输出的轨迹文件')
+    parser.add_argument('--format', choices=['json', 'ndjson', 'columnar'], default=None,
+                        help='文件格式，默认按文件头和扩展名判断')
+    parser.add_argument('--jobs', type=int, default=1, help='并行分片的进程数')
+    parser.add_argument('--recipe', default='task1', help='配方名或路径，用于传输模块和槽位数')
+    parser.add_argument('--output', default=None, help='结果另存为 JSON')
+    args = parser.parse_args()
+
+    report = analyze(args.path, args.format, max(1, args.jobs), resolve_recipe(args.recipe))
+    text = json.dumps(report, indent=4, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
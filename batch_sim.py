@@ -0,0 +1,166 @@
+import numpy as np
+
+import task2
+from stochastic import SCENARIO_MODELS
+
+# Compiled task2 topology: the recipe's integer unit/step tables as NumPy arrays
+RECIPE = task2.RECIPE
+NUM_UNITS = len(RECIPE.unit_names)
+MAX_SLOTS = max(RECIPE.unit_slots)
+UNIT_NUM_SLOTS = np.array(RECIPE.unit_slots, dtype=np.int64)
+UNIT_DURATION = np.array(RECIPE.unit_duration, dtype=np.float64)
+UNIT_IS_TM = np.array(RECIPE.unit_transport, dtype=bool)
+ROUTE = np.array(RECIPE.route, dtype=np.int64)
+NUM_GROUPS = len(RECIPE.step_names)
+MAX_CANDIDATES = max(len(c) for c in RECIPE.step_candidates)
+GROUP_NUM_CANDIDATES = np.array([len(c) for c in RECIPE.step_candidates], dtype=np.int64)
+GROUP_CANDIDATES = np.array([list(c) + [0] * (MAX_CANDIDATES - len(c)) for c in RECIPE.step_candidates],
+                            dtype=np.int64)
+
+# Candidate (unit, slot) cells of every step group, in SlotIndex candidate order
+MAX_CELLS = MAX_CANDIDATES * MAX_SLOTS
+GROUP_CELL_UNIT = np.zeros((NUM_GROUPS, MAX_CELLS), dtype=np.int64)
+GROUP_CELL_SLOT = np.zeros((NUM_GROUPS, MAX_CELLS), dtype=np.int64)
+GROUP_CELL_VALID = np.zeros((NUM_GROUPS, MAX_CELLS), dtype=bool)
+for _g, _candidates in enumerate(RECIPE.step_candidates):
+    _cells = [(_u, _s) for _u in _candidates for _s in range(RECIPE.unit_slots[_u])]
+    for _c, (_u, _s) in enumerate(_cells):
+        GROUP_CELL_UNIT[_g, _c], GROUP_CELL_SLOT[_g, _c], GROUP_CELL_VALID[_g, _c] = _u, _s, True
+
+TM_OVERLAP = task2.TM_OVERLAP
+
+
+def _preference_arrays(params):
+    module_pref = np.array([params['module_preference'].get(u, 0.5) for u in RECIPE.unit_names])
+    slot_pref = np.array([[params['slot_preference'].get(u, {}).get(slot + 1, 0.5) for slot in range(MAX_SLOTS)]
+                          for u in RECIPE.unit_names])
+    return module_pref, slot_pref
+
+
+def _streams(seed):
+    # Two independent seed trees: per-replica samples and per-call dispatch draws
+    return np.random.SeedSequence(seed).spawn(2)
+
+
+def sample_replicas(model, num_replicas, seed=None, num_wafers=task2.NUM_WAFERS, first_replica=0):
+    # Stacked stochastic.Samples of replicas first_replica .. first_replica + num_replicas - 1,
+    # indexed (replica, unit, k); replica r always draws from the r-th child of the sample tree,
+    # so a cell can be extended by later calls without repeating or shifting any replica
+    children = _streams(seed)[0].spawn(first_replica + num_replicas)[first_replica:]
+    samples = [model.sample(RECIPE, num_wafers, child) for child in children]
+    return (np.stack([s.duration for s in samples]), np.stack([s.fault for s in samples]),
+            samples[0].downtime)
+
+
+def run_scheduling_batch(params, num_replicas, disruption_type='none', adaptive=True, seed=None,
+                         num_wafers=task2.NUM_WAFERS, stochastic=None, first_replica=0):
+    # Advance num_replicas independent run_scheduling replicas in lockstep. Every iteration
+    # pops the earliest event of each replica (ties go to the lowest wafer id, as in the heap),
+    # and dispatch draws are made for all replicas at once. Durations and faults are pre-sampled
+    # per replica from the scenario's model (or `stochastic`) and indexed by per-unit move counts.
+    # first_replica selects which replicas of the seed this call runs (see sample_replicas).
+    rng = np.random.default_rng(_streams(seed)[1].spawn(first_replica + 1)[first_replica])
+    K, W, U, S = num_replicas, num_wafers, NUM_UNITS, MAX_SLOTS
+    route_len = len(ROUTE)
+    model = stochastic if stochastic is not None else SCENARIO_MODELS.get(disruption_type)
+    sampled = model is not None
+    if sampled:
+        sampled_duration, sampled_fault, downtime = sample_replicas(model, K, seed, W, first_replica)
+        faults = sampled_fault.any()
+        move_count = np.zeros((K, U), dtype=np.int64)
+    else:
+        faults = False
+    if adaptive:
+        module_pref, slot_pref = _preference_arrays(params)
+
+    avail = np.zeros(K * U * S)
+    qlen = np.zeros(K * U * S, dtype=np.int64)
+    qmax = np.zeros(K * U * S, dtype=np.int64)
+    last_tm = np.zeros(K * U)
+    ev_time = np.full((K, W), np.inf)
+    ev_cell = np.zeros((K, W), dtype=np.int64)  # flat (replica, unit, slot) index of the pending event
+    ev_fault = np.zeros((K, W), dtype=bool)  # the pending event's step drew a fault
+    pos = np.zeros((K, W), dtype=np.int64)
+    makespan = np.zeros(K)
+    replicas = np.arange(K)
+
+    def dispatch(k, w, current_time):
+        # k: replica indices, w: wafer index per replica, current_time: ready time per replica
+        group = ROUTE[pos[k, w]]
+        pos[k, w] += 1
+        if adaptive:
+            # Same rule as dispatch.SlotIndex: earliest effective start, then best load score,
+            # then candidate order, evaluated over each replica's candidate cells at once
+            cell_unit = GROUP_CELL_UNIT[group]
+            cell_slot = GROUP_CELL_SLOT[group]
+            unit_base = k[:, None] * U + cell_unit
+            effective = np.maximum(avail[unit_base * S + cell_slot], current_time[:, None])
+            effective[~GROUP_CELL_VALID[group]] = np.inf
+            load = qlen.reshape(K * U, S)[unit_base].sum(axis=2)
+            score = module_pref[cell_unit] * (1 - load / 10) + slot_pref[cell_unit, cell_slot]
+            score = np.where(effective == effective.min(axis=1, keepdims=True), score, -np.inf)
+            choice = score.argmax(axis=1)
+            rows = np.arange(len(k))
+            unit = cell_unit[rows, choice]
+            slot = cell_slot[rows, choice]
+        else:
+            unit = GROUP_CANDIDATES[group, (rng.random(len(k)) * GROUP_NUM_CANDIDATES[group]).astype(np.int64)]
+            slot = (rng.random(len(k)) * UNIT_NUM_SLOTS[unit]).astype(np.int64)
+        cell = (k * U + unit) * S + slot
+        qlen[cell] += 1
+        qmax[cell] = np.maximum(qmax[cell], qlen[cell])
+
+        if sampled:
+            count = move_count[k, unit]
+            move_count[k, unit] = count + 1
+            duration = sampled_duration[k, unit, count]
+            ev_fault[k, w] = sampled_fault[k, unit, count]
+        else:
+            duration = UNIT_DURATION[unit]
+        start = np.maximum(current_time, avail[cell])
+        tm = UNIT_IS_TM[unit]
+        if tm.any():
+            tm_cell = k[tm] * U + unit[tm]
+            start[tm] = np.maximum(start[tm], last_tm[tm_cell] - TM_OVERLAP)
+            last_tm[tm_cell] = start[tm] + duration[tm]
+        end = start + duration
+        avail[cell] = end
+        ev_time[k, w] = end
+        ev_cell[k, w] = cell
+
+    # Initial task allocation, wafer by wafer in every replica
+    for i in range(W):
+        dispatch(replicas, np.full(K, i), np.zeros(K))
+
+    while True:
+        w = ev_time.argmin(axis=1)
+        t = ev_time[replicas, w]
+        live = np.isfinite(t)
+        if not live.any():
+            break
+        k = replicas[live]
+        w = w[live]
+        t = t[live]
+        makespan[k] = np.maximum(makespan[k], t)
+        cell = ev_cell[k, w]
+        qlen[cell] -= 1
+        ev_time[k, w] = np.inf
+
+        if faults:
+            hit = ev_fault[k, w]
+            if hit.any():
+                fault_cell = cell[hit]
+                # As task2.handle_disruption: bookings already on the slot keep their times
+                avail[fault_cell] = np.maximum(avail[fault_cell], t[hit] + downtime[(fault_cell // S) % U])
+                keep = ~hit
+                k, w, t = k[keep], w[keep], t[keep]
+
+        more = pos[k, w] < route_len
+        if more.any():
+            dispatch(k[more], w[more], t[more])
+
+    return {
+        'makespan': makespan,
+        'num_conflicts': np.zeros(K, dtype=np.int64),
+        'load_balance': qmax.reshape(K, U * S).sum(axis=1)
+    }
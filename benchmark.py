@@ -0,0 +1,280 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+from task1 import Task1Simulator
+
+TASK1_SIZES = [75, 1000, 10000, 50000]
+TASK2_REPLICAS = 1000
+
+# 扩展性基准套件：task1 事件循环与 task2 run_scheduling 在各晶圆数、四种干扰场景、
+# 静态/自适应分派下的吞吐量，与仓库中的基线比较
+SUITE_SIZES = [75, 1000, 10000, 100000]
+QUICK_SIZES = [75, 1000]
+SUITE_SCENARIOS = ['none', 'fault', 'time_variation', 'mixed']
+SUITE_MODES = ['static', 'adaptive']
+MAX_OUTPUT_WAFERS = 10000  # 更大规模只跑纯指标模式，避免写出 GB 级轨迹文件
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'baseline.json')
+DEFAULT_TOLERANCE = 0.2
+
+
+def bench_task1(sizes=TASK1_SIZES, repeat=1):
+    # 关闭轨迹记录，只测事件循环本身；同一个引擎对象在各规模间复用
+    sim = Task1Simulator(record=False)
+    results = []
+    for n in sizes:
+        sim.num_wafers = n
+        best = float('inf')
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            makespan = sim.run()
+            best = min(best, time.perf_counter() - t0)
+        results.append({
+            'num_wafers': n,
+            'events': sim.events_processed,
+            'wall_time': best,
+            'events_per_sec': sim.events_processed / best if best > 0 else 0,
+            'makespan': makespan
+        })
+    return results
+
+
+def bench_task2_replicas(num_replicas=TASK2_REPLICAS, scenario='fault', adaptive=False, scalar_sample=50):
+    # 比较逐个 run_scheduling 与批量向量化引擎的重复次数/秒。
+    # 抽样单独计时：每个重复的每个模块都由各自的 SeedSequence 子序列建一个生成器（公共随机数），
+    # 这部分无法跨重复向量化，是随机场景下加速比的上限所在
+    import task2
+    from batch_sim import run_scheduling_batch, sample_replicas
+    from stochastic import SCENARIO_MODELS
+
+    t0 = time.perf_counter()
+    for seed in range(scalar_sample):
+        task2.run_scheduling(task2.default_params, [], task2.step_units, task2.step_durations, scenario,
+                             adaptive, metrics_only=True, seed=seed)
+    scalar_rate = scalar_sample / (time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    run_scheduling_batch(task2.default_params, num_replicas, scenario, adaptive, seed=0)
+    batch_rate = num_replicas / (time.perf_counter() - t0)
+
+    sampling = 0.0
+    if SCENARIO_MODELS.get(scenario) is not None:
+        t0 = time.perf_counter()
+        sample_replicas(SCENARIO_MODELS[scenario], num_replicas, seed=0)
+        sampling = time.perf_counter() - t0
+    return {
+        'scenario': scenario,
+        'adaptive': adaptive,
+        'num_replicas': num_replicas,
+        'scalar_replicas_per_sec': scalar_rate,
+        'batch_replicas_per_sec': batch_rate,
+        'speedup': batch_rate / scalar_rate,
+        'batch_sampling_share': sampling * batch_rate / num_replicas
+    }
+
+
+def bench_dispatch(sizes=(2, 8, 32, 128), decisions=20000, slots_per_unit=2):
+    # 对比 SlotIndex 与逐个候选线性扫描在 n 个并行模块上的单次分派耗时（微秒）
+    import random
+    from dispatch import SlotIndex
+
+    results = []
+    for n in sizes:
+        names = [f'PM{i}' for i in range(n)]
+        unit_slots = {u: {s: 0 for s in range(1, slots_per_unit + 1)} for u in names}
+        index = SlotIndex({'PM': names}, unit_slots, dict.fromkeys(names, 0.5),
+                          {(u, s): 0.5 for u in names for s in unit_slots[u]})
+        available = {(u, s): 0 for u in names for s in unit_slots[u]}
+        order = list(available)
+
+        rng = random.Random(0)
+        now = 0
+        t0 = time.perf_counter()
+        for _ in range(decisions):
+            now += rng.random() * 10
+            unit, slot = index.select('PM', now)
+            index.update(unit, slot, max(now, index.available[unit, slot]) + 70)
+        indexed = (time.perf_counter() - t0) / decisions * 1e6
+
+        rng = random.Random(0)
+        now = 0
+        t0 = time.perf_counter()
+        for _ in range(decisions):
+            now += rng.random() * 10
+            best = min(range(len(order)), key=lambda i: (max(available[order[i]], now), i))
+            unit, slot = order[best]
+            available[unit, slot] = max(now, available[unit, slot]) + 70
+        linear = (time.perf_counter() - t0) / decisions * 1e6
+        results.append({'units': n, 'slots': n * slots_per_unit, 'indexed_us': indexed, 'linear_us': linear})
+    return results
+
+
+def suite_cases(sizes=SUITE_SIZES, scenarios=SUITE_SCENARIOS, modes=SUITE_MODES, output_format='columnar',
+                max_output_wafers=MAX_OUTPUT_WAFERS):
+    cases = []
+    for n in sizes:
+        fmt = output_format if n <= max_output_wafers else None
+        cases.append({'key': f'task1/{n}', 'engine': 'task1', 'num_wafers': n, 'format': fmt})
+        for scenario in scenarios:
+            for mode in modes:
+                cases.append({'key': f'task2/{scenario}/{mode}/{n}', 'engine': 'task2', 'num_wafers': n,
+                              'scenario': scenario, 'adaptive': mode == 'adaptive', 'format': fmt})
+    return cases
+
+
+def _peak_rss():
+    # ru_maxrss 在 Linux 上以 KB 为单位，在 macOS 上以字节为单位
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_case(case):
+    # 在独立的子进程中运行（见 run_suite），峰值 RSS 只反映该用例
+    from trajectory import FORMAT_EXTENSIONS, open_sink
+
+    n = case['num_wafers']
+    fmt = case['format']
+    repeat = max(1, min(5, 20000 // n))  # 小规模取多次最优，减小计时噪声
+    best = float('inf')
+    output_bytes = None
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'trajectory' + FORMAT_EXTENSIONS[fmt]) if fmt else None
+        for _ in range(repeat):
+            sink = open_sink(path, fmt) if fmt else None
+            t0 = time.perf_counter()
+            if case['engine'] == 'task1':
+                # 轨迹直接流式写入 sink，不在内存中保留路径和占用区间
+                sim = Task1Simulator(num_wafers=n, record=False)
+                makespan = sim.run(sink)
+                events = sim.events_processed
+            else:
+                import task2
+                result = task2.run_scheduling(task2.default_params, [], task2.step_units, task2.step_durations,
+                                              case['scenario'], case['adaptive'], sink=sink,
+                                              metrics_only=sink is None, seed=0, num_wafers=n)
+                makespan, events = result['makespan'], result['events']
+            if sink is not None:
+                sink.close()
+            best = min(best, time.perf_counter() - t0)
+            if path is not None:
+                output_bytes = os.path.getsize(path)
+    return {
+        **case,
+        'events': events,
+        'wall_time': best,
+        'events_per_sec': events / best if best > 0 else 0,
+        'peak_rss': _peak_rss(),
+        'output_bytes': output_bytes,
+        'makespan': makespan
+    }
+
+
+def run_suite(cases, progress=True):
+    # 每个用例一个全新的 spawn 子进程，峰值 RSS 互不影响
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    for case in cases:
+        with ctx.Pool(1) as pool:
+            result = pool.apply(run_case, (case,))
+        results.append(result)
+        if progress:
+            print(f"{result['key']:<32} {result['events_per_sec']:>12.0f} 事件/秒 {result['wall_time']:>9.3f} 秒 "
+                  f"{result['peak_rss'] / 2 ** 20:>8.1f} MB", file=sys.stderr)
+    return results
+
+
+def machine_info():
+    return {'platform': platform.platform(), 'python': platform.python_version(),
+            'processor': platform.processor() or platform.machine(), 'cpu_count': os.cpu_count()}
+
+
+def compare_to_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    # 与基线中同名用例比较：吞吐量下降、峰值 RSS 或输出大小增长超过 tolerance 即视为回归。
+    # 随机场景的输出大小取决于抽样结果（故障晶圆离开批次、工时的浮点位数），抽样方式一变就会变化，
+    # 因此输出大小只对确定性用例（task1 与 'none' 场景）检查
+    base = {r['key']: r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        b = base.get(r['key'])
+        if b is None:
+            continue
+        # 吞吐量越低越差，峰值 RSS 和输出大小越高越差
+        deterministic = r.get('scenario', 'none') == 'none'
+        for metric, sign in (('events_per_sec', -1), ('peak_rss', 1), ('output_bytes', 1)):
+            if metric == 'output_bytes' and not deterministic:
+                continue
+            old, new = b.get(metric), r.get(metric)
+            if not old or new is None:
+                continue
+            change = new / old - 1
+            if change * sign > tolerance:
+                regressions.append({'key': r['key'], 'metric': metric, 'baseline': old, 'current': new,
+                                    'change': change})
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Task1 事件循环吞吐量基准')
+    parser.add_argument('--sizes', type=int, nargs='+', default=None)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    parser.add_argument('--replicas', type=int, default=0,
+                        help='改为测量 task2 批量引擎在该重复数下的吞吐量')
+    parser.add_argument('--dispatch', action='store_true', help='改为测量分派器随并行模块数的扩展性')
+    parser.add_argument('--suite', action='store_true',
+                        help='运行扩展性基准套件（task1 与 task2 × 场景 × 分派模式 × 晶圆数）并与基线比较')
+    parser.add_argument('--quick', action='store_true', help=f'套件只跑 {QUICK_SIZES} 片晶圆')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='基线文件路径')
+    parser.add_argument('--update-baseline', action='store_true', help='用本次套件结果覆盖基线文件')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='允许的相对退化比例，超过即报告回归并以非零状态退出')
+    parser.add_argument('--output', default=None, help='套件结果另存为 JSON')
+    args = parser.parse_args()
+
+    if args.dispatch:
+        print(json.dumps(bench_dispatch(), indent=4))
+        raise SystemExit
+    if args.replicas:
+        print(json.dumps(bench_task2_replicas(args.replicas), indent=4))
+        raise SystemExit
+    if args.suite:
+        sizes = args.sizes or (QUICK_SIZES if args.quick else SUITE_SIZES)
+        report = {'machine': machine_info(), 'results': run_suite(suite_cases(sizes))}
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=4)
+        if args.update_baseline:
+            os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+            with open(args.baseline, 'w') as f:
+                json.dump(report, f, indent=4)
+            print(f"基线已写入 {args.baseline}")
+            raise SystemExit
+        if not os.path.exists(args.baseline):
+            print(f"未找到基线文件 {args.baseline}，跳过比较")
+            raise SystemExit
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('machine') != report['machine']:
+            print("注意：基线来自不同的机器或 Python 版本，比较结果仅供参考")
+        regressions = compare_to_baseline(report['results'], baseline, args.tolerance)
+        if regressions:
+            print(f"{'用例':<32} {'指标':<16} {'基线':>14} {'本次':>14} {'变化':>8}")
+            for r in regressions:
+                print(f"{r['key']:<32} {r['metric']:<16} {r['baseline']:>14.0f} {r['current']:>14.0f} {r['change']:>+8.1%}")
+            raise SystemExit(1)
+        print(f"与基线相比无回归（容差 {args.tolerance:.0%}）")
+        raise SystemExit
+
+    results = bench_task1(args.sizes or TASK1_SIZES, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=4))
+    else:
+        print(f"{'晶圆数':>8} {'事件数':>10} {'耗时(秒)':>10} {'事件/秒':>12}")
+        for r in results:
+            print(f"{r['num_wafers']:>8} {r['events']:>10} {r['wall_time']:>10.3f} {r['events_per_sec']:>12.0f}")
@@ -0,0 +1,69 @@
+import math
+
+# Analytical makespan lower bounds from a compiled recipe (no simulation). For every unit and
+# every multi-unit candidate group S of the route:
+#   head(S) + work(S) / slots(S) + cleaning(S) + tail(S)
+# where work(S) is the processing time of all steps that must run on S (their candidates are a
+# subset of S), head(S)/tail(S) the shortest single-wafer time before the first and after the
+# last such step, and cleaning(S) the count-based cleanings that cannot be avoided on a unit
+# that needs them. A transfer robot whose consecutive actions may only overlap by
+# `transport_overlap` seconds (task2) also gets a serialization bound. The bound of the whole
+# lot is the largest of these, the single-wafer critical path and, with interval release,
+# the release time of the last wafer plus the critical path.
+
+
+def step_time(recipe, step):
+    # Shortest processing time of a step over its candidate units
+    duration = recipe.step_duration[step]
+    if not math.isnan(duration):
+        return duration
+    return min(recipe.unit_duration[u] for u in recipe.step_candidates[step])
+
+
+def makespan_lower_bound(recipe, num_wafers, release_interval=0, transport_overlap=None,
+                         cleaning_threshold=None, cleaning_duration=0):
+    route = recipe.route.tolist()
+    times = [step_time(recipe, step) for step in route]
+    critical_path = sum(times)
+    names = recipe.unit_names
+
+    groups = {frozenset([u]) for u in range(len(names))}
+    groups.update(frozenset(recipe.step_candidates[step]) for step in set(route))
+    resources = {}
+    for group in groups:
+        positions = [pos for pos, step in enumerate(route) if group.issuperset(recipe.step_candidates[step])]
+        if not positions:
+            continue
+        head = sum(times[:positions[0]])
+        tail = sum(times[positions[-1] + 1:])
+        per_wafer = sum(times[pos] for pos in positions)
+        bound = head + num_wafers * per_wafer / sum(recipe.unit_slots[u] for u in group) + tail
+        if len(group) == 1:
+            (unit,) = group
+            actions = num_wafers * len(positions)
+            if cleaning_threshold and recipe.unit_cleaning[unit]:
+                # A cleaning runs before the (threshold + 1)-th wafer of each run of `threshold`
+                bound += (actions - 1) // cleaning_threshold * cleaning_duration
+            if transport_overlap is not None and recipe.unit_transport[unit]:
+                duration = min(times[pos] for pos in positions)
+                if duration > transport_overlap:
+                    bound = max(bound, head + (actions - 1) * (duration - transport_overlap) + duration + tail)
+        resources['/'.join(names[u] for u in sorted(group))] = bound
+
+    candidates = dict(resources, critical_path=critical_path)
+    if release_interval:
+        candidates['release'] = (num_wafers - 1) * release_interval + critical_path
+    bottleneck = max(candidates, key=candidates.get)
+    return {
+        'lower_bound': candidates[bottleneck],
+        'bottleneck': bottleneck,
+        'critical_path': critical_path,
+        'resources': dict(sorted(resources.items(), key=lambda kv: -kv[1]))
+    }
+
+
+def optimality_gap(makespan, lower_bound):
+    # Relative distance to the bound; 0 means provably optimal
+    if not lower_bound or math.isinf(makespan):
+        return math.inf
+    return makespan / lower_bound - 1
@@ -0,0 +1,102 @@
+from heapq import heapify, heappop, heappush
+
+
+class SlotIndex:
+    # Priority index over the candidate (unit, slot) pairs of every step group.
+    # The best slot for a step is the one with the earliest effective start
+    # max(available_time, now), ties broken by load score, then by candidate order.
+    # Each group keeps two heaps with lazy deletion:
+    #   busy: (available_time, -score, order, version, unit, slot)
+    #   free: (-score, order, version, unit, slot) for slots already available at `now`
+    # Every change to a slot's availability or its unit's load pushes a fresh entry under a
+    # new version (O(log n) per group the unit belongs to); stale entries are skipped when
+    # they reach the top. `now` must not decrease between select() calls.
+    # Units and slots are opaque keys (task2 passes compiled integer IDs):
+    #   step_units: {step: [unit, ...]}, unit_slots: {unit: {slot: available_time}},
+    #   module_pref: {unit: weight}, slot_pref: {(unit, slot): weight}
+    def __init__(self, step_units, unit_slots, module_pref, slot_pref):
+        self.unit_slots = {unit: list(slots) for unit, slots in unit_slots.items()}
+        self.available = {}
+        self.load = {unit: 0 for unit in unit_slots}
+        self.version = {}
+        self.groups = {}
+        self.members = {unit: [] for unit in unit_slots}
+        self.order = {}
+        self.candidates = {}
+        self.module_pref = module_pref
+        self.slot_pref = slot_pref
+        for step, candidates in step_units.items():
+            self.groups[step] = ([], [])
+            self.candidates[step] = [(unit, slot) for unit in candidates for slot in self.unit_slots[unit]]
+            for order, (unit, slot) in enumerate(self.candidates[step]):
+                self.order[step, unit, slot] = order
+            # Groups with a single candidate need no index
+            if len(self.candidates[step]) > 1:
+                for unit in candidates:
+                    self.members[unit].append(step)
+        for unit, slots in unit_slots.items():
+            for slot, available_time in slots.items():
+                self.available[unit, slot] = available_time
+                self.version[unit, slot] = 0
+                self._push(unit, slot)
+
+    def score(self, unit, slot):
+        return self.module_pref[unit] * (1 - self.load[unit] / 10) + self.slot_pref[unit, slot]
+
+    def _push(self, unit, slot):
+        ver = self.version[unit, slot] + 1
+        self.version[unit, slot] = ver
+        available = self.available[unit, slot]
+        neg_score = -self.score(unit, slot)
+        for step in self.members[unit]:
+            busy, free = self.groups[step]
+            heappush(busy, (available, neg_score, self.order[step, unit, slot], ver, unit, slot))
+            if len(busy) + len(free) > 8 * len(self.candidates[step]) + 64:
+                self._compact(step)
+
+    def _compact(self, step):
+        # Drop all stale entries of one group by rebuilding its heaps from current state
+        busy = [(self.available[unit, slot], -self.score(unit, slot), order, self.version[unit, slot], unit, slot)
+                for order, (unit, slot) in enumerate(self.candidates[step])]
+        heapify(busy)
+        self.groups[step] = (busy, [])
+
+    def update(self, unit, slot=None, available_time=None, load=None):
+        # Record a new available_time for (unit, slot) and/or a new queued-wafer count for unit
+        if not self.members[unit]:
+            if available_time is not None:
+                self.available[unit, slot] = available_time
+            if load is not None:
+                self.load[unit] = load
+            return
+        if load is not None and load != self.load[unit]:
+            self.load[unit] = load
+            if available_time is not None:
+                self.available[unit, slot] = available_time
+            for s in self.unit_slots[unit]:
+                self._push(unit, s)
+        elif available_time is not None and available_time != self.available[unit, slot]:
+            self.available[unit, slot] = available_time
+            self._push(unit, slot)
+
+    def select(self, step, now):
+        candidates = self.candidates[step]
+        if len(candidates) == 1:
+            return candidates[0]
+        busy, free = self.groups[step]
+        version = self.version
+        while busy and busy[0][0] <= now:
+            _, neg_score, order, ver, unit, slot = heappop(busy)
+            if version[unit, slot] == ver:
+                heappush(free, (neg_score, order, ver, unit, slot))
+        while free:
+            _, _, ver, unit, slot = free[0]
+            if version[unit, slot] == ver:
+                return unit, slot
+            heappop(free)
+        while busy:
+            _, _, _, ver, unit, slot = busy[0]
+            if version[unit, slot] == ver:
+                return unit, slot
+            heappop(busy)
+        return None, None
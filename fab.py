@@ -0,0 +1,285 @@
+import argparse
+import json
+import random
+import time
+from multiprocessing import Pool, RawArray
+
+import numpy as np
+
+import task1
+import task2
+from bounds import makespan_lower_bound
+from trajectory import FORMAT_EXTENSIONS, MoveSink, open_sink
+
+# Fab-level driver: many cluster tools, many lots arriving over a shift.
+#   tools: [{'name': 'T2-1', 'recipe': 'task2'}, ...]
+#   lots:  [{'name': 'L001', 'recipe': 'task2', 'size': 25, 'release': 0.0,
+#            'scenario': 'none', 'adaptive': True, 'seed': 7, 'tool': 'T2-1'}, ...]
+# ('scenario', 'adaptive', 'seed' and 'tool' are optional). Lots without a tool go to the
+# compatible tool expected to free up first, using the analytical makespan bound of every lot
+# (bounds.py) as its duration estimate. A tool runs its lots one at a time in release order;
+# each lot starts at max(release, end of the previous lot) on an empty tool, as the engines do.
+#
+# Tools are simulated in parallel, one pool task per tool. Every tool writes its moves straight
+# into its own region of one shared-memory buffer (a RawArray viewed as a NumPy structured
+# array), so only per-lot metrics and tiny name tables travel back through the pool. The parent
+# then merges all regions by start time with one vectorized sort.
+
+ENGINES = ('task1', 'task2')
+SHIFT = 8 * 3600
+
+MOVE_DTYPE = np.dtype([('start', 'f8'), ('end', 'f8'), ('move_id', 'i8'), ('tool', 'i4'), ('lot', 'i4'),
+                       ('wafer', 'i4'), ('step', 'i4'), ('module', 'i4'), ('move_type', 'i2'), ('slot', 'i2')])
+
+
+def moves_per_wafer(recipe_name):
+    # Upper bound on moves one wafer can produce, to size its share of the shared buffer
+    if recipe_name == 'task1':
+        route = task1.RECIPE.route.tolist()
+        cleaning_visits = sum(task1.RECIPE.unit_cleaning[task1.RECIPE.step_candidates[s][0]] for s in route)
+        return (sum(task1.MOVE_TEMPLATES[s].size for s in route)
+                + 2 * cleaning_visits * task1.CLEANING_TEMPLATE.size)  # idle and count cleaning per visit
+    return len(task2.RECIPE.route)
+
+
+def estimated_duration(lot):
+    recipe = task1.RECIPE if lot['recipe'] == 'task1' else task2.RECIPE
+    if lot['recipe'] == 'task1':
+        return makespan_lower_bound(recipe, lot['size'], cleaning_threshold=task1.WAFER_COUNT_THRESHOLD,
+                                    cleaning_duration=task1.WAFER_COUNT_CLEAN_DURATION)['lower_bound']
+    return makespan_lower_bound(recipe, lot['size'], transport_overlap=task2.TM_OVERLAP)['lower_bound']
+
+
+def assign_lots(tools, lots):
+    # {tool index: [lot index, ...]} in release order
+    index = {tool['name']: t for t, tool in enumerate(tools)}
+    free = [0.0] * len(tools)
+    plan = {t: [] for t in range(len(tools))}
+    for i in sorted(range(len(lots)), key=lambda i: (lots[i]['release'], i)):
+        lot = lots[i]
+        if lot.get('tool') is not None:
+            t = index[lot['tool']]
+        else:
+            compatible = [t for t, tool in enumerate(tools) if tool['recipe'] == lot['recipe']]
+            if not compatible:
+                raise ValueError(f"no tool runs recipe {lot['recipe']!r} (lot {lot['name']})")
+            t = min(compatible, key=lambda t: (max(free[t], lot['release']), t))
+        free[t] = max(free[t], lot['release']) + estimated_duration(lot)
+        plan[t].append(i)
+    return plan
+
+
+class SharedSink(MoveSink):
+    # Writes moves of one tool into its slice of the shared buffer. MatID "wafer.step" is stored
+    # as a wafer number and an interned step name; IDs without a wafer number (cleanings) keep
+    # wafer 0 and the whole ID as the step name.
+    def __init__(self, rows, tool):
+        self.rows = rows
+        self.tool = tool
+        self.count = 0
+        self.lot = 0
+        self.offset = 0.0
+        self.modules = {}
+        self.steps = {}
+
+    def _intern(self, table, name):
+        idx = table.get(name)
+        if idx is None:
+            idx = table[name] = len(table)
+        return idx
+
+    def add(self, start_time, end_time, move_id, move_type, module, mat_id, slot_id):
+        if self.count >= len(self.rows):
+            raise OverflowError(f"tool {self.tool}: more moves than its {len(self.rows)} reserved rows")
+        wafer, _, step = mat_id.partition('.')
+        if wafer.isdigit():
+            wafer = int(wafer)
+        else:
+            wafer, step = 0, mat_id
+        self.rows[self.count] = (start_time + self.offset, end_time + self.offset, move_id, self.tool, self.lot,
+                                 wafer, self._intern(self.steps, step), self._intern(self.modules, module),
+                                 move_type, slot_id)
+        self.count += 1
+
+
+def _run_lot(lot, sink):
+    # Simulate one lot on an empty tool; returns its makespan and engine metrics
+    if lot['recipe'] == 'task1':
+        sim = task1.Task1Simulator(num_wafers=lot['size'], record=False)
+        makespan = sim.run(sink)
+        return makespan, {'cleanings': len(sim.cleaning_log)}
+    result = task2.run_scheduling(task2.default_params, [], task2.step_units, task2.step_durations,
+                                  lot.get('scenario', 'none'), lot.get('adaptive', True), sink=sink,
+                                  seed=lot.get('seed'), num_wafers=lot['size'])
+    return result['makespan'], {k: result[k] for k in ('num_conflicts', 'load_balance', 'gap') if k in result}
+
+
+_buffer = None
+
+
+def _attach(buffer):
+    # Pool initializer: the shared buffer is inherited (fork) or handed over once (spawn)
+    global _buffer
+    _buffer = np.frombuffer(buffer, dtype=MOVE_DTYPE)
+
+
+def run_tool(args):
+    # Pool worker: all lots of one tool, back to back, written into rows [first, first + capacity)
+    t, lots, first, capacity = args
+    sink = SharedSink(_buffer[first:first + capacity], t)
+    t0 = time.perf_counter()
+    free = 0.0
+    metrics = []
+    for i, lot in lots:
+        start = max(free, lot['release'])
+        sink.lot, sink.offset = i, start
+        moves = sink.count
+        makespan, extra = _run_lot(lot, sink)
+        if not np.isfinite(makespan):
+            raise RuntimeError(f"lot {lot['name']} failed on tool {t}")
+        free = start + makespan
+        metrics.append(dict(extra, lot=i, start=start, end=free, cycle_time=free - lot['release'],
+                            wait=start - lot['release'], moves=sink.count - moves))
+    return t, sink.count, metrics, list(sink.modules), list(sink.steps), time.perf_counter() - t0
+
+
+class FabResult:
+    # Merged fab schedule: `moves` is a MOVE_DTYPE array sorted by start time (then tool and
+    # engine move ID); tool/lot/module/step columns index the tables below
+    def __init__(self, tools, lots, moves, modules, steps, lot_metrics, tool_metrics, wall):
+        self.tools = tools
+        self.lots = lots
+        self.moves = moves
+        self.modules = modules  # per tool: module names
+        self.steps = steps  # per tool: step names
+        self.lot_metrics = lot_metrics  # by completion time
+        self.tool_metrics = tool_metrics
+        self.wall = wall
+        self.makespan = float(moves['end'].max()) if len(moves) else 0.0
+
+    def summary(self):
+        cycle = [m['cycle_time'] for m in self.lot_metrics]
+        return {
+            'tools': len(self.tools),
+            'lots': len(self.lots),
+            'wafers': sum(lot['size'] for lot in self.lots),
+            'moves': len(self.moves),
+            'makespan': self.makespan,
+            'cycle_time_mean': float(np.mean(cycle)) if cycle else 0,
+            'cycle_time_max': max(cycle, default=0),
+            'wait_mean': float(np.mean([m['wait'] for m in self.lot_metrics])) if cycle else 0,
+            'wall_seconds': self.wall,
+            'simulation_seconds': sum(m['seconds'] for m in self.tool_metrics)
+        }
+
+    def write(self, sink):
+        # Fab-wide trajectory: ModuleName "tool.module", MatID "lot/wafer.step", MoveIDs renumbered
+        # in merged order
+        tool_names = [tool['name'] for tool in self.tools]
+        lot_names = [lot['name'] for lot in self.lots]
+        module_names = [[f"{tool_names[t]}.{m}" for m in modules] for t, modules in enumerate(self.modules)]
+        add = sink.add
+        m = self.moves
+        for move_id, (start, end, tool, lot, wafer, step, module, move_type, slot) in enumerate(zip(
+                m['start'].tolist(), m['end'].tolist(), m['tool'].tolist(), m['lot'].tolist(), m['wafer'].tolist(),
+                m['step'].tolist(), m['module'].tolist(), m['move_type'].tolist(), m['slot'].tolist())):
+            step_name = self.steps[tool][step]
+            mat = f"{lot_names[lot]}/{wafer}.{step_name}" if wafer else f"{lot_names[lot]}/{step_name}"
+            add(start, end, move_id, move_type, module_names[tool][module], mat, slot)
+        return len(m)
+
+
+def simulate_fab(tools, lots, jobs=1):
+    t0 = time.perf_counter()
+    for tool in tools:
+        if tool['recipe'] not in ENGINES:
+            raise ValueError(f"tool {tool['name']}: unknown recipe {tool['recipe']!r}")
+    plan = assign_lots(tools, lots)
+    tasks, first = [], 0
+    for t, lot_ids in plan.items():
+        capacity = sum(lots[i]['size'] for i in lot_ids) * moves_per_wafer(tools[t]['recipe'])
+        if lot_ids:
+            tasks.append((t, [(i, lots[i]) for i in lot_ids], first, capacity))
+        first += capacity
+    buffer = RawArray('b', max(first, 1) * MOVE_DTYPE.itemsize)
+    # Largest tools first, so the last tasks handed out are the short ones
+    tasks.sort(key=lambda task: -task[3])
+    if jobs > 1:
+        with Pool(min(jobs, len(tasks)), initializer=_attach, initargs=(buffer,)) as pool:
+            results = pool.map(run_tool, tasks, chunksize=1)
+    else:
+        _attach(buffer)
+        results = [run_tool(task) for task in tasks]
+
+    rows = np.frombuffer(buffer, dtype=MOVE_DTYPE)
+    used = {t: (first, count) for (t, _, first, _), (_, count, *_) in zip(tasks, results)}
+    moves = np.concatenate([rows[first:first + count] for first, count in used.values()]) if used \
+        else np.zeros(0, dtype=MOVE_DTYPE)
+    moves = moves[np.lexsort((moves['move_id'], moves['tool'], moves['start']))]
+    modules, steps = [[] for _ in tools], [[] for _ in tools]
+    lot_metrics, tool_metrics = [], []
+    for t, count, metrics, tool_modules, tool_steps, seconds in results:
+        modules[t], steps[t] = tool_modules, tool_steps
+        for m in metrics:
+            lot_metrics.append(dict(m, tool=tools[t]['name'], lot=lots[m['lot']]['name']))
+        busy = sum(m['end'] - m['start'] for m in metrics)
+        end = metrics[-1]['end'] if metrics else 0
+        tool_metrics.append({'tool': tools[t]['name'], 'lots': len(metrics), 'moves': count, 'end': end,
+                             'busy_fraction': busy / end if end else 0, 'seconds': seconds})
+    lot_metrics.sort(key=lambda m: (m['end'], m['tool']))
+    tool_metrics.sort(key=lambda m: m['tool'])
+    return FabResult(tools, lots, moves, modules, steps, lot_metrics, tool_metrics, time.perf_counter() - t0)
+
+
+def random_fab(tool_counts, num_lots, lot_size, shift=SHIFT, scenario='none', seed=0):
+    # tool_counts: {recipe: number of tools}; lots of each recipe arrive uniformly over the shift
+    rng = random.Random(seed)
+    tools = [{'name': f"{recipe.upper()}-{k + 1}", 'recipe': recipe}
+             for recipe, count in tool_counts.items() for k in range(count)]
+    recipes = [recipe for recipe, count in tool_counts.items() if count]
+    lots = [{'name': f"L{i + 1:03d}", 'recipe': recipes[i % len(recipes)], 'size': lot_size,
+             'release': round(rng.uniform(0, shift), 1), 'scenario': scenario, 'seed': seed * 100003 + i}
+            for i in range(num_lots)]
+    return tools, lots
+
+
+def parse_tools(specs):
+    # ["task2:4", "task1:2"] -> {'task2': 4, 'task1': 2}
+    counts = {}
+    for spec in specs:
+        recipe, _, count = spec.partition(':')
+        counts[recipe] = int(count or 1)
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate many tools and lots over a shift, one process per tool')
+    parser.add_argument('--spec', default=None, help='JSON file with "tools" and "lots" lists (overrides the generator)')
+    parser.add_argument('--tools', nargs='+', default=['task1:6', 'task2:3'], help='recipe:count of generated tools')
+    parser.add_argument('--lots', type=int, default=24, help='generated lots')
+    parser.add_argument('--lot-size', type=int, default=25)
+    parser.add_argument('--shift', type=float, default=SHIFT, help='lots are released uniformly over this many seconds')
+    parser.add_argument('--scenario', default='none', help='task2 disruption scenario of generated lots')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--jobs', type=int, default=1, help='worker processes')
+    parser.add_argument('--format', choices=sorted(FORMAT_EXTENSIONS), default=None)
+    parser.add_argument('--output', default=None, help='merged fab trajectory')
+    args = parser.parse_args()
+
+    if args.spec:
+        with open(args.spec, encoding='utf-8') as f:
+            spec = json.load(f)
+        tools, lots = spec['tools'], spec['lots']
+    else:
+        tools, lots = random_fab(parse_tools(args.tools), args.lots, args.lot_size, args.shift, args.scenario, args.seed)
+    result = simulate_fab(tools, lots, args.jobs)
+    print(json.dumps(result.summary(), indent=4))
+    print(f"{'tool':<10} {'lots':>5} {'moves':>8} {'end(s)':>10} {'busy':>6} {'sim(s)':>7}")
+    for m in result.tool_metrics:
+        print(f"{m['tool']:<10} {m['lots']:>5} {m['moves']:>8} {m['end']:>10.1f} {m['busy_fraction']:>6.1%} "
+              f"{m['seconds']:>7.2f}")
+    if args.format or args.output:
+        fmt = args.format or 'columnar'
+        output = args.output or 'fab_trajectory' + FORMAT_EXTENSIONS[fmt]
+        with open_sink(output, fmt) as sink:
+            result.write(sink)
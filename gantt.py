@@ -0,0 +1,258 @@
+import argparse
+import time
+
+import numpy as np
+from matplotlib import colormaps, rc_context
+from matplotlib.figure import Figure
+from matplotlib.patches import Patch
+
+from analyze import CLEAN_MOVE_TYPE, detect_format, feed_json, feed_ndjson, text_shards
+from trajectory import iter_columnar_chunks
+
+# task1/task2 轨迹的甘特图与利用率图。
+# 每行是一个 (模块, 槽位)，整行的区间用一次 broken_barh 画成一个 PolyCollection，
+# 不为每条动作单独创建图元。绘制前按当前视窗换算出一个像素对应的秒数，向量化地合并区间：
+#   1. 同一行中颜色相同、间隙小于一个像素的相邻区间合并为一段（一步的各个子动作通常合成一段）
+#   2. 仍短于一个像素的段按所在像素列归并，取其中最长一段的颜色
+# 合并后每行的段数不超过像素列数的两倍左右，与动作条数无关。
+# 直接使用 matplotlib.figure.Figure 渲染到文件，不依赖 pyplot 和交互式后端。
+
+COLOR_MODES = ('wafer', 'movetype', 'cleaning')
+CLEAN_COLOR = (0.2, 0.2, 0.2, 1.0)
+IDLE_COLOR = (0.8, 0.8, 0.8, 1.0)
+HIGHLIGHT_COLOR = (0.85, 0.15, 0.1, 1.0)
+DEFAULT_WIDTH = 16  # 图宽（英寸）
+DEFAULT_DPI = 100
+ROW_HEIGHT = 0.8
+
+
+class _Collector:
+    # 供 analyze 的增量读取函数回调，逐条收集为列；MatID 按 "晶圆.步骤" 拆出晶圆部分
+    def __init__(self):
+        self.start, self.end, self.move_type, self.slot = [], [], [], []
+        self.module, self.wafer = [], []
+        self.modules, self.wafers = {}, {}
+
+    def add(self, start, end, move_type, module, mat, slot):
+        self.start.append(start)
+        self.end.append(end)
+        self.move_type.append(move_type)
+        self.slot.append(slot)
+        m = self.modules.get(module)
+        if m is None:
+            m = self.modules[module] = len(self.modules)
+        self.module.append(m)
+        key = mat.rpartition('.')[0] or mat
+        w = self.wafers.get(key)
+        if w is None:
+            w = self.wafers[key] = len(self.wafers)
+        self.wafer.append(w)
+
+
+class Schedule:
+    # 轨迹的列式视图：行号 row 对应 rows[row] = (模块名, 槽位)
+    def __init__(self, start, end, move_type, row, wafer, cleaning, rows):
+        self.start = start
+        self.end = end
+        self.move_type = move_type
+        self.row = row
+        self.wafer = wafer
+        self.cleaning = cleaning
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.start)
+
+    @classmethod
+    def from_columns(cls, start, end, move_type, module, slot, wafer, module_names, wafer_names):
+        # 行按模块首次出现的顺序排列，同一模块内按槽位排列
+        pairs, row = np.unique(np.stack([module, slot], axis=1), axis=0, return_inverse=True)
+        rows = [(module_names[m], int(s)) for m, s in pairs]
+        clean_wafers = np.array([name.startswith('CLEAN') for name in wafer_names], dtype=bool)
+        wafer = np.asarray(wafer)
+        cleaning = (np.asarray(move_type) == CLEAN_MOVE_TYPE) | clean_wafers[wafer] if len(wafer) else \
+            np.zeros(0, dtype=bool)
+        return cls(np.asarray(start, dtype=np.float64), np.asarray(end, dtype=np.float64),
+                   np.asarray(move_type), row.ravel(), wafer, cleaning, rows)
+
+
+def load_schedule(path, fmt=None):
+    fmt = fmt or detect_format(path)
+    if fmt == 'columnar':
+        return _load_columnar(path)
+    collector = _Collector()
+    for lo, hi in text_shards(path, fmt, 1):
+        if fmt == 'ndjson':
+            feed_ndjson(collector, path, lo, hi)
+        else:
+            feed_json(collector, path, lo, hi)
+    c = collector
+    return Schedule.from_columns(c.start, c.end, c.move_type, c.module, c.slot, c.wafer,
+                                 list(c.modules), list(c.wafers))
+
+
+def _load_columnar(path):
+    # 各块的字符串表互相独立，先映射到全局编号再拼接
+    modules, wafers = {}, {}
+    parts = []
+    for columns, strings in iter_columnar_chunks(path):
+        module_ids = np.array([modules.setdefault(s, len(modules)) for s in strings])
+        wafer_ids = np.array([wafers.setdefault(s.rpartition('.')[0] or s, len(wafers)) for s in strings])
+        parts.append((np.asarray(columns['StartTime']), np.asarray(columns['EndTime']),
+                      np.asarray(columns['MoveType']), module_ids[np.asarray(columns['ModuleName'], dtype=np.intp)],
+                      np.asarray(columns['SlotID']), wafer_ids[np.asarray(columns['MatID'], dtype=np.intp)]))
+    if not parts:
+        return Schedule.from_columns([], [], [], np.zeros(0, int), np.zeros(0, int), [], [], [])
+    start, end, move_type, module, slot, wafer = (np.concatenate(cols) for cols in zip(*parts))
+    # 字符串表同时含模块名和 MatID，这里只保留被用作模块名的那些
+    used = np.unique(module)
+    remap = np.full(len(modules), -1)
+    remap[used] = np.arange(len(used))
+    names = list(modules)
+    return Schedule.from_columns(start, end, move_type, remap[module], slot, wafer,
+                                 [names[m] for m in used], list(wafers))
+
+
+def color_keys(schedule, mode):
+    # 每条动作的颜色类别（整数）；清洗在所有模式下单独成类
+    if mode == 'wafer':
+        keys = schedule.wafer.astype(np.int64)
+    elif mode == 'movetype':
+        keys = schedule.move_type.astype(np.int64)
+    elif mode == 'cleaning':
+        keys = np.zeros(len(schedule), dtype=np.int64)
+    else:
+        raise ValueError(f"未知的着色方式: {mode}")
+    return np.where(schedule.cleaning, -1, keys)
+
+
+def merge_intervals(row, start, end, key, pixel):
+    # 按 (行, 开始时间) 排序后两轮合并，返回合并后的 (行, 开始, 结束, 颜色类别)
+    if not len(start):
+        return row, start, end, key
+    order = np.lexsort((start, row))
+    row, start, end, key = row[order], start[order], end[order], key[order]
+
+    # 第 1 轮：同行、同色且与前面区间的最远结束时间相距不足一个像素的区间并为一段
+    offset = (row - row.min()).astype(np.float64) * (end.max() - start.min() + 4 * pixel + 1)
+    reach = np.maximum.accumulate(end + offset) - offset  # 行内到当前为止的最远结束时间
+    new = np.ones(len(start), dtype=bool)
+    new[1:] = (row[1:] != row[:-1]) | (key[1:] != key[:-1]) | (start[1:] - reach[:-1] > pixel)
+    idx = np.flatnonzero(new)
+    row, key, start = row[idx], key[idx], start[idx]
+    end = np.maximum.reduceat(end, idx)
+
+    # 第 2 轮：短于一个像素的段按 (行, 像素列) 归并，颜色取其中最长的一段
+    small = end - start < pixel
+    if small.any():
+        column = np.floor((start[small] - start.min()) / pixel).astype(np.int64)
+        s_row, s_start, s_end, s_key = row[small], start[small], end[small], key[small]
+        order = np.lexsort((s_end - s_start, column, s_row))
+        s_row, column, s_start, s_end, s_key = s_row[order], column[order], s_start[order], s_end[order], s_key[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (s_row[1:] != s_row[:-1]) | (column[1:] != column[:-1])
+        idx = np.flatnonzero(first)
+        last = np.append(idx[1:], len(order)) - 1  # 每组按宽度升序排列，最后一个最长
+        merged = (s_row[idx], np.minimum.reduceat(s_start, idx), np.maximum.reduceat(s_end, idx), s_key[last])
+        keep = ~small
+        row, start, end, key = (np.concatenate([a[keep], b]) for a, b in zip((row, start, end, key), merged))
+    return row, start, end, key
+
+
+def utilization(schedule, t0, t1):
+    # 每行在 [t0, t1] 内被占用时间（区间并集）的占比
+    start = np.clip(schedule.start, t0, t1)
+    end = np.clip(schedule.end, t0, t1)
+    busy = np.zeros(len(schedule.rows))
+    if len(start):
+        row, start, end, _ = merge_intervals(schedule.row, start, end, np.zeros(len(start), np.int64), 0)
+        np.add.at(busy, row, end - start)
+    return busy / max(t1 - t0, 1e-9)
+
+
+def _palette(mode):
+    if mode == 'cleaning':
+        return lambda k: np.where((k == -1)[:, None], HIGHLIGHT_COLOR, IDLE_COLOR)
+    cmap = colormaps['tab20']
+    colors = np.array([cmap(i % cmap.N) for i in range(cmap.N)])
+    return lambda k: np.where((k == -1)[:, None], CLEAN_COLOR, colors[np.maximum(k, 0) % cmap.N])
+
+
+def render(schedule, path, color='wafer', start=None, end=None, width=DEFAULT_WIDTH, dpi=DEFAULT_DPI, title=None):
+    # 返回绘制的段数；start/end 为视窗（秒），默认整个轨迹
+    if start is None:
+        start = float(schedule.start.min()) if len(schedule) else 0.0
+    if end is None:
+        end = float(schedule.end.max()) if len(schedule) else 1.0
+    t0, t1 = start, end
+    visible = (schedule.end > t0) & (schedule.start < t1)
+    num_rows = len(schedule.rows)
+    height = min(max(3, 0.22 * num_rows + 1.5), 60)
+
+    with rc_context({'font.sans-serif': ['SimHei', 'DejaVu Sans'], 'axes.unicode_minus': False}):
+        fig = Figure(figsize=(width, height), dpi=dpi)
+        grid = fig.add_gridspec(1, 2, width_ratios=(8, 1), wspace=0.02)
+        ax = fig.add_subplot(grid[0])
+        ax_util = fig.add_subplot(grid[1], sharey=ax)
+        # 一个像素对应的秒数，由坐标轴的实际像素宽度换算
+        pixel = (t1 - t0) / max(ax.get_position().width * width * dpi, 1)
+
+        keys = color_keys(schedule, color)
+        row, seg_start, seg_end, seg_key = merge_intervals(
+            schedule.row[visible], np.clip(schedule.start[visible], t0, t1),
+            np.clip(schedule.end[visible], t0, t1), keys[visible], pixel)
+        colors = _palette(color)(seg_key)
+        order = np.argsort(row, kind='stable')
+        bounds = np.searchsorted(row[order], np.arange(num_rows + 1))
+        for r in range(num_rows):
+            sel = order[bounds[r]:bounds[r + 1]]
+            if len(sel):
+                ax.broken_barh(np.stack([seg_start[sel], seg_end[sel] - seg_start[sel]], axis=1),
+                               (r - ROW_HEIGHT / 2, ROW_HEIGHT), facecolors=colors[sel], linewidth=0)
+
+        labels = [f"{module}" if sum(1 for m, _ in schedule.rows if m == module) == 1 else f"{module}:{slot}"
+                  for module, slot in schedule.rows]
+        ax.set_yticks(range(num_rows), labels, fontsize=7)
+        ax.set_ylim(num_rows - 0.5, -0.5)
+        ax.set_xlim(t0, t1)
+        ax.set_xlabel('时间（秒）')
+        ax.set_title(title or f"甘特图（{len(schedule)} 条动作，绘制 {len(seg_start)} 段）")
+        if color == 'movetype':
+            types = sorted(set(schedule.move_type[visible & ~schedule.cleaning].tolist()))
+            palette = _palette(color)
+            handles = [Patch(color=palette(np.array([t]))[0], label=f"MoveType {t}") for t in types]
+            handles.append(Patch(color=CLEAN_COLOR, label='清洗'))
+            ax.legend(handles=handles, loc='upper right', fontsize=7, ncol=2)
+        elif color == 'cleaning':
+            ax.legend(handles=[Patch(color=HIGHLIGHT_COLOR, label='清洗'), Patch(color=IDLE_COLOR, label='加工/传输')],
+                      loc='upper right', fontsize=7)
+
+        busy = utilization(schedule, t0, t1)
+        ax_util.barh(range(num_rows), busy, height=ROW_HEIGHT, color='tab:blue')
+        ax_util.set_xlim(0, 1)
+        ax_util.set_xticks([0.5, 1])
+        ax_util.set_xlabel('利用率')
+        ax_util.tick_params(labelleft=False)
+        fig.savefig(path, bbox_inches='tight')
+    return len(seg_start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='轨迹甘特图与模块利用率')
+    parser.add_argument('path', help='task1/task2 输出的轨迹文件')
+    parser.add_argument('--format', choices=['json', 'ndjson', 'columnar'], default=None,
+                        help='文件格式，默认按文件头和扩展名判断')
+    parser.add_argument('--output', default='gantt.png', help='图片路径（扩展名决定格式，如 .png/.svg/.pdf）')
+    parser.add_argument('--color', choices=COLOR_MODES, default='wafer', help='按晶圆、MoveType 或是否清洗着色')
+    parser.add_argument('--start', type=float, default=None, help='视窗开始时间（秒）')
+    parser.add_argument('--end', type=float, default=None, help='视窗结束时间（秒）')
+    parser.add_argument('--width', type=float, default=DEFAULT_WIDTH, help='图宽（英寸）')
+    parser.add_argument('--dpi', type=int, default=DEFAULT_DPI)
+    args = parser.parse_args()
+
+    t = time.perf_counter()
+    schedule = load_schedule(args.path, args.format)
+    loaded = time.perf_counter() - t
+    segments = render(schedule, args.output, args.color, args.start, args.end, args.width, args.dpi)
+    print(f"{len(schedule)} 条动作，{len(schedule.rows)} 行，绘制 {segments} 段 -> {args.output}"
+          f"（读取 {loaded:.2f} 秒，绘制 {time.perf_counter() - t - loaded:.2f} 秒）")
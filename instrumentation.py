@@ -0,0 +1,151 @@
+import cProfile
+import json
+import os
+import pstats
+import time
+from contextlib import contextmanager
+from heapq import heappush
+
+# Opt-in per-phase timers and counters for task1/task2 runs. Engines take profiler=None and
+# only look at it once per run: when it is set they rebind their hot-path callables
+# (heap push/pop, dispatch, move emission, disruption, cleaning) to timed wrappers, so a
+# disabled profiler leaves the event loop untouched.
+#
+# Report layout (merge_reports sums everything except high-water marks, which take the max):
+#   {"label", "runs", "wall_time",
+#    "phases": {name: {"seconds", "calls"}},
+#    "counters": {"events", "dispatch_calls", "moves_emitted", "bytes_written", ...},
+#    "high_water": {"heap_size", ...}}
+
+
+class Profiler:
+    __slots__ = ('label', 'timers', 'calls', 'counters', 'maxima', 'runs', 'wall_time',
+                 '_started', '_cprofile')
+
+    def __init__(self, label='', cprofile=False):
+        self.label = label
+        self.timers = {}
+        self.calls = {}
+        self.counters = {}
+        self.maxima = {}
+        self.runs = 0
+        self.wall_time = 0.0
+        self._started = None
+        self._cprofile = cProfile.Profile() if cprofile else None
+
+    def start(self):
+        self._started = time.perf_counter()
+        if self._cprofile is not None:
+            self._cprofile.enable()
+
+    def stop(self):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if self._started is not None:
+            self.wall_time += time.perf_counter() - self._started
+            self._started = None
+            self.runs += 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def high_water(self, name, value):
+        if value > self.maxima.get(name, 0):
+            self.maxima[name] = value
+
+    def add_time(self, name, seconds, calls=1):
+        self.timers[name] = self.timers.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + calls
+
+    @contextmanager
+    def phase(self, name):
+        # Coarse phases (tuning, plotting, final flush); hot paths use timed() instead
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t0)
+
+    def timed(self, name, fn):
+        timers, calls, clock = self.timers, self.calls, time.perf_counter
+        timers.setdefault(name, 0.0)
+        calls.setdefault(name, 0)
+
+        def wrapper(*args, **kwargs):
+            t0 = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                timers[name] += clock() - t0
+                calls[name] += 1
+        return wrapper
+
+    def timed_heappush(self, name='heap_push'):
+        # heappush that also tracks the event queue's high-water mark
+        timers, calls, maxima, clock = self.timers, self.calls, self.maxima, time.perf_counter
+        timers.setdefault(name, 0.0)
+        calls.setdefault(name, 0)
+        maxima.setdefault('heap_size', 0)
+
+        def wrapper(heap, item):
+            t0 = clock()
+            heappush(heap, item)
+            timers[name] += clock() - t0
+            calls[name] += 1
+            if len(heap) > maxima['heap_size']:
+                maxima['heap_size'] = len(heap)
+        return wrapper
+
+    def close_sink(self, sink):
+        # Time the final flush/close of a trajectory sink and record the file size
+        with self.phase('write'):
+            sink.close()
+        path = getattr(sink, 'path', None)
+        if path is not None and os.path.exists(path):
+            self.count('bytes_written', os.path.getsize(path))
+
+    def report(self):
+        return {
+            'label': self.label,
+            'runs': self.runs,
+            'wall_time': self.wall_time,
+            'phases': {name: {'seconds': self.timers[name], 'calls': self.calls[name]} for name in self.timers},
+            'counters': dict(self.counters),
+            'high_water': dict(self.maxima)
+        }
+
+    def dump_stats(self, path):
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(path)
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=4)
+
+
+def merge_reports(reports, label=''):
+    merged = {'label': label, 'runs': 0, 'wall_time': 0.0, 'phases': {}, 'counters': {}, 'high_water': {}}
+    for report in reports:
+        merged['runs'] += report['runs']
+        merged['wall_time'] += report['wall_time']
+        for name, phase in report['phases'].items():
+            total = merged['phases'].setdefault(name, {'seconds': 0.0, 'calls': 0})
+            total['seconds'] += phase['seconds']
+            total['calls'] += phase['calls']
+        for name, value in report['counters'].items():
+            merged['counters'][name] = merged['counters'].get(name, 0) + value
+        for name, value in report['high_water'].items():
+            merged['high_water'][name] = max(merged['high_water'].get(name, 0), value)
+    return merged
+
+
+def merge_pstats(paths, output):
+    # Combine per-run cProfile dumps (e.g. one per pool task) into a single pstats file
+    paths = [p for p in paths if os.path.exists(p)]
+    if not paths:
+        return None
+    stats = pstats.Stats(paths[0])
+    for path in paths[1:]:
+        stats.add(path)
+    stats.dump_stats(output)
+    return output
@@ -0,0 +1,191 @@
+import argparse
+import statistics
+import time
+from collections import deque
+from heapq import heappop, heappush
+
+import task2
+
+# Rollout dispatch for run_scheduling(..., adaptive=True, lookahead=Lookahead(...)).
+# At every decision with more than one candidate (unit, slot), the top `width` candidates of
+# the greedy rule are each tried on a fork of the engine state and rolled `depth` events ahead
+# with the greedy rule on nominal durations (no disruptions, no RNG draws). The candidate with
+# the lowest projected makespan wins: the largest (pending event time + remaining single-wafer
+# work of that wafer) over all wafers still in the system, or the last completion once none
+# are left; ties are broken by the sum of projected and actual completion times.
+# Engine state is a handful of flat lists (slot availability, queue lengths, TM timestamps,
+# wafer positions, the event heap), so a fork is a shallow copy of each, not a deepcopy.
+# A per-decision time_budget stops evaluating further candidates once exceeded; the greedy
+# choice is always evaluated first, so the budget only narrows the search.
+# With depth=None every rollout runs to the end of the lot. On nominal durations the rollout then
+# replays the engine exactly, so each score is the makespan that candidate would really reach and
+# the best rollout's decisions are kept as the incumbent plan: later decisions follow it unless a
+# candidate strictly beats its makespan. The run therefore never ends later than greedy dispatch,
+# whose full rollout is the first one scored.
+
+DEFAULT_DEPTH = 60
+DEFAULT_WIDTH = 3
+
+
+class Lookahead:
+    def __init__(self, depth=DEFAULT_DEPTH, width=DEFAULT_WIDTH, time_budget=None):
+        self.depth = depth
+        self.width = width
+        self.time_budget = time_budget  # seconds per decision, None for no limit
+        self.decisions = 0
+        self.changed = 0  # decisions where the rollout overrode the greedy choice
+        self.rollouts = 0
+        self.budget_hits = 0
+
+    def bind(self, recipe, params, slot_available, slot_queue_length, last_tm_action, wafer_pos, event_queue,
+             nominal=False):
+        # Called by _schedule with its live state; choose() forks from these lists.
+        # nominal: the engine runs on nominal durations, so full rollouts are exact
+        self.recipe = recipe
+        self.exact = nominal and self.depth is None
+        self.plan = None  # remaining (unit, slot) decisions of the incumbent rollout
+        self.plan_makespan = None
+        self.route = recipe.route.tolist()
+        self.duration = recipe.unit_duration_list()
+        self.is_tm = list(recipe.unit_transport)
+        self.cells = [[(u, s) for u in candidates for s in range(recipe.unit_slots[u])]
+                      for candidates in recipe.step_candidates]
+        self.module_pref = [params['module_preference'].get(name, 0.5) for name in recipe.unit_names]
+        self.slot_pref = [[params['slot_preference'].get(name, {}).get(s + 1, 0.5) for s in range(n)]
+                          for name, n in zip(recipe.unit_names, recipe.unit_slots)]
+        # remaining[pos]: nominal time a wafer still needs from route position pos to the end
+        remaining = [0.0] * (len(self.route) + 1)
+        for pos in range(len(self.route) - 1, -1, -1):
+            remaining[pos] = remaining[pos + 1] + min(self.duration[u] for u in recipe.step_candidates[self.route[pos]])
+        self.remaining = remaining
+        self.state = (slot_available, slot_queue_length, last_tm_action, wafer_pos, event_queue)
+
+    def _ranked(self, step, now, slot_available, slot_queue_length):
+        # Greedy order, as dispatch.SlotIndex: earliest effective start, then load score, then candidate order
+        def key(item):
+            order, (u, s) = item
+            score = self.module_pref[u] * (1 - sum(slot_queue_length[u]) / 10) + self.slot_pref[u][s]
+            return max(slot_available[u][s], now), -score, order
+        return [cell for _, cell in sorted(enumerate(self.cells[step]), key=key)]
+
+    def _place(self, state, wafer, step, unit, slot, now):
+        slot_available, slot_queue_length, last_tm_action, _, event_queue = state
+        slot_queue_length[unit][slot] += 1
+        start = max(now, slot_available[unit][slot])
+        if self.is_tm[unit]:
+            start = max(start, last_tm_action[unit] - task2.TM_OVERLAP)
+            last_tm_action[unit] = start + self.duration[unit]
+        end = start + self.duration[unit]
+        slot_available[unit][slot] = end
+        heappush(event_queue, (end, wafer, step, unit, slot, 0))
+
+    def _rollout(self, state, decisions):
+        # Appends each multi-candidate choice to `decisions`
+        slot_available, slot_queue_length, _, wafer_pos, event_queue = state
+        route, route_len, cells, depth = self.route, len(self.route), self.cells, self.depth
+        finished, total, events = 0, 0, 0
+        while event_queue and (depth is None or events < depth):
+            events += 1
+            now, wafer, _, unit, slot, _ = heappop(event_queue)
+            slot_queue_length[unit][slot] -= 1
+            pos = wafer_pos[wafer]
+            if pos >= route_len:
+                finished = max(finished, now)
+                total += now
+                continue
+            step = route[pos]
+            wafer_pos[wafer] = pos + 1
+            if len(cells[step]) == 1:
+                u, s = cells[step][0]
+            else:
+                u, s = self._ranked(step, now, slot_available, slot_queue_length)[0]
+                decisions.append((u, s))
+            self._place(state, wafer, step, u, s, now)
+        remaining = self.remaining
+        projected = [t + remaining[wafer_pos[w]] for t, w, *_ in event_queue]
+        return max(projected, default=finished), sum(projected) + total
+
+    def choose(self, step, wafer, now):
+        # Called after the engine advanced wafer_pos[wafer] past `step`
+        slot_available, slot_queue_length, last_tm_action, wafer_pos, event_queue = self.state
+        if len(self.cells[step]) == 1:
+            return self.cells[step][0]
+        t0 = time.perf_counter()
+        ranked = self._ranked(step, now, slot_available, slot_queue_length)
+        best, best_score, best_plan = ranked[0], None, None
+        for k, (unit, slot) in enumerate(ranked[:self.width]):
+            if k and self.time_budget is not None and time.perf_counter() - t0 > self.time_budget:
+                self.budget_hits += 1
+                break
+            fork = ([list(a) for a in slot_available], [list(q) for q in slot_queue_length],
+                    list(last_tm_action), list(wafer_pos), list(event_queue))
+            self._place(fork, wafer, step, unit, slot, now)
+            decisions = []
+            score = self._rollout(fork, decisions)
+            self.rollouts += 1
+            if best_score is None or score < best_score:
+                best, best_score, best_plan = (unit, slot), score, decisions
+        if self.exact:
+            planned = self.plan.popleft() if self.plan else None
+            if planned is not None and not best_score[0] < self.plan_makespan:
+                best = planned
+            else:
+                self.plan, self.plan_makespan = deque(best_plan), best_score[0]
+        self.decisions += 1
+        if best != ranked[0]:
+            self.changed += 1
+        return best
+
+    def report(self):
+        return {'decisions': self.decisions, 'changed': self.changed, 'rollouts': self.rollouts,
+                'budget_hits': self.budget_hits}
+
+
+def compare_with_greedy(scenarios=('none', 'fault', 'time_variation', 'mixed'), seeds=range(5), params=None,
+                        depth=DEFAULT_DEPTH, width=DEFAULT_WIDTH, time_budget=None):
+    # Same seeds for both policies (common random numbers); improvement > 0 means lookahead is faster
+    params = params or task2.default_params
+    results = {}
+    for scenario in scenarios:
+        greedy, rollout, wall = [], [], 0.0
+        stats = Lookahead(depth, width, time_budget)
+        for seed in seeds:
+            greedy.append(task2.run_scheduling(params, [], task2.step_units, task2.step_durations, scenario, True,
+                                               metrics_only=True, seed=seed))
+            t0 = time.perf_counter()
+            rollout.append(task2.run_scheduling(params, [], task2.step_units, task2.step_durations, scenario, True,
+                                                metrics_only=True, seed=seed, lookahead=stats))
+            wall += time.perf_counter() - t0
+        greedy_makespan = statistics.mean(r['makespan'] for r in greedy)
+        lookahead_makespan = statistics.mean(r['makespan'] for r in rollout)
+        # The gap to the analytical bound is only reported for nominal durations ('none')
+        results[scenario] = {
+            'greedy_makespan': greedy_makespan,
+            'lookahead_makespan': lookahead_makespan,
+            'improvement': 1 - lookahead_makespan / greedy_makespan,
+            'greedy_gap': statistics.mean(r['gap'] for r in greedy) if scenario == 'none' else None,
+            'lookahead_gap': statistics.mean(r['gap'] for r in rollout) if scenario == 'none' else None,
+            'seconds_per_run': wall / len(rollout),
+            **stats.report()
+        }
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare rollout dispatch with the greedy adaptive dispatcher')
+    parser.add_argument('--scenarios', nargs='+', default=['none', 'fault', 'time_variation', 'mixed'])
+    parser.add_argument('--seeds', type=int, default=5, help='replicas per scenario')
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH,
+                        help='events simulated per rollout, 0 to roll out to the end of the lot')
+    parser.add_argument('--width', type=int, default=DEFAULT_WIDTH, help='greedy candidates tried per decision')
+    parser.add_argument('--budget-ms', type=float, default=None, help='time budget per decision in milliseconds')
+    args = parser.parse_args()
+
+    budget = args.budget_ms / 1000 if args.budget_ms is not None else None
+    results = compare_with_greedy(args.scenarios, range(args.seeds), depth=args.depth or None, width=args.width,
+                                  time_budget=budget)
+    print(f"{'scenario':<16} {'greedy':>10} {'lookahead':>10} {'improvement':>12} {'gap':>16} {'s/run':>8} {'changed':>8}")
+    for scenario, r in results.items():
+        gaps = f"{r['greedy_gap']:.2%} -> {r['lookahead_gap']:.2%}" if r['greedy_gap'] is not None else '-'
+        print(f"{scenario:<16} {r['greedy_makespan']:>10.1f} {r['lookahead_makespan']:>10.1f} "
+              f"{r['improvement']:>12.2%} {gaps:>16} {r['seconds_per_run']:>8.2f} {r['changed']:>8}")
@@ -0,0 +1,171 @@
+import argparse
+import math
+from multiprocessing import Pool
+
+from task1 import (IDLE_CLEAN_DURATION, NUM_WAFERS, RECIPE, WAFER_COUNT_CLEAN_DURATION, WAFER_COUNT_THRESHOLD,
+                   Task1Simulator)
+
+# task1 的 PM 清洗策略。Task1Simulator(maintenance=...) 在两处调用策略：
+#   on_request(unit, now, start, wafer)  晶圆请求需清洗的模块时，返回（可能因清洗推迟的）开始时间
+#   on_release(unit, now, wafer)         晶圆在需清洗的模块上完成一步时，可利用随后的空闲窗口提前清洗
+# maintenance=None 时引擎内联执行原有的被动规则，与 ReactivePolicy 结果相同。
+#
+# 空闲窗口由事件堆预测：堆中每片晶圆都有一个待处理事件 (时间, 晶圆)，它下一次请求模块 u 的时间
+# 不早于 事件时间 + 从当前位置到下一次访问 u 之间各步的加工时间（不计排队），取所有晶圆的最小值，
+# 即模块 u 下一次被请求时间的下界。在这个下界之前做完的清洗不会推迟任何晶圆。
+
+
+def lead_times(recipe, unit):
+    # lead[pos]：从路线第 pos 步开始，到下一次访问 unit 之前各步的加工时间之和（之后不再访问则为 inf）
+    durations = recipe.step_duration_list()
+    route = recipe.route.tolist()
+    lead = [math.inf] * (len(route) + 1)
+    for pos in range(len(route) - 1, -1, -1):
+        step = route[pos]
+        if recipe.step_candidates[step][0] == unit:
+            lead[pos] = 0
+        else:
+            lead[pos] = lead[pos + 1] + durations[step]
+    return lead
+
+
+class ReactivePolicy:
+    # 原有规则：请求时空闲超过阈值先做空闲清洗，计数达到阈值再做计数清洗，两者都推迟本次请求
+    name = 'reactive'
+
+    def bind(self, sim, clean):
+        # 每次运行开始时调用；clean 为引擎的清洗函数（开启剖析时是计时包装）
+        self.sim = sim
+        self.clean = clean
+
+    def due(self, unit, count):
+        return count >= self.sim.wafer_count_threshold
+
+    def on_request(self, unit, now, start, wafer_id):
+        sim = self.sim
+        idle_time = now - sim.unit_last_used[unit]
+        if idle_time >= sim.idle_threshold and start >= now:
+            self.clean(unit, now, now + IDLE_CLEAN_DURATION, 'idle', wafer_id=wafer_id + 1)
+            start = max(start, now + IDLE_CLEAN_DURATION)
+        if self.due(unit, sim.pm_wafer_count[unit]):
+            clean_end = self.count_clean(unit, max(now, sim.unit_available[unit]), wafer_id)
+            start = max(start, clean_end)
+        return start
+
+    def on_release(self, unit, now, wafer_id):
+        pass
+
+    def count_clean(self, unit, clean_start, wafer_id, **extra):
+        sim = self.sim
+        count = sim.pm_wafer_count[unit]
+        clean_end = clean_start + WAFER_COUNT_CLEAN_DURATION
+        self.clean(unit, clean_start, clean_end, 'wafer_count', wafer_count=count, wafer_id=wafer_id + 1, **extra)
+        sim.pm_wafer_count[unit] = 0
+        return clean_end
+
+
+class OpportunisticPolicy(ReactivePolicy):
+    # 计数已达 min_count 时，若预测的空闲窗口不短于 min_window，就在晶圆离开后立即做计数清洗；
+    # 窗口短于清洗时长时下一片晶圆只需等剩余部分，仍比到阈值时被动清洗等满 300 秒短。
+    # 计数仍达到阈值时按被动规则兜底
+    name = 'opportunistic'
+
+    def __init__(self, min_count=WAFER_COUNT_THRESHOLD * 2 // 3, min_window=WAFER_COUNT_CLEAN_DURATION // 3):
+        self.min_count = min_count
+        self.min_window = min_window
+
+    def bind(self, sim, clean):
+        super().bind(sim, clean)
+        self.leads = {u: lead_times(sim.recipe, u) for u, c in enumerate(sim.recipe.unit_cleaning) if c}
+
+    def next_request(self, unit, now, wafer_id):
+        # 模块 unit 下一次被请求时间的下界；刚出堆的晶圆 wafer_id 此刻就会请求它的下一步
+        sim = self.sim
+        lead, wafer_pos = self.leads[unit], sim.wafer_pos
+        best = now + lead[wafer_pos[wafer_id]]
+        for t, w, _, _ in sim.pending_events():
+            t += lead[wafer_pos[w]]
+            if t < best:
+                best = t
+        return best
+
+    def on_release(self, unit, now, wafer_id):
+        sim = self.sim
+        if sim.pm_wafer_count[unit] < self.min_count:
+            return
+        free = max(now, sim.unit_available[unit])
+        if self.next_request(unit, now, wafer_id) - free >= self.min_window:
+            self.count_clean(unit, free, wafer_id, opportunistic=True)
+
+
+class StaggeredPolicy(ReactivePolicy):
+    # 错开各 PM 的计数清洗：第 k 个需清洗的模块第一次提前 k * 阈值 / 模块数 片清洗，
+    # 此后各自按阈值循环，PM7/PM8 不会同时停机
+    name = 'staggered'
+
+    def __init__(self, offsets=None):
+        self.offsets = offsets  # {模块名: 提前的片数}，默认按模块顺序均分
+
+    def bind(self, sim, clean):
+        super().bind(sim, clean)
+        names = sim.recipe.unit_names
+        cleaning = [u for u, c in enumerate(sim.recipe.unit_cleaning) if c]
+        if self.offsets is None:
+            self.first_due = {u: sim.wafer_count_threshold - k * sim.wafer_count_threshold // len(cleaning)
+                              for k, u in enumerate(cleaning)}
+        else:
+            self.first_due = {u: sim.wafer_count_threshold - self.offsets.get(names[u], 0) for u in cleaning}
+
+    def due(self, unit, count):
+        first = self.first_due.get(unit)
+        if first is None:
+            return count >= self.sim.wafer_count_threshold
+        if count >= first:
+            del self.first_due[unit]
+            return True
+        return False
+
+
+POLICIES = {'reactive': ReactivePolicy, 'opportunistic': OpportunisticPolicy, 'staggered': StaggeredPolicy}
+
+
+def evaluate_policy(args):
+    # Pool worker：一个策略跑一批晶圆
+    name, num_wafers, release_interval = args
+    sim = Task1Simulator(num_wafers=num_wafers, record=False, release_interval=release_interval,
+                         maintenance=POLICIES[name]())
+    makespan = sim.run()
+    cleanings = {}
+    for c in sim.cleaning_log:
+        cleanings[c['reason']] = cleanings.get(c['reason'], 0) + 1
+    return {
+        'policy': name,
+        'num_wafers': num_wafers,
+        'makespan': makespan,
+        'throughput': num_wafers / makespan * 3600 if makespan else 0,  # 片/小时
+        'cleanings': cleanings,
+        'cleaning_time': sum(c['end_time'] - c['start_time'] for c in sim.cleaning_log)
+    }
+
+
+def evaluate_policies(names=tuple(POLICIES), num_wafers=NUM_WAFERS, release_interval=0, jobs=1):
+    tasks = [(name, num_wafers, release_interval) for name in names]
+    if jobs > 1:
+        with Pool(min(jobs, len(tasks))) as pool:
+            return pool.map(evaluate_policy, tasks)
+    return [evaluate_policy(task) for task in tasks]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='比较 task1 的 PM 清洗策略')
+    parser.add_argument('--policies', nargs='+', choices=sorted(POLICIES), default=list(POLICIES))
+    parser.add_argument('--wafers', type=int, nargs='+', default=[NUM_WAFERS], help='批量大小，可给多个')
+    parser.add_argument('--release-interval', type=float, default=0, help='投片间隔（秒），0 为一次全部投入')
+    parser.add_argument('--jobs', type=int, default=1, help='并行进程数')
+    args = parser.parse_args()
+
+    print(f"{'策略':<14} {'晶圆数':>6} {'总完成时间(秒)':>14} {'片/小时':>8} {'空闲清洗':>8} {'计数清洗':>8} {'清洗耗时(秒)':>12}")
+    for n in args.wafers:
+        for r in evaluate_policies(args.policies, n, args.release_interval, args.jobs):
+            print(f"{r['policy']:<14} {n:>6} {r['makespan']:>14.1f} {r['throughput']:>8.3f} "
+                  f"{r['cleanings'].get('idle', 0):>8} {r['cleanings'].get('wafer_count', 0):>8} {r['cleaning_time']:>12.0f}")
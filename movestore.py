@@ -0,0 +1,139 @@
+from array import array
+
+from trajectory import MoveSink
+
+try:
+    import numpy as np
+except ImportError:  # numpy 只用于 as_numpy()，缺失时其余功能不受影响
+    np = None
+
+# 模板中时间的基准：相对步骤开始时间或结束时间
+START, END = 0, 1
+
+
+class MoveTemplate:
+    # 预编译的单步动作模板：每个动作的起止时间表示为 (基准, 偏移)，发出一步时只需批量追加
+    __slots__ = ('start_base', 'start_off', 'end_base', 'end_off', 'move_types', 'size')
+
+    def __init__(self, parts):
+        # parts: [((start_base, start_off), (end_base, end_off), move_type), ...]
+        self.start_base = tuple(p[0][0] for p in parts)
+        self.start_off = tuple(p[0][1] for p in parts)
+        self.end_base = tuple(p[1][0] for p in parts)
+        self.end_off = tuple(p[1][1] for p in parts)
+        self.move_types = array('b', (p[2] for p in parts))
+        self.size = len(parts)
+
+    def times(self, start_time, end_time):
+        base = (start_time, end_time)
+        starts = [base[b] + o for b, o in zip(self.start_base, self.start_off)]
+        ends = [base[b] + o for b, o in zip(self.end_base, self.end_off)]
+        return starts, ends
+
+
+class MoveStore(MoveSink):
+    # 结构化数组存储：数值列用 array，ModuleName/MatID 存为驻留字符串表中的索引
+    __slots__ = ('start', 'end', 'move_id', 'move_type', 'slot', 'module', 'mat',
+                 'module_names', 'mat_ids', '_module_index', '_mat_index')
+
+    def __init__(self):
+        self.start = array('d')
+        self.end = array('d')
+        self.move_id = array('q')
+        self.move_type = array('b')
+        self.slot = array('b')
+        self.module = array('H')
+        self.mat = array('I')
+        self.module_names = []
+        self.mat_ids = []
+        self._module_index = {}
+        self._mat_index = {}
+
+    def _intern_module(self, module):
+        idx = self._module_index.get(module)
+        if idx is None:
+            idx = self._module_index[module] = len(self.module_names)
+            self.module_names.append(module)
+        return idx
+
+    def _intern_mat(self, mat_id):
+        idx = self._mat_index.get(mat_id)
+        if idx is None:
+            idx = self._mat_index[mat_id] = len(self.mat_ids)
+            self.mat_ids.append(mat_id)
+        return idx
+
+    def add(self, start_time, end_time, move_id, move_type, module, mat_id, slot_id):
+        self.start.append(start_time)
+        self.end.append(end_time)
+        self.move_id.append(move_id)
+        self.move_type.append(move_type)
+        self.slot.append(slot_id)
+        self.module.append(self._intern_module(module))
+        self.mat.append(self._intern_mat(mat_id))
+
+    def add_step(self, template, start_time, end_time, move_id, module, mat_id, slot_id):
+        n = template.size
+        starts, ends = template.times(start_time, end_time)
+        self.start.extend(starts)
+        self.end.extend(ends)
+        self.move_id.extend(range(move_id, move_id + n))
+        self.move_type.extend(template.move_types)
+        self.slot.extend(array('b', (slot_id,)) * n)
+        self.module.extend(array('H', (self._intern_module(module),)) * n)
+        self.mat.extend(array('I', (self._intern_mat(mat_id),)) * n)
+
+    def __len__(self):
+        return len(self.move_id)
+
+    def __getitem__(self, i):
+        # 按需构造单条动作的字典视图
+        return {
+            "StartTime": self.start[i],
+            "EndTime": self.end[i],
+            "MoveID": self.move_id[i],
+            "MoveType": self.move_type[i],
+            "ModuleName": self.module_names[self.module[i]],
+            "MatID": self.mat_ids[self.mat[i]],
+            "SlotID": self.slot[i]
+        }
+
+    def __iter__(self):
+        modules, mats = self.module_names, self.mat_ids
+        for st, et, mid, mt, mod, mat, slot in zip(self.start, self.end, self.move_id, self.move_type,
+                                                   self.module, self.mat, self.slot):
+            yield {
+                "StartTime": st,
+                "EndTime": et,
+                "MoveID": mid,
+                "MoveType": mt,
+                "ModuleName": modules[mod],
+                "MatID": mats[mat],
+                "SlotID": slot
+            }
+
+    def write_to(self, sink):
+        # 不经过字典，直接转存到另一个输出
+        modules, mats = self.module_names, self.mat_ids
+        add = sink.add
+        for st, et, mid, mt, mod, mat, slot in zip(self.start, self.end, self.move_id, self.move_type,
+                                                   self.module, self.mat, self.slot):
+            add(st, et, mid, mt, modules[mod], mats[mat], slot)
+
+    def as_numpy(self):
+        # 零拷贝的 numpy 列视图
+        if np is None:
+            raise ImportError("as_numpy() 需要安装 numpy")
+        return {
+            "StartTime": np.frombuffer(self.start, dtype=np.float64),
+            "EndTime": np.frombuffer(self.end, dtype=np.float64),
+            "MoveID": np.frombuffer(self.move_id, dtype=np.int64),
+            "MoveType": np.frombuffer(self.move_type, dtype=np.int8),
+            "ModuleName": np.frombuffer(self.module, dtype=np.uint16),
+            "MatID": np.frombuffer(self.mat, dtype=np.uint32),
+            "SlotID": np.frombuffer(self.slot, dtype=np.int8)
+        }
+
+    def nbytes(self):
+        return sum(col.itemsize * len(col) for col in
+                   (self.start, self.end, self.move_id, self.move_type, self.slot, self.module, self.mat))
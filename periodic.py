@@ -0,0 +1,236 @@
+import argparse
+import math
+
+from task1 import CLEANING_TEMPLATE, RECIPE, WAFER_COUNT_CLEAN_DURATION, WAFER_COUNT_THRESHOLD, Task1Simulator
+from trajectory import FORMAT_EXTENSIONS, open_sink
+
+# task1 稳态周期调度：每片晶圆走同一条路线，按固定间隔投片时，流水线填满后调度按晶圆号呈周期性——
+# 第 i + p 片晶圆的每一步（以及它触发的清洗）恰好是第 i 片平移 p * 投片间隔。
+# 先用事件引擎模拟一段探测批次，找出周期 p、爬坡段和收尾段，之后任意片数的调度都由
+# 爬坡段 + 重复的周期 + 平移后的收尾段拼出，每多一片晶圆只需 O(1) 的复制工作。
+#
+# 注意：默认的 task1（release_interval=0）在 0 时刻一次投入全部晶圆，调度随片数整体变化，
+# 不存在这样的周期；稳态生成只适用于按间隔投片。
+
+PROBE_WAFERS = 200
+MAX_PERIOD = 52
+MIN_CYCLES = 2  # 至少连续重复这么多个周期才认为进入稳态
+CHECK_WAFERS = (PROBE_WAFERS + 1, PROBE_WAFERS + 17, 2 * PROBE_WAFERS + 5)
+
+
+def bottleneck_interval(recipe=RECIPE, wafer_count_threshold=WAFER_COUNT_THRESHOLD):
+    # 投片间隔的下界：最忙模块每片晶圆的加工时间，需清洗的模块再摊上计数清洗
+    durations = recipe.step_duration_list()
+    load = [0.0] * len(recipe.unit_names)
+    visits = [0] * len(recipe.unit_names)
+    for step in recipe.route:
+        unit = recipe.step_candidates[step][0]
+        load[unit] += durations[step]
+        visits[unit] += 1
+    for unit, cleaning in enumerate(recipe.unit_cleaning):
+        if cleaning:
+            load[unit] += visits[unit] / wafer_count_threshold * WAFER_COUNT_CLEAN_DURATION
+    return max(load)
+
+
+def _probe(num_wafers, release_interval, recipe):
+    # 用事件引擎跑一批，按晶圆整理出各步和它触发的清洗
+    sim = Task1Simulator(num_wafers=num_wafers, recipe=recipe, release_interval=release_interval)
+    makespan = sim.run()
+    cleans = [[] for _ in range(num_wafers)]
+    for c in sim.cleaning_log:
+        cleans[c['wafer_id'] - 1].append((c['unit'], c['start_time'], c['end_time'], c['reason']))
+    return sim.wafer_paths, cleans, makespan
+
+
+def _shifted(path, cleans, shift):
+    return ([(step, start + shift, end + shift) for step, start, end in path],
+            [(unit, start + shift, end + shift, reason) for unit, start, end, reason in cleans])
+
+
+def _periodic_run(paths, cleans, p, period):
+    # 满足“第 i 片 = 第 i - p 片平移 period”的最长连续晶圆区间 [a, b)
+    best = (0, 0)
+    a = None
+    for i in range(p, len(paths) + 1):
+        # 先比较最后一步的结束时间，绝大多数不成立的情况无需展开整条路径
+        ok = (i < len(paths) and paths[i][-1][2] - paths[i - p][-1][2] == period
+              and (paths[i], cleans[i]) == _shifted(paths[i - p], cleans[i - p], period))
+        if ok and a is None:
+            a = i
+        elif not ok and a is not None:
+            if i - a > best[1] - best[0]:
+                best = (a, i)
+            a = None
+    return best
+
+
+class SteadyState:
+    # 周期结构：period_wafers 片晶圆为一个周期，历时 period 秒；第 ramp 片起进入稳态
+    def __init__(self, recipe, release_interval, period_wafers, ramp, probe_wafers):
+        self.recipe = recipe
+        self.release_interval = release_interval
+        self.period_wafers = period_wafers
+        self.period = period_wafers * release_interval
+        self.ramp = ramp
+        self.probe_wafers = probe_wafers
+        self._probes = {}
+
+    def probe(self, num_wafers):
+        # 与目标片数同余的探测批次，缓存以便生成多种片数时复用
+        probe = self._probes.get(num_wafers)
+        if probe is None:
+            paths, cleans, makespan = _probe(num_wafers, self.release_interval, self.recipe)
+            a, b = _periodic_run(paths, cleans, self.period_wafers, self.period)
+            if b - a < MIN_CYCLES * self.period_wafers:
+                raise ValueError(f"{num_wafers} 片的探测批次没有进入周期 {self.period_wafers}")
+            probe = self._probes[num_wafers] = (paths, cleans, makespan, b)
+        return probe
+
+    def cadence(self):
+        # 一个稳态周期内各模块的占用偏移（相对周期起点）和按原因统计的清洗次数
+        paths, cleans, _, b = self.probe(self.probe_wafers)
+        first = b - self.period_wafers
+        origin = first * self.release_interval
+        names = self.recipe.unit_names
+        step_unit = [cands[0] for cands in self.recipe.step_candidates]
+        offsets = {}
+        cleaning = {}
+        for k, i in enumerate(range(first, b)):
+            for step, start, end in paths[i]:
+                offsets.setdefault(names[step_unit[step]], []).append((k, start - origin, end - origin))
+            for unit, start, end, reason in cleans[i]:
+                per_unit = cleaning.setdefault(names[unit], {})
+                per_unit[reason] = per_unit.get(reason, 0) + 1
+        return {name: sorted(v, key=lambda x: x[1]) for name, v in offsets.items()}, cleaning
+
+    def generate(self, num_wafers):
+        if num_wafers <= self.probe_wafers:
+            paths, cleans, makespan = _probe(num_wafers, self.release_interval, self.recipe)
+            return PeriodicSchedule(self, num_wafers, paths, cleans, num_wafers, 0)
+        p = self.period_wafers
+        size = self.probe_wafers + (num_wafers - self.probe_wafers) % p
+        paths, cleans, _, b = self.probe(size)
+        return PeriodicSchedule(self, num_wafers, paths, cleans, b, (num_wafers - size) // p)
+
+
+class PeriodicSchedule:
+    # 由探测批次拼出的 num_wafers 片调度：[0, b) 照搬，中间重复 cycles 个周期，其后为平移的收尾段
+    def __init__(self, steady, num_wafers, paths, cleans, b, cycles):
+        self.steady = steady
+        self.recipe = steady.recipe
+        self.num_wafers = num_wafers
+        self._paths = paths
+        self._cleans = cleans
+        self._b = b
+        self._cycles = cycles
+        # 周期段逐周期平移，最晚完成的一定在 [0, b)、最后一个周期或收尾段中
+        tail = len(paths) - b
+        last = set(range(min(b, num_wafers))) | set(range(max(0, num_wafers - tail - steady.period_wafers), num_wafers))
+        self.makespan = max(self.wafer(i)[0][-1][2] for i in last)
+
+    def _source(self, i):
+        # 第 i 片对应的探测批次晶圆和平移量
+        b, p, period = self._b, self.steady.period_wafers, self.steady.period
+        if i < b:
+            return i, 0
+        j = i - b
+        if j < self._cycles * p:
+            return b - p + j % p, (j // p + 1) * period
+        return i - self._cycles * p, self._cycles * period
+
+    def wafer(self, i):
+        # (各步 (步骤, 开始, 结束), 触发的清洗 (模块, 开始, 结束, 原因))
+        src, shift = self._source(i)
+        return _shifted(self._paths[src], self._cleans[src], shift)
+
+    def cleaning_count(self):
+        counts = {}
+        for i in range(self.num_wafers):
+            src, _ = self._source(i)
+            for *_, reason in self._cleans[src]:
+                counts[reason] = counts.get(reason, 0) + 1
+        return counts
+
+    def write(self, sink, templates=None):
+        # 逐片写出动作；MoveID 按写出顺序编号（事件引擎按事件顺序编号，两者不同）
+        if templates is None:
+            templates = Task1Simulator(num_wafers=0, record=False, recipe=self.recipe).templates
+        names = self.recipe.unit_names
+        step_names = self.recipe.step_names
+        step_unit = [cands[0] for cands in self.recipe.step_candidates]
+        move_id = 0
+        for i in range(self.num_wafers):
+            path, cleans = self.wafer(i)
+            for unit, start, end, _ in cleans:
+                sink.add_step(CLEANING_TEMPLATE, start, end, move_id, names[unit], f"CLEAN.{names[unit]}", 1)
+                move_id += CLEANING_TEMPLATE.size
+            for step, start, end in path:
+                template = templates[step]
+                sink.add_step(template, start, end, move_id, names[step_unit[step]], f"{i + 1}.{step_names[step]}", 1)
+                move_id += template.size
+        return move_id
+
+
+def find_steady_state(release_interval=None, recipe=RECIPE, probe_wafers=PROBE_WAFERS, max_period=MAX_PERIOD,
+                      step=5):
+    # 给定投片间隔时只检测该间隔；否则从瓶颈下界起按 step 秒递增，取第一个出现周期的间隔
+    if release_interval is not None:
+        candidates = [release_interval]
+    else:
+        low = math.ceil(bottleneck_interval(recipe))
+        candidates = range(low, int(low * 1.5) + 1, step)
+    for interval in candidates:
+        paths, cleans, _ = _probe(probe_wafers, interval, recipe)
+        for p in range(1, max_period + 1):
+            a, b = _periodic_run(paths, cleans, p, p * interval)
+            if b - a >= MIN_CYCLES * p:
+                return SteadyState(recipe, interval, p, a - p, probe_wafers)
+    raise ValueError(f"投片间隔 {list(candidates)} 下 {probe_wafers} 片内均未检测到周期")
+
+
+def cross_check(steady, sizes=CHECK_WAFERS):
+    # 与事件引擎逐片比较各步起止时间、清洗和总完成时间，返回不一致的片数
+    mismatches = {}
+    for n in sizes:
+        schedule = steady.generate(n)
+        paths, cleans, makespan = _probe(n, steady.release_interval, steady.recipe)
+        bad = sum(schedule.wafer(i) != (paths[i], cleans[i]) for i in range(n))
+        if schedule.makespan != makespan:
+            bad += 1
+        mismatches[n] = bad
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Task1 稳态周期调度生成')
+    parser.add_argument('--wafers', type=int, default=10000, help='生成的晶圆数')
+    parser.add_argument('--release-interval', type=float, default=None,
+                        help='投片间隔（秒），默认从瓶颈下界起搜索第一个出现周期的间隔')
+    parser.add_argument('--format', choices=sorted(FORMAT_EXTENSIONS), default=None,
+                        help='写出轨迹文件的格式（默认不写）')
+    parser.add_argument('--output', default=None, help='轨迹输出路径')
+    parser.add_argument('--check', action='store_true', help='在若干小片数下与事件引擎逐片比较')
+    args = parser.parse_args()
+
+    steady = find_steady_state(args.release_interval)
+    offsets, cleaning = steady.cadence()
+    print(f"投片间隔 {steady.release_interval} 秒，周期 {steady.period_wafers} 片 / {steady.period} 秒，"
+          f"第 {steady.ramp} 片起进入稳态（瓶颈下界 {bottleneck_interval():.1f} 秒）")
+    print("每周期清洗：")
+    for unit, counts in cleaning.items():
+        print(f"  {unit:<4} " + "，".join(f"{reason} {n} 次" for reason, n in counts.items()))
+    print("每周期各模块占用（相对周期起点的首个偏移 / 占用次数）：")
+    for unit, intervals in offsets.items():
+        print(f"  {unit:<4} {intervals[0][1]:>8.1f} / {len(intervals)}")
+    if args.check:
+        for n, bad in cross_check(steady).items():
+            print(f"  {n} 片：{'与事件引擎一致' if not bad else f'{bad} 处不一致'}")
+
+    schedule = steady.generate(args.wafers)
+    print(f"{args.wafers} 片晶圆总完成时间: {schedule.makespan:.1f} 秒，清洗 {schedule.cleaning_count()}")
+    if args.format or args.output:
+        fmt = args.format or 'json'
+        output = args.output or 'task_1_periodic_trajectory' + FORMAT_EXTENSIONS[fmt]
+        with open_sink(output, fmt) as sink:
+            schedule.write(sink)
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import math
+import os
+import pickle
+from array import array
+
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    tomllib = None
+
+# Bumped whenever the compiled layout changes, so stale cache files are ignored
+COMPILER_VERSION = 1
+CACHE_DIR_NAME = '.recipe_cache'
+MAX_UNITS = 64  # step -> candidate-unit bitmasks are stored as unsigned 64-bit integers
+
+RECIPE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recipes')
+
+_loaded = {}
+
+
+class Recipe:
+    # Compiled recipe and tool topology. Units and steps are dense integer IDs; names are
+    # only kept to label output.
+    #   unit_slots[u]       slot count of unit u
+    #   unit_duration[u]    per-unit processing time (NaN if the recipe times steps instead)
+    #   unit_cleaning[u]    unit needs periodic cleaning (task1 PMs)
+    #   unit_transport[u]   unit is a transfer robot (task2 TMs)
+    #   step_duration[s]    per-step processing time (NaN if timed by unit)
+    #   step_mask[s]        bitmask of candidate units of step s
+    #   step_candidates[s]  the same candidates as a tuple of unit IDs, in recipe order
+    #   step_kind[s], step_move_type[s]  move-template hints used by task1
+    #   route               step IDs every wafer visits, in order
+    __slots__ = ('name', 'source_hash', 'unit_names', 'unit_index', 'unit_slots', 'unit_duration',
+                 'unit_cleaning', 'unit_transport', 'step_names', 'step_index', 'step_duration',
+                 'step_mask', 'step_candidates', 'step_kind', 'step_move_type', 'route')
+
+    def unit_duration_list(self):
+        return [as_number(d) for d in self.unit_duration]
+
+    def step_duration_list(self):
+        return [as_number(d) for d in self.step_duration]
+
+
+def as_number(value):
+    # Durations are stored as doubles; hand integral ones back as int so output stays "15", not "15.0"
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _expand_route(route, step_index):
+    steps = []
+    for entry in route:
+        if isinstance(entry, dict):
+            if 'range' in entry:
+                start, stop = entry['range']
+                names = [str(i) for i in range(start, stop)]
+            else:
+                names = [str(name) for name in entry['steps']]
+            block = [step_index[name] for name in names]
+            steps.extend(block * entry.get('repeat', 1))
+        else:
+            steps.append(step_index[str(entry)])
+    return steps
+
+
+def compile_recipe(spec, source_hash=None):
+    units = spec['units']
+    if len(units) > MAX_UNITS:
+        raise ValueError(f"recipe has {len(units)} units, at most {MAX_UNITS} are supported")
+    recipe = Recipe()
+    recipe.name = spec.get('name', '')
+    recipe.source_hash = source_hash
+    recipe.unit_names = tuple(units)
+    recipe.unit_index = {name: i for i, name in enumerate(recipe.unit_names)}
+    recipe.unit_slots = array('i', (units[n].get('slots', 1) for n in recipe.unit_names))
+    recipe.unit_duration = array('d', (units[n].get('duration', math.nan) for n in recipe.unit_names))
+    recipe.unit_cleaning = array('b', (bool(units[n].get('cleaning', False)) for n in recipe.unit_names))
+    recipe.unit_transport = array('b', (bool(units[n].get('transport', False)) for n in recipe.unit_names))
+
+    steps = spec['steps']
+    recipe.step_names = tuple(str(name) for name in steps)
+    recipe.step_index = {name: i for i, name in enumerate(recipe.step_names)}
+    recipe.step_duration = array('d', (s.get('duration', math.nan) for s in steps.values()))
+    candidates = []
+    masks = array('Q')
+    for name, step in steps.items():
+        try:
+            ids = tuple(recipe.unit_index[u] for u in step['units'])
+        except KeyError as e:
+            raise ValueError(f"step {name} uses unknown unit {e.args[0]}") from None
+        candidates.append(ids)
+        masks.append(sum(1 << u for u in set(ids)))
+    recipe.step_candidates = tuple(candidates)
+    recipe.step_mask = masks
+    recipe.step_kind = tuple(s.get('kind', 'transfer') for s in steps.values())
+    recipe.step_move_type = array('b', (s.get('move_type', 0) for s in steps.values()))
+    try:
+        recipe.route = array('i', _expand_route(spec['route'], recipe.step_index))
+    except KeyError as e:
+        raise ValueError(f"route references unknown step {e.args[0]}") from None
+    return recipe
+
+
+def parse_recipe(data, path):
+    if path.endswith('.toml'):
+        if tomllib is None:
+            raise ValueError(f"{path}: TOML recipes need Python 3.11+ (tomllib); use the JSON form instead")
+        return tomllib.loads(data.decode('utf-8'))
+    return json.loads(data)
+
+
+def load_recipe(path, cache_dir=None):
+    # Load a JSON/TOML recipe, reusing the compiled form cached on disk under the file's hash
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data + f'|v{COMPILER_VERSION}'.encode()).hexdigest()
+    if digest in _loaded:
+        return _loaded[digest]
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR_NAME)
+    cache_path = os.path.join(cache_dir, f'{digest}.pickle')
+    recipe = None
+    try:
+        with open(cache_path, 'rb') as f:
+            recipe = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        recipe = None
+    if recipe is None:
+        recipe = compile_recipe(parse_recipe(data, path), digest)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(recipe, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # read-only checkout: compile on every start instead
+    _loaded[digest] = recipe
+    return recipe
+
+
+def default_recipe_path(name):
+    return os.path.join(RECIPE_DIR, f'{name}.json')
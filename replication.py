@@ -0,0 +1,70 @@
+import math
+import statistics
+
+import numpy as np
+
+# Sequential replication for run_validation_experiments. Every (scenario, mode) cell runs
+# replicas in rounds until the confidence intervals of its makespan mean and standard deviation
+# are both narrower than `target` (a half-width relative to the mean), or a cap is reached.
+# Replica r of a scenario uses the same seed in every mode, so all modes see the same sampled
+# durations and faults (common random numbers) and modes compare replica by replica.
+# Quantiles use the Cornish-Fisher expansion of Student's t and the Wilson-Hilferty
+# approximation of chi-square, accurate to well under 1% from 5 degrees of freedom.
+
+CONFIDENCE = 0.95
+TARGET_CI = 0.02  # CI half-width relative to the mean makespan
+MIN_REPLICAS = 10
+MAX_REPLICAS = 200
+ROUND = 10  # replicas added per round to a cell that has not converged
+EXPERIMENT_SEED = 0
+
+
+def replica_seed(scenario_index, replica, root=EXPERIMENT_SEED):
+    # Integer seed (run_scheduling also seeds random.Random with it) of one replica of a scenario
+    return int(np.random.SeedSequence([root, scenario_index, replica]).generate_state(1)[0])
+
+
+def t_quantile(p, df):
+    z = statistics.NormalDist().inv_cdf(p)
+    return (z + (z ** 3 + z) / (4 * df) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3))
+
+
+def chi2_quantile(p, df):
+    z = statistics.NormalDist().inv_cdf(p)
+    return df * (1 - 2 / (9 * df) + z * math.sqrt(2 / (9 * df))) ** 3
+
+
+def mean_ci(values, confidence=CONFIDENCE):
+    n = len(values)
+    mean = statistics.mean(values)
+    if n < 2:
+        return mean, mean
+    half = t_quantile((1 + confidence) / 2, n - 1) * statistics.stdev(values) / math.sqrt(n)
+    return mean - half, mean + half
+
+
+def std_ci(values, confidence=CONFIDENCE):
+    n = len(values)
+    if n < 2:
+        return 0, math.inf
+    s, df = statistics.stdev(values), n - 1
+    return (s * math.sqrt(df / chi2_quantile((1 + confidence) / 2, df)),
+            s * math.sqrt(df / chi2_quantile((1 - confidence) / 2, df)))
+
+
+def converged(values, target=TARGET_CI, confidence=CONFIDENCE, min_replicas=MIN_REPLICAS):
+    if len(values) < max(min_replicas, 2):
+        return False
+    scale = abs(statistics.mean(values)) or 1
+    mean_low, mean_high = mean_ci(values, confidence)
+    std_low, std_high = std_ci(values, confidence)
+    return (mean_high - mean_low) / 2 <= target * scale and (std_high - std_low) / 2 <= target * scale
+
+
+def paired_difference(values, reference, confidence=CONFIDENCE):
+    # Mean and CI of values[r] - reference[r] over the replicas both cells ran (a shared prefix)
+    pairs = [a - b for a, b in zip(values, reference) if math.isfinite(a) and math.isfinite(b)]
+    if not pairs:
+        return {'mean_diff': 0, 'ci': [0, 0], 'replicas': 0}
+    return {'mean_diff': statistics.mean(pairs), 'ci': list(mean_ci(pairs, confidence)), 'replicas': len(pairs)}
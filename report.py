@@ -0,0 +1,164 @@
+import gzip
+import json
+from bisect import bisect_left
+
+import numpy as np
+
+# task1 的运行报告。Task1Simulator(reporter=Reporter(...)) 在模拟循环中调用：
+#   conflict(wafer, step, unit, time, delay)    晶圆因模块占用或清洗被推迟
+#   cleaning(unit, reason, start, end, extra)   每次清洗（含 maintenance 策略触发的）
+#   step(wafer, step, unit, start, end)         每步分配，仅在明细级别为 'step' 时调用
+#   wafer_done(wafer, release, time)            晶圆完成最后一步
+# 循环内只做常数时间的汇总：按 (模块, 步骤) 的冲突延迟直方图、按原因的清洗次数和时长、
+# 每片晶圆的周期时间；运行结束后 print_summary() 一次性输出。
+# 逐事件明细写入 EventLog（JSONL，路径以 .gz 结尾时 gzip 压缩），按级别过滤并分块缓冲，
+# 默认关闭，关闭时不做任何序列化。
+
+# 冲突延迟直方图的桶上界（秒），最后一个桶为超过最大上界的延迟
+DELAY_BINS = (1, 5, 10, 30, 60, 120, 300, 600)
+
+# 明细级别：每一级包含前面各级的事件
+EVENT_LEVELS = {'off': 0, 'cleaning': 1, 'conflict': 2, 'step': 3}
+DEFAULT_BUFFER_EVENTS = 4096
+
+
+class EventLog:
+    def __init__(self, path=None, level='off', buffer_events=DEFAULT_BUFFER_EVENTS):
+        self.path = path
+        self.level = EVENT_LEVELS[level] if path else 0
+        self.buffer_events = buffer_events
+        self.buffer = []
+        self.count = 0
+        self.f = None
+        if self.level:
+            self.f = gzip.open(path, 'wt', encoding='utf-8') if path.endswith('.gz') \
+                else open(path, 'w', encoding='utf-8')
+
+    def enabled(self, level):
+        return self.level >= EVENT_LEVELS[level]
+
+    def emit(self, event):
+        self.buffer.append(json.dumps(event, ensure_ascii=False, separators=(',', ':')))
+        if len(self.buffer) >= self.buffer_events:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.f.write('\n'.join(self.buffer) + '\n')
+            self.count += len(self.buffer)
+            self.buffer = []
+
+    def close(self):
+        if self.f is not None and not self.f.closed:
+            self.flush()
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class Reporter:
+    def __init__(self, events=None, delay_bins=DELAY_BINS):
+        self.events = events or EventLog()
+        self.delay_bins = delay_bins
+        self.trace_conflicts = self.events.enabled('conflict')
+        self.trace_cleaning = self.events.enabled('cleaning')
+        self.trace_steps = self.events.enabled('step')
+
+    def reset(self, sim):
+        # 每次运行开始时由 Task1Simulator.run 调用
+        self.unit_names = sim.recipe.unit_names
+        self.step_names = sim.recipe.step_names
+        self.delays = {}  # (unit, step) -> [各桶计数, 次数, 总延迟, 最大延迟]
+        self.cleanings = {}  # reason -> [次数, 总时长]
+        self.cycle_times = []
+        self.makespan = 0
+
+    def conflict(self, wafer_id, step, unit, time, delay):
+        stats = self.delays.get((unit, step))
+        if stats is None:
+            stats = self.delays[(unit, step)] = [[0] * (len(self.delay_bins) + 1), 0, 0.0, 0.0]
+        stats[0][bisect_left(self.delay_bins, delay)] += 1
+        stats[1] += 1
+        stats[2] += delay
+        if delay > stats[3]:
+            stats[3] = delay
+        if self.trace_conflicts:
+            self.events.emit({'event': 'conflict', 'wafer': wafer_id + 1, 'step': self.step_names[step],
+                              'unit': self.unit_names[unit], 'time': time, 'delay': delay})
+
+    def cleaning(self, unit, reason, start, end, extra):
+        stats = self.cleanings.get(reason)
+        if stats is None:
+            stats = self.cleanings[reason] = [0, 0.0]
+        stats[0] += 1
+        stats[1] += end - start
+        if self.trace_cleaning:
+            self.events.emit({'event': 'cleaning', 'unit': self.unit_names[unit], 'reason': reason,
+                              'start': start, 'end': end, **extra})
+
+    def step(self, wafer_id, step, unit, start, end):
+        self.events.emit({'event': 'step', 'wafer': wafer_id + 1, 'step': self.step_names[step],
+                          'unit': self.unit_names[unit], 'start': start, 'end': end})
+
+    def wafer_done(self, wafer_id, release, time):
+        self.cycle_times.append(time - release)
+        if time > self.makespan:
+            self.makespan = time
+
+    def summary(self):
+        delays = {}
+        for (unit, step), (counts, n, total, longest) in sorted(self.delays.items()):
+            delays[f"{self.unit_names[unit]}/{self.step_names[step]}"] = {
+                'count': n, 'total': total, 'mean': total / n, 'max': longest, 'histogram': counts
+            }
+        cleanings = {reason: {'count': n, 'total': total, 'mean': total / n}
+                     for reason, (n, total) in sorted(self.cleanings.items())}
+        cycle = {'wafers': len(self.cycle_times)}
+        if self.cycle_times:
+            values = np.asarray(self.cycle_times)
+            cycle.update({'min': float(values.min()), 'mean': float(values.mean()),
+                          'p50': float(np.percentile(values, 50)), 'p95': float(np.percentile(values, 95)),
+                          'max': float(values.max())})
+        return {'makespan': self.makespan, 'delay_bins': list(self.delay_bins), 'delays': delays,
+                'cleanings': cleanings, 'cycle_time': cycle, 'events_written': self.events.count}
+
+    def close(self):
+        self.events.close()
+
+
+def print_summary(reporter):
+    summary = reporter.summary()
+    bins = [f"≤{b}" for b in reporter.delay_bins] + [f">{reporter.delay_bins[-1]}"]
+
+    print("\n冲突延迟（按模块/步骤）:")
+    if summary['delays']:
+        print(f"{'模块/步骤':<12} {'次数':>6} {'平均(秒)':>9} {'最大(秒)':>9} " + ' '.join(f"{b:>6}" for b in bins))
+        for key, d in summary['delays'].items():
+            print(f"{key:<12} {d['count']:>6} {d['mean']:>9.1f} {d['max']:>9.1f} "
+                  + ' '.join(f"{c:>6}" for c in d['histogram']))
+        count = sum(d['count'] for d in summary['delays'].values())
+        total = sum(d['total'] for d in summary['delays'].values())
+        print(f"共 {count} 次冲突，累计延迟 {total:.1f} 秒")
+    else:
+        print("无模块冲突。")
+
+    print("\n清洗统计（按原因）:")
+    if summary['cleanings']:
+        print(f"{'原因':<12} {'次数':>6} {'总时长(秒)':>10} {'平均(秒)':>9}")
+        for reason, c in summary['cleanings'].items():
+            print(f"{reason:<12} {c['count']:>6} {c['total']:>10.1f} {c['mean']:>9.1f}")
+    else:
+        print("无清洗事件。")
+
+    cycle = summary['cycle_time']
+    print(f"\n晶圆周期时间（{cycle['wafers']} 片）:")
+    if cycle['wafers']:
+        print(f"  最短 {cycle['min']:.1f}  平均 {cycle['mean']:.1f}  中位数 {cycle['p50']:.1f}  "
+              f"P95 {cycle['p95']:.1f}  最长 {cycle['max']:.1f} 秒")
+    if summary['events_written']:
+        print(f"\n明细事件 {summary['events_written']} 条已写入 {reporter.events.path}")
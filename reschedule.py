@@ -0,0 +1,305 @@
+import argparse
+import json
+import random
+import statistics
+import time
+from bisect import bisect_left
+from heapq import heappop, heappush
+
+import task2
+from trajectory import ListSink
+
+# Online re-planning for the task2 engine. Replanner runs the same event loop as
+# task2._schedule (same dispatch rules, TM overlap and RNG use, no random disruptions) and
+# snapshots its state every `checkpoint_every` events: slot availability, queue lengths, TM
+# timestamps, per-wafer route position, the event heap and the RNG state. External events
+# then revise the plan:
+#   {'kind': 'fault', 'unit': 'PM7', 'slot': 1, 'time': t, 'repair': 100}
+#       the slot is down during [t, t + repair); a move that would overlap that window starts
+#       after the repair instead (a wafer in process at t is re-processed once it is back)
+#   {'kind': 'duration', 'unit': 'PM7', 'time': t, 'duration': d}
+#       moves on the unit that start at or after t take d seconds
+# Only moves that end after the fault starts (or start after the duration change) can differ,
+# so apply() restores the last checkpoint taken before the first such move was dispatched and
+# replays the suffix from there. When the replay reaches a checkpoint whose state matches the
+# old plan's after a fault window has passed, the rest of the old plan is reused as is.
+# apply() returns the moves whose unit, slot or times changed, and the re-plan latency.
+
+CHECKPOINT_EVERY = 50  # events between checkpoints
+FAULT_REPAIR = 100  # seconds a faulted slot is down, as in task2.handle_disruption
+
+
+class Replanner:
+    def __init__(self, params=None, adaptive=True, seed=None, recipe=task2.RECIPE, num_wafers=task2.NUM_WAFERS,
+                 checkpoint_every=CHECKPOINT_EVERY):
+        if not adaptive and seed is None:
+            raise ValueError('random dispatch needs a seed to be replayed from checkpoints')
+        self.params = params or task2.default_params
+        self.adaptive = adaptive
+        self.seed = seed
+        self.recipe = recipe
+        self.num_wafers = num_wafers
+        self.checkpoint_every = checkpoint_every
+        self.route = recipe.route.tolist()
+        self.duration = recipe.unit_duration_list()
+        self.is_tm = list(recipe.unit_transport)
+        self.down = [[[] for _ in range(n)] for n in recipe.unit_slots]  # fault windows (start, end) per slot
+        self.retimed = [[] for _ in recipe.unit_names]  # duration changes (time, duration) per unit, by time
+        self.events = []
+        # Plan: moves (events popped before dispatch, wafer, route position, unit, slot, start, end)
+        # in dispatch order; checkpoints (events popped, moves dispatched, state)
+        self.moves = []
+        self.checkpoints = []
+        self.makespan = 0
+
+    def plan(self):
+        self.moves, self.checkpoints, self.makespan, _, _ = self._run(None)
+        return self.makespan
+
+    def _fit(self, unit, slot, start):
+        # Earliest start >= start whose move avoids the slot's fault windows, with its duration
+        while True:
+            duration = self.duration[unit]
+            for t, d in self.retimed[unit]:
+                if t > start:
+                    break
+                duration = d
+            for t0, t1 in self.down[unit][slot]:
+                if start < t1 and start + duration > t0:
+                    start = t1
+                    break
+            else:
+                return start, duration
+
+    def _run(self, checkpoint, old=None, settled_after=None):
+        # Event loop from a checkpoint (None: from t=0). With `old` = (moves, checkpoints, makespan)
+        # the replay stops at the first checkpoint past settled_after whose state equals the old
+        # plan's, and returns the rest of the old plan. Returns (moves, checkpoints, makespan,
+        # old tail reused, events popped)
+        recipe, params, adaptive = self.recipe, self.params, self.adaptive
+        route, route_len, duration, is_tm = self.route, len(self.route), self.duration, self.is_tm
+        down, retimed, fit = self.down, self.retimed, self._fit
+        every = self.checkpoint_every
+        select = task2.select_module_and_slot
+        rng = random.Random(self.seed) if self.seed is not None else random
+        if checkpoint is None:
+            slot_available = [[0] * n for n in recipe.unit_slots]
+            slot_queue_length = [[0] * n for n in recipe.unit_slots]
+            last_tm_action = [0] * len(recipe.unit_names)
+            wafer_pos = [1] * self.num_wafers
+            event_queue = []
+            n, max_completion_time, moves, checkpoints = 0, 0, [], []
+            first = 0
+        else:
+            n, m, (slot_available, slot_queue_length, last_tm_action, wafer_pos, event_queue, rng_state,
+                   max_completion_time) = checkpoint
+            slot_available = [list(a) for a in slot_available]
+            slot_queue_length = [list(q) for q in slot_queue_length]
+            last_tm_action, wafer_pos, event_queue = list(last_tm_action), list(wafer_pos), list(event_queue)
+            if rng_state is not None:
+                rng.setstate(rng_state)
+            moves, checkpoints = self.moves[:m], self.checkpoints[:bisect_left(self.checkpoints, (n + 1,))]
+            first = n
+        slot_index = task2.build_slot_index(recipe, params, slot_available) if adaptive else None
+        if slot_index is not None and checkpoint is not None:
+            for unit, queue in enumerate(slot_queue_length):
+                slot_index.update(unit, load=sum(queue))
+        old_at = {c[0]: i for i, c in enumerate(old[1])} if old is not None else {}
+
+        def dispatch(wafer, pos, now):
+            step = route[pos]
+            unit, slot = select(step, params, adaptive, slot_index, rng, now, recipe)
+            queue = slot_queue_length[unit]
+            queue[slot] += 1
+            start = max(now, slot_available[unit][slot])
+            if is_tm[unit]:
+                start = max(start, last_tm_action[unit] - task2.TM_OVERLAP)
+            if down[unit][slot] or retimed[unit]:
+                start, d = fit(unit, slot, start)
+            else:
+                d = duration[unit]
+            if is_tm[unit]:
+                last_tm_action[unit] = start + d
+            end = start + d
+            slot_available[unit][slot] = end
+            if slot_index is not None:
+                slot_index.update(unit, slot, end, sum(queue))
+            moves.append((n, wafer, pos, unit, slot, start, end))
+            heappush(event_queue, (end, wafer, step, unit, slot, 0))
+
+        if checkpoint is None:
+            for i in range(self.num_wafers):
+                dispatch(i, 0, 0)
+        while event_queue:
+            if n and n % every == 0 and (not checkpoints or checkpoints[-1][0] < n):
+                state = ([list(a) for a in slot_available], [list(q) for q in slot_queue_length],
+                         list(last_tm_action), list(wafer_pos), list(event_queue),
+                         None if adaptive else rng.getstate(), max_completion_time)
+                if n in old_at and settled_after is not None and event_queue[0][0] >= settled_after:
+                    k = old_at[n]
+                    old_m, old_state = old[1][k][1], old[1][k][2]
+                    if (old_state[:4] == state[:4] and sorted(old_state[4]) == sorted(state[4])
+                            and old_state[5] == state[5]):
+                        return moves + old[0][old_m:], checkpoints + old[1][k:], old[2], True, n - first
+                checkpoints.append((n, len(moves), state))
+            current_time, wafer_id, _, unit, slot, _ = heappop(event_queue)
+            n += 1
+            max_completion_time = max(max_completion_time, current_time)
+            slot_queue_length[unit][slot] -= 1
+            if slot_index is not None:
+                slot_index.update(unit, slot, slot_available[unit][slot], sum(slot_queue_length[unit]))
+            pos = wafer_pos[wafer_id]
+            if pos >= route_len:
+                continue
+            wafer_pos[wafer_id] = pos + 1
+            dispatch(wafer_id, pos, current_time)
+        return moves, checkpoints, max_completion_time, False, n - first
+
+    def _affected(self, event):
+        # Events popped before the first move of the current plan the event can change, or None
+        unit = self.recipe.unit_index[event['unit']]
+        t = event['time']
+        if event['kind'] == 'fault':
+            slot, t1 = event.get('slot', 1) - 1, t + event.get('repair', FAULT_REPAIR)
+            for k, _, _, u, s, start, end in self.moves:
+                if u == unit and s == slot and end > t and start < t1:
+                    return k
+        else:
+            for k, _, _, u, _, start, end in self.moves:
+                if u == unit and start >= t and end - start != event['duration']:
+                    return k
+        return None
+
+    def apply(self, event):
+        t0 = time.perf_counter()
+        if event['kind'] not in ('fault', 'duration'):
+            raise ValueError(f"unknown event kind {event['kind']!r}")
+        if not self.moves:
+            self.plan()
+        unit = self.recipe.unit_index[event['unit']]
+        k = self._affected(event)
+        settled_after = None
+        if event['kind'] == 'fault':
+            settled_after = event['time'] + event.get('repair', FAULT_REPAIR)
+            windows = self.down[unit][event.get('slot', 1) - 1]
+            windows.append((event['time'], settled_after))
+            windows.sort()
+        else:
+            self.retimed[unit].append((event['time'], event['duration']))
+            self.retimed[unit].sort()
+        self.events.append(event)
+        result = {'event': event, 'changed': [], 'makespan': self.makespan, 'replayed_events': 0,
+                  'checkpoint_time': None, 'reused_tail': False}
+        if k is not None:
+            i = bisect_left(self.checkpoints, (k,)) - 1  # last checkpoint taken before that dispatch
+            checkpoint = self.checkpoints[i] if i >= 0 else None
+            old = (self.moves, self.checkpoints, self.makespan)
+            start = checkpoint[1] if checkpoint is not None else 0
+            self.moves, self.checkpoints, self.makespan, reused, replayed = self._run(checkpoint, old, settled_after)
+            result['changed'] = self._diff(old[0][start:], self.moves[start:])
+            result['makespan'] = self.makespan
+            # Simulated time the replay resumed from: the next pending event of the checkpoint
+            result['checkpoint_time'] = checkpoint[2][4][0][0] if checkpoint is not None else 0
+            result['replayed_events'] = replayed
+            result['reused_tail'] = reused
+        result['latency_ms'] = (time.perf_counter() - t0) * 1000
+        return result
+
+    def _diff(self, old, new):
+        names, step_names = self.recipe.unit_names, self.recipe.step_names
+        before = {(w, pos): (u, s, start, end) for _, w, pos, u, s, start, end in old}
+        changed = []
+        for _, w, pos, u, s, start, end in new:
+            prev = before.get((w, pos))
+            if prev != (u, s, start, end):
+                record = {'MatID': f"{w + 1}.{step_names[self.route[pos]]}",
+                          'new': {'ModuleName': names[u], 'SlotID': s + 1, 'StartTime': start, 'EndTime': end}}
+                if prev is not None:
+                    pu, ps, pstart, pend = prev
+                    record['old'] = {'ModuleName': names[pu], 'SlotID': ps + 1, 'StartTime': pstart, 'EndTime': pend}
+                changed.append(record)
+        return sorted(changed, key=lambda r: r['new']['StartTime'])
+
+    def write(self, sink):
+        # Current plan in dispatch order, numbered and typed as task2 trajectories
+        names, step_names = self.recipe.unit_names, self.recipe.step_names
+        move_id = 0
+        for _, w, pos, u, s, start, end in self.moves:
+            move_id = task2.get_move_types(sink, step_names[self.route[pos]], names[u], s + 1, start, end, w, move_id)
+        return move_id
+
+
+def random_events(replanner, count, kind='mixed', seed=0):
+    # Faults on a random slot and +-20% duration changes on a random non-transport unit,
+    # at times spread over the first 80% of the nominal makespan
+    rng = random.Random(seed)
+    recipe = replanner.recipe
+    horizon = replanner.makespan or replanner.plan()
+    process = [u for u, tm in enumerate(recipe.unit_transport) if not tm]
+    events = []
+    for _ in range(count):
+        t = round(rng.uniform(0, 0.8 * horizon), 1)
+        if kind == 'fault' or (kind == 'mixed' and rng.random() < 0.5):
+            unit = rng.randrange(len(recipe.unit_names))
+            events.append({'kind': 'fault', 'unit': recipe.unit_names[unit],
+                           'slot': rng.randrange(recipe.unit_slots[unit]) + 1, 'time': t, 'repair': FAULT_REPAIR})
+        else:
+            unit = rng.choice(process)
+            events.append({'kind': 'duration', 'unit': recipe.unit_names[unit], 'time': t,
+                           'duration': round(replanner.duration[unit] * rng.uniform(0.8, 1.2))})
+    return sorted(events, key=lambda e: e['time'])
+
+
+def check_against_engine(params=None, adaptive=True, seed=0):
+    # Without events the plan must reproduce run_scheduling(..., 'none') move for move
+    replanner = Replanner(params, adaptive, seed)
+    replanner.plan()
+    sink, expected = ListSink(), ListSink()
+    replanner.write(sink)
+    task2.run_scheduling(params or task2.default_params, [], task2.step_units, task2.step_durations, 'none', adaptive,
+                         sink=expected, seed=seed)
+    return sink.moves == expected.moves
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Re-plan a task2 lot from checkpoints after faults and duration changes')
+    parser.add_argument('--events', type=int, default=20, help='random events to apply in time order')
+    parser.add_argument('--kind', choices=['fault', 'duration', 'mixed'], default='mixed')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the event generator and of random dispatch')
+    parser.add_argument('--random', action='store_true', help='random dispatch instead of the adaptive rule')
+    parser.add_argument('--checkpoint-every', type=int, default=CHECKPOINT_EVERY, help='events between checkpoints')
+    parser.add_argument('--diff', default=None, help='write each event and its changed moves as JSON lines')
+    parser.add_argument('--output', default=None, help='write the final plan as a trajectory')
+    args = parser.parse_args()
+
+    adaptive = not args.random
+    print(f"Plan matches run_scheduling: {check_against_engine(adaptive=adaptive, seed=args.seed)}")
+    replanner = Replanner(adaptive=adaptive, seed=args.seed, checkpoint_every=args.checkpoint_every)
+    t0 = time.perf_counter()
+    replanner.plan()
+    full_ms = (time.perf_counter() - t0) * 1000
+    print(f"Nominal makespan {replanner.makespan:.1f} s, {len(replanner.moves)} moves, "
+          f"{len(replanner.checkpoints)} checkpoints, full plan {full_ms:.2f} ms")
+
+    diff = open(args.diff, 'w') if args.diff else None
+    latencies = []
+    print(f"{'time':>8} {'event':<24} {'from':>8} {'replayed':>9} {'changed':>8} {'makespan':>9} {'ms':>7}")
+    for event in random_events(replanner, args.events, args.kind, args.seed):
+        r = replanner.apply(event)
+        latencies.append(r['latency_ms'])
+        what = (f"fault {event['unit']}/{event['slot']}" if event['kind'] == 'fault'
+                else f"{event['unit']} -> {event['duration']} s")
+        start = '-' if r['checkpoint_time'] is None else f"{r['checkpoint_time']:.0f}"
+        print(f"{event['time']:>8.1f} {what:<24} {start:>8} {r['replayed_events']:>9} {len(r['changed']):>8} "
+              f"{r['makespan']:>9.1f} {r['latency_ms']:>7.2f}" + (' (tail reused)' if r['reused_tail'] else ''))
+        if diff is not None:
+            diff.write(json.dumps({'event': event, 'latency_ms': r['latency_ms'], 'changed': r['changed']},
+                                  ensure_ascii=False) + '\n')
+    if diff is not None:
+        diff.close()
+    if latencies:
+        print(f"Re-plan latency: mean {statistics.mean(latencies):.2f} ms, max {max(latencies):.2f} ms "
+              f"(full plan {full_ms:.2f} ms)")
+    if args.output:
+        with task2.open_sink(args.output, 'json') as sink:
+            replanner.write(sink)
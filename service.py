@@ -0,0 +1,520 @@
+import argparse
+import asyncio
+import hashlib
+import http.client
+import json
+import math
+import os
+import shutil
+import socket
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+
+import task1
+import task2
+from bounds import optimality_gap
+from maintenance import POLICIES
+from recipe import default_recipe_path, load_recipe
+from report import Reporter
+from stochastic import SCENARIO_MODELS
+from trajectory import FORMAT_EXTENSIONS, open_sink
+
+# Long-running local scheduling service. Planners POST schedule requests over HTTP, on a Unix
+# socket or on localhost, instead of starting a process per call:
+#   POST /schedule          {'engine': 'task2', 'recipe': 'task2', 'num_wafers': 75, 'seed': 0,
+#                            'scenario': 'none', 'adaptive': true, 'params': {...}, 'trajectory': 'columnar'}
+#                           task1 takes 'release_interval' and 'maintenance' instead of scenario/adaptive/params.
+#                           Returns {'key', 'cached', 'metrics', 'trajectory': URL of the file, if asked}.
+#                           A run that fails or aborts answers 422 and is not cached.
+#   GET  /results/KEY       metrics of a cached result; /results/KEY/trajectory returns its file
+#   POST /chart             a schedule request plus 'color', 'start', 'end'; returns a Gantt PNG
+#   GET  /stats             cache and pool counters
+# Runs go to a process pool whose workers import the engines once and keep one warm simulator
+# per task1 configuration. Results live in an on-disk LRU cache, one directory per request,
+# keyed by the SHA-256 of the canonical request: defaults filled in, params merged over
+# task2.default_params, and the recipe replaced by the digest of its file, so an edited recipe
+# misses the cache. Identical requests in flight share one run. matplotlib is only imported
+# by the worker that renders the first chart.
+
+CACHE_VERSION = 1  # bump when engine changes make cached results stale
+DEFAULT_CACHE_DIR = '.schedule_cache'
+DEFAULT_CACHE_MB = 1024
+DEFAULT_PORT = 8765
+MAX_WAFERS = 100000
+MAX_SIMULATORS = 8  # warm task1 simulators kept per worker, least recently used dropped first
+MAX_BODY = 1 << 20
+RESULT_FILE = 'result.json'
+CONTENT_TYPES = {'json': 'application/json', 'ndjson': 'application/x-ndjson',
+                 'columnar': 'application/octet-stream'}
+
+
+class BadRequest(ValueError):
+    pass
+
+
+class RunFailed(RuntimeError):
+    # The engine aborted or failed; such runs are reported as errors and never cached
+    def __init__(self, metrics):
+        super().__init__('the run did not complete' +
+                         (f": {metrics['violation']}" if metrics.get('violation') else ''))
+        self.metrics = metrics
+
+
+def _recipe_file(name):
+    path = name if os.path.exists(name) else default_recipe_path(name)
+    if not os.path.exists(path):
+        raise BadRequest(f"unknown recipe {name!r}")
+    with open(path, 'rb') as f:
+        return path, hashlib.sha256(f.read()).hexdigest()
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _params(params):
+    # Merged over default_params; slot preferences arrive from JSON with string slot numbers
+    if params is None:
+        params = {}
+    if not isinstance(params, dict):
+        raise BadRequest('params must be an object')
+    unknown = sorted(set(params) - set(task2.default_params))
+    if unknown:
+        raise BadRequest(f"unknown params {unknown}; expected keys of {sorted(task2.default_params)}")
+    merged = {**task2.default_params, **params}
+    for name, value in merged.items():
+        if name not in ('module_preference', 'slot_preference') and not _number(value):
+            raise BadRequest(f"params.{name} must be a finite number")
+    modules = merged['module_preference']
+    if not isinstance(modules, dict) or not all(_number(v) for v in modules.values()):
+        raise BadRequest('params.module_preference must map unit names to finite numbers')
+    slots = merged['slot_preference']
+    if not isinstance(slots, dict) or not all(isinstance(v, dict) for v in slots.values()):
+        raise BadRequest('params.slot_preference must map unit names to {slot number: preference} objects')
+    try:
+        merged['slot_preference'] = {unit: {int(slot): value for slot, value in prefs.items()}
+                                     for unit, prefs in slots.items()}
+    except ValueError:
+        raise BadRequest('params.slot_preference slot numbers must be integers')
+    if not all(_number(v) for prefs in merged['slot_preference'].values() for v in prefs.values()):
+        raise BadRequest('params.slot_preference values must be finite numbers')
+    return merged
+
+
+def canonical_request(request):
+    # Returns (canonical request, recipe path); the canonical form is what the cache key hashes
+    if not isinstance(request, dict):
+        raise BadRequest('request must be a JSON object')
+    engine = request.get('engine') or (request.get('recipe') if request.get('recipe') in ('task1', 'task2')
+                                        else 'task2')
+    if engine not in ('task1', 'task2'):
+        raise BadRequest(f"unknown engine {engine!r}")
+    path, digest = _recipe_file(request.get('recipe') or engine)
+    num_wafers = request.get('num_wafers', task1.NUM_WAFERS if engine == 'task1' else task2.NUM_WAFERS)
+    if not isinstance(num_wafers, int) or not 0 < num_wafers <= MAX_WAFERS:
+        raise BadRequest(f"num_wafers must be an integer in 1..{MAX_WAFERS}")
+    seed = request.get('seed', 0)
+    if not isinstance(seed, int):
+        raise BadRequest('seed must be an integer; unseeded runs are not reproducible')
+    trajectory = request.get('trajectory')
+    if trajectory is not None and trajectory not in FORMAT_EXTENSIONS:
+        raise BadRequest(f"trajectory must be one of {sorted(FORMAT_EXTENSIONS)}")
+    canon = {'version': CACHE_VERSION, 'engine': engine, 'recipe': digest, 'num_wafers': num_wafers,
+             'trajectory': trajectory}
+    if engine == 'task1':
+        # task1 is deterministic, so the seed is accepted but not part of the key
+        policy = request.get('maintenance')
+        if policy is not None and policy not in POLICIES:
+            raise BadRequest(f"maintenance must be one of {sorted(POLICIES)}")
+        canon.update(release_interval=float(request.get('release_interval', 0)), maintenance=policy)
+    else:
+        scenario = request.get('scenario', 'none')
+        if scenario not in SCENARIO_MODELS:
+            raise BadRequest(f"scenario must be one of {sorted(SCENARIO_MODELS)}")
+        canon.update(seed=seed, scenario=scenario, adaptive=bool(request.get('adaptive', True)),
+                     params=_params(request.get('params')))
+    return canon, path
+
+
+def request_key(canon):
+    text = json.dumps(canon, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+# ---------- worker side ----------
+
+_recipes = {}
+_simulators = OrderedDict()
+
+
+def _warm():
+    # Pool initializer: compile both default recipes, the bound memos and the move templates
+    # once per worker, so the first real request does not pay for them
+    task1.Task1Simulator(num_wafers=1, record=False).run()
+    task2.run_scheduling(task2.default_params, [], task2.step_units, task2.step_durations, 'none', True,
+                         metrics_only=True, seed=0, num_wafers=1)
+
+
+def _recipe(path):
+    recipe = _recipes.get(path)
+    if recipe is None:
+        recipe = _recipes[path] = load_recipe(path)
+    return recipe
+
+
+def _task2_tables(path):
+    # run_scheduling takes name-keyed tables; the default recipe maps to the module's own
+    if os.path.abspath(path) == os.path.abspath(default_recipe_path('task2')):
+        return task2.step_units, task2.step_durations
+    recipe = _recipe(path)
+    units = recipe.unit_names
+    return ({name: [units[u] for u in candidates] for name, candidates in zip(recipe.step_names, recipe.step_candidates)},
+            dict(zip(units, recipe.unit_duration_list())))
+
+
+def _run_task1(canon, path, sink):
+    key = (path, canon['num_wafers'], canon['release_interval'], canon['maintenance'])
+    sim = _simulators.get(key)
+    if sim is None:
+        policy = canon['maintenance']
+        sim = _simulators[key] = task1.Task1Simulator(
+            num_wafers=canon['num_wafers'], record=False, reporter=Reporter(),
+            recipe=None if os.path.abspath(path) == os.path.abspath(default_recipe_path('task1')) else _recipe(path),
+            release_interval=canon['release_interval'], maintenance=POLICIES[policy]() if policy else None)
+        while len(_simulators) > MAX_SIMULATORS:
+            _simulators.popitem(last=False)
+    else:
+        _simulators.move_to_end(key)
+    makespan = sim.run(sink)
+    bound = task1.lower_bound(sim)
+    return {'makespan': makespan, 'lower_bound': bound['lower_bound'], 'bottleneck': bound['bottleneck'],
+            'gap': optimality_gap(makespan, bound['lower_bound']), 'events': sim.events_processed,
+            'report': sim.reporter.summary()}
+
+
+def _run_task2(canon, path, sink):
+    step_units, step_durations = _task2_tables(path)
+    return task2.run_scheduling(canon['params'], [], step_units, step_durations, canon['scenario'],
+                                canon['adaptive'], sink=sink, metrics_only=sink is None, seed=canon['seed'],
+                                num_wafers=canon['num_wafers'])
+
+
+def run_request(canon, path, directory):
+    # Pool worker: simulate one canonical request; a trajectory, if asked, goes into directory
+    t0 = time.perf_counter()
+    run = _run_task1 if canon['engine'] == 'task1' else _run_task2
+    fmt = canon['trajectory']
+    if fmt is None:
+        metrics = run(canon, path, None)
+    else:
+        with open_sink(os.path.join(directory, 'trajectory' + FORMAT_EXTENSIONS[fmt]), fmt) as sink:
+            metrics = run(canon, path, sink)
+    return metrics, time.perf_counter() - t0
+
+
+def render_chart(trajectory, output, color, start, end):
+    # Pool worker: the only place the service imports matplotlib (through gantt)
+    import gantt
+
+    gantt.render(gantt.load_schedule(trajectory), output, color, start, end)
+
+
+# ---------- cache ----------
+
+def _tree_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+class ResultCache:
+    # One directory per key holding result.json and any trajectory or chart files. Recency is
+    # the mtime of result.json, touched on every hit, so the LRU order survives restarts.
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.pinned = {}  # key -> number of renders writing into the entry; never evicted
+        os.makedirs(self.staging_root, exist_ok=True)
+        for name in os.listdir(self.staging_root):
+            shutil.rmtree(os.path.join(self.staging_root, name), ignore_errors=True)
+        entries = []
+        for key in os.listdir(root):
+            result = os.path.join(root, key, RESULT_FILE)
+            if os.path.exists(result):
+                entries.append((os.path.getmtime(result), key, _tree_size(os.path.join(root, key))))
+        self.index = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self.size = sum(self.index.values())
+
+    @property
+    def staging_root(self):
+        return os.path.join(self.root, 'staging')
+
+    def path(self, key, name=RESULT_FILE):
+        return os.path.join(self.root, key, name)
+
+    def staging(self, key):
+        directory = os.path.join(self.staging_root, f'{key}-{os.getpid()}-{time.monotonic_ns()}')
+        os.makedirs(directory)
+        return directory
+
+    def get(self, key):
+        if key not in self.index:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.index.move_to_end(key)
+        result = self.path(key)
+        os.utime(result)
+        with open(result) as f:
+            return json.load(f)
+
+    def put(self, key, directory, entry):
+        with open(os.path.join(directory, RESULT_FILE), 'w') as f:
+            json.dump(entry, f)
+        target = os.path.join(self.root, key)
+        if key in self.index:
+            self.discard(key)
+        os.replace(directory, target)
+        self.index[key] = _tree_size(target)
+        self.size += self.index[key]
+        self.evict(keep=key)
+
+    def add_file(self, key, name):
+        # Account for a file written into an existing entry (a rendered chart)
+        size = os.path.getsize(self.path(key, name))
+        self.index[key] = self.index.get(key, 0) + size
+        self.size += size
+        self.evict(keep=key)
+
+    def pin(self, key):
+        self.pinned[key] = self.pinned.get(key, 0) + 1
+
+    def unpin(self, key):
+        self.pinned[key] -= 1
+        if not self.pinned[key]:
+            del self.pinned[key]
+
+    def discard(self, key):
+        self.size -= self.index.pop(key, 0)
+        shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+
+    def evict(self, keep=None):
+        for key in list(self.index):
+            if self.size <= self.max_bytes:
+                break
+            if key == keep or key in self.pinned:
+                continue
+            self.discard(key)
+            self.evictions += 1
+
+    def stats(self):
+        return {'entries': len(self.index), 'bytes': self.size, 'max_bytes': self.max_bytes, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+
+# ---------- service ----------
+
+class Service:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MB << 20, jobs=None):
+        self.cache = ResultCache(cache_dir, max_bytes)
+        self.jobs = jobs or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(self.jobs, initializer=_warm)
+        self.inflight = {}
+        self.runs = 0
+
+    async def schedule(self, request):
+        canon, path = canonical_request(request)
+        key = request_key(canon)
+        entry = self.cache.get(key)
+        cached = entry is not None
+        if not cached:
+            task = self.inflight.get(key)
+            if task is None:
+                task = self.inflight[key] = asyncio.ensure_future(self._run(key, canon, path))
+                task.add_done_callback(lambda _: self.inflight.pop(key, None))
+            entry = await asyncio.shield(task)
+            if not math.isfinite(entry['metrics'].get('makespan', math.inf)):
+                raise RunFailed(entry['metrics'])
+        response = {'key': key, 'cached': cached, 'metrics': entry['metrics'], 'seconds': entry['seconds']}
+        if entry.get('trajectory'):
+            response['trajectory'] = f'/results/{key}/trajectory'
+        return response
+
+    async def _run(self, key, canon, path):
+        directory = self.cache.staging(key)
+        loop = asyncio.get_running_loop()
+        try:
+            metrics, seconds = await loop.run_in_executor(self.pool, run_request, canon, path, directory)
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        self.runs += 1
+        entry = {'request': canon, 'metrics': metrics, 'seconds': seconds,
+                 'trajectory': 'trajectory' + FORMAT_EXTENSIONS[canon['trajectory']] if canon['trajectory'] else None}
+        if not math.isfinite(metrics.get('makespan', math.inf)):
+            # Failed or aborted runs are never cached; schedule() reports them as errors
+            shutil.rmtree(directory, ignore_errors=True)
+            entry['trajectory'] = None
+            return entry
+        self.cache.put(key, directory, entry)
+        return entry
+
+    async def chart(self, request):
+        color = request.get('color', 'wafer')
+        start, end = request.get('start'), request.get('end')
+        if color not in ('wafer', 'movetype', 'cleaning'):
+            raise BadRequest("color must be one of ['cleaning', 'movetype', 'wafer']")
+        if not all(t is None or isinstance(t, (int, float)) for t in (start, end)):
+            raise BadRequest('start and end must be numbers of seconds')
+        request = {k: v for k, v in request.items() if k not in ('color', 'start', 'end')}
+        request['trajectory'] = 'columnar'
+        key = None
+        while key not in self.cache.index:
+            # Another request may evict the entry between the run finishing and this resuming
+            key = (await self.schedule(request))['key']
+        name = f"gantt_{color}_{start}_{end}.png"
+        # Pinned so that runs finishing while the chart renders cannot evict the entry under it
+        self.cache.pin(key)
+        try:
+            if not os.path.exists(self.cache.path(key, name)):
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(self.pool, render_chart, self.cache.path(key, 'trajectory.mcol'),
+                                           self.cache.path(key, name), color, start, end)
+                self.cache.add_file(key, name)
+            with open(self.cache.path(key, name), 'rb') as f:
+                return f.read()
+        finally:
+            self.cache.unpin(key)
+
+    def result(self, key, part=None):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        if part is None:
+            return 'application/json', json.dumps(entry).encode()
+        if part != 'trajectory' or not entry.get('trajectory'):
+            return None
+        fmt = entry['request']['trajectory']
+        with open(self.cache.path(key, entry['trajectory']), 'rb') as f:
+            return CONTENT_TYPES[fmt], f.read()
+
+    def stats(self):
+        return {'cache': self.cache.stats(), 'workers': self.jobs, 'runs': self.runs, 'inflight': len(self.inflight)}
+
+    async def dispatch(self, method, target, body):
+        # Returns (status, content type, payload)
+        parts = [p for p in target.split('?')[0].split('/') if p]
+        if method == 'POST' and parts in (['schedule'], ['chart']):
+            try:
+                request = json.loads(body or b'{}')
+            except ValueError:
+                raise BadRequest('body is not valid JSON')
+            if parts == ['chart']:
+                return HTTPStatus.OK, 'image/png', await self.chart(request)
+            return HTTPStatus.OK, 'application/json', json.dumps(await self.schedule(request)).encode()
+        if method == 'GET' and parts == ['stats']:
+            return HTTPStatus.OK, 'application/json', json.dumps(self.stats()).encode()
+        if method == 'GET' and len(parts) in (2, 3) and parts[0] == 'results':
+            found = self.result(*parts[1:])
+            if found is not None:
+                return (HTTPStatus.OK, *found)
+        return HTTPStatus.NOT_FOUND, 'application/json', json.dumps({'error': f'no route {method} {target}'}).encode()
+
+    async def handle(self, reader, writer):
+        # One request per connection (HTTP/1.1 with Connection: close)
+        try:
+            method, target, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0))
+            if length > MAX_BODY:
+                raise BadRequest('request body too large')
+            body = await reader.readexactly(length) if length else b''
+            status, content_type, payload = await self.dispatch(method, target, body)
+        except BadRequest as e:
+            status, content_type, payload = HTTPStatus.BAD_REQUEST, 'application/json', json.dumps({'error': str(e)}).encode()
+        except RunFailed as e:
+            status, content_type, payload = (HTTPStatus.UNPROCESSABLE_ENTITY, 'application/json',
+                                             json.dumps({'error': str(e), 'aborted': bool(e.metrics.get('aborted'))}).encode())
+        except (ValueError, asyncio.IncompleteReadError):
+            status, content_type, payload = HTTPStatus.BAD_REQUEST, 'application/json', b'{"error": "malformed request"}'
+        except Exception as e:
+            status, content_type, payload = (HTTPStatus.INTERNAL_SERVER_ERROR, 'application/json',
+                                             json.dumps({'error': f'{type(e).__name__}: {e}'}).encode())
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n")
+        try:
+            writer.write(head.encode('latin-1') + payload)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+async def serve(service, unix_socket=None, host='127.0.0.1', port=DEFAULT_PORT):
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        server = await asyncio.start_unix_server(service.handle, unix_socket)
+    else:
+        server = await asyncio.start_server(service.handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+# ---------- client ----------
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def call(path, body=None, unix_socket=None, host='127.0.0.1', port=DEFAULT_PORT, timeout=None):
+    # Minimal client: POST body (a dict) or GET when body is None; returns (status, content type, bytes)
+    conn = _UnixConnection(unix_socket, timeout) if unix_socket else http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        if body is None:
+            conn.request('GET', path)
+        else:
+            conn.request('POST', path, json.dumps(body), {'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        return response.status, response.getheader('Content-Type'), response.read()
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local scheduling service with an on-disk result cache')
+    parser.add_argument('--socket', default=None, metavar='PATH', help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--cache-mb', type=int, default=DEFAULT_CACHE_MB, help='cache size limit in MiB')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    service = Service(args.cache_dir, args.cache_mb << 20, args.jobs)
+    where = args.socket or f'http://{args.host}:{args.port}'
+    print(f"serving on {where} with {service.jobs} workers, cache {args.cache_dir} ({args.cache_mb} MiB)")
+    try:
+        asyncio.run(serve(service, args.socket, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
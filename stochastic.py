@@ -0,0 +1,125 @@
+import json
+
+import numpy as np
+
+# Stochastic durations and faults for the task2 engines, sampled in bulk before a run.
+# A model maps module names to a duration distribution and a fault process; '*' is the
+# default for modules not listed:
+#   durations: {'PM7': {'dist': 'normal', 'cv': 0.1}, '*': {'dist': 'uniform', 'spread': 0.1}}
+#     fixed                      the recipe duration
+#     uniform     spread         base * U(1 - spread, 1 + spread)
+#     normal      cv             base * N(1, cv), truncated at `floor` * base (default 0.5)
+#     lognormal   cv             mean base, coefficient of variation cv
+#     triangular  low, high      base * Tri(low, 1, high)
+#   faults: {'*': {'probability': 0.05, 'downtime': 100}, 'PM1': {'mtbf': 20000, 'downtime': 300}}
+#     probability  each completed step on the module fails with this probability
+#     mtbf         faults arrive as a Poisson process in the module's busy time with this mean
+# A faulted step takes its slot down for `downtime` seconds from its completion and the wafer
+# leaves the lot, as the original 'fault' scenario did.
+#
+# sample() draws, for every unit, the duration and the fault flag of its k-th move, for every
+# k the lot can need (num_wafers times the route positions the unit may serve). The engines keep
+# a per-unit move counter and only index these arrays. Each unit draws from its own child of
+# the seed's SeedSequence, so a unit's k-th move gets the same duration and fault under any
+# dispatch policy (common random numbers), and a seed reproduces the run exactly.
+
+FAULT_PROBABILITY = 0.05
+FAULT_DOWNTIME = 100
+NORMAL_FLOOR = 0.5
+
+
+def _draw(rng, base, spec, size):
+    dist = spec.get('dist', 'fixed')
+    if dist == 'fixed':
+        return np.full(size, base, dtype=np.float64)
+    if dist == 'uniform':
+        spread = spec.get('spread', 0.1)
+        return base * rng.uniform(1 - spread, 1 + spread, size)
+    if dist == 'normal':
+        return base * np.maximum(rng.normal(1, spec.get('cv', 0.1), size), spec.get('floor', NORMAL_FLOOR))
+    if dist == 'lognormal':
+        sigma2 = np.log1p(spec.get('cv', 0.1) ** 2)
+        return base * rng.lognormal(-sigma2 / 2, np.sqrt(sigma2), size)
+    if dist == 'triangular':
+        return base * rng.triangular(spec.get('low', 0.9), 1, spec.get('high', 1.2), size)
+    raise ValueError(f"unknown duration distribution {dist!r}")
+
+
+def _faults(rng, durations, spec):
+    if 'mtbf' in spec:
+        # Arrival times in cumulative busy time; move k is hit if one falls in its busy interval
+        busy = np.cumsum(durations)
+        total = busy[-1] if len(busy) else 0
+        arrivals = np.cumsum(rng.exponential(spec['mtbf'], int(total / spec['mtbf'] * 2) + 16))
+        while len(arrivals) and arrivals[-1] < total:
+            arrivals = np.concatenate([arrivals, arrivals[-1] + np.cumsum(rng.exponential(spec['mtbf'], 16))])
+        return np.diff(np.searchsorted(arrivals, busy, side='right'), prepend=0) > 0
+    return rng.random(len(durations)) < spec.get('probability', 0)
+
+
+class Samples:
+    # Per-run draws: duration[u, k] and fault[u, k] of unit u's k-th move, downtime[u]
+    __slots__ = ('duration', 'fault', 'downtime')
+
+    def __init__(self, duration, fault, downtime):
+        self.duration = duration
+        self.fault = fault
+        self.downtime = downtime
+
+    def tables(self):
+        # Plain-list views for the scalar event loop (list indexing beats NumPy scalar access)
+        return self.duration.tolist(), self.fault.tolist(), self.downtime.tolist()
+
+
+class StochasticModel:
+    def __init__(self, durations=None, faults=None):
+        self.durations = durations or {}
+        self.faults = faults or {}
+
+    def _spec(self, table, name):
+        return table.get(name, table.get('*', {}))
+
+    def moves_per_unit(self, recipe, num_wafers):
+        # Most moves a unit can get: every route position it is a candidate for, for every wafer
+        visits = [0] * len(recipe.unit_names)
+        for step in recipe.route.tolist():
+            for u in recipe.step_candidates[step]:
+                visits[u] += 1
+        return max(visits) * num_wafers
+
+    def sample(self, recipe, num_wafers, seed=None):
+        seq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        size = self.moves_per_unit(recipe, num_wafers)
+        base = recipe.unit_duration_list()
+        duration = np.empty((len(base), size))
+        fault = np.zeros((len(base), size), dtype=bool)
+        downtime = np.zeros(len(base))
+        for u, (name, child) in enumerate(zip(recipe.unit_names, seq.spawn(len(base)))):
+            rng = np.random.default_rng(child)
+            duration[u] = _draw(rng, base[u], self._spec(self.durations, name), size)
+            spec = self._spec(self.faults, name)
+            if spec:
+                fault[u] = _faults(rng, duration[u], spec)
+                downtime[u] = spec.get('downtime', FAULT_DOWNTIME)
+        return Samples(duration, fault, downtime)
+
+    def to_dict(self):
+        return {'durations': self.durations, 'faults': self.faults}
+
+
+def load_model(path):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return StochasticModel(data.get('durations'), data.get('faults'))
+
+
+DEFAULT_FAULTS = {'*': {'probability': FAULT_PROBABILITY, 'downtime': FAULT_DOWNTIME}}
+DEFAULT_DURATIONS = {'*': {'dist': 'uniform', 'spread': 0.1}}
+
+# Model of every task2 scenario; 'none' runs on the recipe's nominal durations
+SCENARIO_MODELS = {
+    'none': None,
+    'fault': StochasticModel(faults=DEFAULT_FAULTS),
+    'time_variation': StochasticModel(durations=DEFAULT_DURATIONS),
+    'mixed': StochasticModel(durations=DEFAULT_DURATIONS, faults=DEFAULT_FAULTS)
+}
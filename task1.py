@@ -1,54 +1,36 @@
 from collections import deque
 from heapq import heappush, heappop
-import json
+import argparse
+import os
 
+from bounds import makespan_lower_bound, optimality_gap
+from instrumentation import Profiler
+from movestore import END, START, MoveStore, MoveTemplate
+from recipe import default_recipe_path, load_recipe
+from report import EVENT_LEVELS, EventLog, Reporter, print_summary
+from trajectory import FORMAT_EXTENSIONS, open_sink
+from validator import ConstraintViolation, Validator
+
+# 工艺配方与模块拓扑从 recipes/task1.json 编译而来；引擎内部只使用整数编号，
+# 模块名和步骤名只在输出时才用到
+RECIPE = load_recipe(default_recipe_path('task1'))
+
+# 以下按名称的表格由配方派生，保留给外部脚本使用
 # 步骤持续时间（从修订表格）
-step_durations = {
-    0: 15, 1: 4, 2: 1, 3: 1, 4: 1, 5: 4, 6: 8, 7: 4, 8: 1, 9: 1, 10: 4, 11: 1, 12: 15,
-    13: 1, 14: 4, 15: 1, 16: 1, 17: 1, 18: 4, 19: 1, 20: 70, 21: 1, 22: 4, 23: 1, 24: 1,
-    25: 1, 26: 4, 27: 1, 28: 70, 29: 1, 30: 4, 31: 1, 32: 1, 33: 1, 34: 4, 35: 1, 36: 1,
-    37: 4, 38: 1, 39: 0.5, 40: 1, 41: 4, 42: 1, 43: 70, 44: 1, 45: 4, 46: 1, 47: 1.5,
-    48: 1, 49: 4, 50: 1, 51: 1, 52: 4, 53: 1, 54: 1.5, 55: 1, 56: 4, 57: 1, 58: 20,
-    59: 1, 60: 4, 61: 1, 62: 1, 63: 1, 64: 4
-}
+step_durations = {int(name): d for name, d in zip(RECIPE.step_names, RECIPE.step_duration_list())}
 
 # 步骤列表（包含循环：20–57 × 4，20–50 × 1）
-steps = (
-    list(range(0, 20)) +
-    [i for i in range(20, 58)] * 4 +
-    list(range(20, 51)) +
-    list(range(58, 65))
-)
+steps = [int(RECIPE.step_names[s]) for s in RECIPE.route]
 
 # 模块资源
-units = ['LLB', 'LP1', 'AL', 'LLA', 'LLC', 'LLD', 'PM7', 'PM8', 'TM1', 'TM2', 'TM3']
-unit_available = {unit: 0 for unit in units}
-unit_last_used = {unit: 0 for unit in units}  # 跟踪模块最后使用时间
-pm_wafer_count = {'PM7': 0, 'PM8': 0}  # 跟踪每个PM处理的晶圆数
+units = list(RECIPE.unit_names)
+pm_units = tuple(u for u, cleaning in zip(units, RECIPE.unit_cleaning) if cleaning)
 
 # 步骤到执行单元的映射（基于表格“执行单元”）
-step_units = {
-    0: 'LLB', 1: 'TM1', 2: 'TM1', 3: 'TM1', 4: 'TM1', 5: 'TM1', 6: 'AL', 7: 'TM1',
-    8: 'TM1', 9: 'TM1', 10: 'TM1', 11: 'LLA', 12: 'LLA', 13: 'LLA', 14: 'TM2',
-    15: 'TM2', 16: 'TM2', 17: 'TM2', 18: 'TM2', 19: 'PM7', 20: 'PM7', 21: 'TM2',
-    22: 'TM2', 23: 'TM2', 24: 'TM2', 25: 'TM2', 26: 'TM2', 27: 'PM8', 28: 'PM8',
-    29: 'TM2', 30: 'TM2', 31: 'TM2', 32: 'TM2', 33: 'TM2', 34: 'TM2', 35: 'LLC',
-    36: 'LLC', 37: 'TM3', 38: 'TM3', 39: 'TM3', 40: 'TM3', 41: 'TM3', 42: 'TM3',
-    43: 'LLD', 44: 'LLD', 45: 'TM2', 46: 'TM2', 47: 'TM2', 48: 'TM2', 49: 'TM2',
-    50: 'LLB', 51: 'LLB', 52: 'TM2', 53: 'TM2', 54: 'TM2', 55: 'TM2', 56: 'TM2',
-    57: 'PM7', 58: 'LLB', 59: 'TM1', 60: 'TM1', 61: 'TM1', 62: 'TM1', 63: 'TM1', 64: 'TM1'
-}
-
-# 初始化 75 片晶圆任务
+step_units = {int(name): units[cands[0]] for name, cands in zip(RECIPE.step_names, RECIPE.step_candidates)}
+
+# 默认晶圆数
 NUM_WAFERS = 75
-wafer_tasks = [deque(steps) for _ in range(NUM_WAFERS)]
-wafer_paths = [[] for _ in range(NUM_WAFERS)]
-move_list = []
-event_queue = []
-conflict_log = []
-cleaning_log = []
-unit_usage = {unit: [] for unit in units}
-move_id_counter = 0
 
 # 清洗参数
 IDLE_THRESHOLD = 70  # 空闲时间阈值（秒）
@@ -59,181 +41,316 @@ WAFER_COUNT_CLEAN_DURATION = 300  # 晶圆计数清洗持续时间（秒）
 # 动作持续时间假设
 AUXILIARY_MOVE_DURATION = 1  # 辅助动作（如Pickmove, Placemove等）持续时间（秒）
 
-# MoveType 映射函数
-def get_move_types(step, module, start_time, end_time, wafer_id):
-    global move_id_counter
-    mat_id = f"{wafer_id + 1}.{step}"
-    moves = []
-    duration = step_durations[step]
+# 持续时间小于3秒的步骤仅使用主要动作
+short_move_types = {int(name): t for name, t in zip(RECIPE.step_names, RECIPE.step_move_type)}
+
+# 特殊步骤的主要动作：抽气、充气、校准
+MAIN_MOVE_TYPES = {'pump': 6, 'vent': 7, 'align': 10}  # PumpMove / VentMove / AlignMove
 
-    # 对于持续时间小于3秒的步骤，仅使用主要动作
+
+# MoveType 映射：每个步骤按配方中的类别预编译为动作模板，模拟时只需按起止时间展开
+def build_move_template(kind, duration, move_type):
+    aux = AUXILIARY_MOVE_DURATION
     if duration < 3:
-        move_type = {
-            0: 6, 1: 1, 2: 5, 3: 3, 4: 4, 5: 2, 6: 10, 7: 1, 8: 3, 9: 4, 10: 2, 11: 5,
-            12: 6, 13: 4, 14: 1, 15: 5, 16: 3, 17: 4, 18: 2, 19: 5, 20: 8, 21: 4, 22: 1,
-            23: 5, 24: 3, 25: 4, 26: 2, 27: 5, 28: 8, 29: 4, 30: 1, 31: 5, 32: 3, 33: 4,
-            34: 2, 35: 5, 36: 4, 37: 1, 38: 5, 39: 3, 40: 4, 41: 2, 42: 5, 43: 8, 44: 4,
-            45: 1, 46: 5, 47: 3, 48: 4, 49: 2, 50: 5, 51: 4, 52: 1, 53: 5, 54: 3, 55: 4,
-            56: 2, 57: 5, 58: 7, 59: 4, 60: 1, 61: 5, 62: 3, 63: 4, 64: 2
-        }[step]
-        moves.append({
-            "StartTime": start_time,
-            "EndTime": end_time,
-            "MoveID": move_id_counter,
-            "MoveType": move_type,
-            "ModuleName": module,
-            "MatID": mat_id,
-            "SlotID": 1
-        })
-        move_id_counter += 1
-        return moves
-
-    # 特殊步骤：抽气、充气、校准
-    if step in [0, 12]:  # LL抽气 (PumpMove)
-        moves.extend([
-            {"StartTime": start_time, "EndTime": start_time + AUXILIARY_MOVE_DURATION, "MoveID": move_id_counter, "MoveType": 4, "ModuleName": module, "MatID": mat_id, "SlotID": 1},
-            {"StartTime": start_time + AUXILIARY_MOVE_DURATION, "EndTime": end_time - AUXILIARY_MOVE_DURATION, "MoveID": move_id_counter + 1, "MoveType": 6, "ModuleName": module, "MatID": mat_id, "SlotID": 1},
-            {"StartTime": end_time - AUXILIARY_MOVE_DURATION, "EndTime": end_time, "MoveID": move_id_counter + 2, "MoveType": 5, "ModuleName": module, "MatID": mat_id, "SlotID": 1}
-        ])
-        move_id_counter += 3
-    elif step == 58:  # LL充气 (VentMove)
-        moves.extend([
-            {"StartTime": start_time, "EndTime": start_time + AUXILIARY_MOVE_DURATION, "MoveID": move_id_counter, "MoveType": 4, "ModuleName": module, "MatID": mat_id, "SlotID": 1},
-            {"StartTime": start_time + AUXILIARY_MOVE_DURATION, "EndTime": end_time - AUXILIARY_MOVE_DURATION, "MoveID": move_id_counter + 1, "MoveType": 7, "ModuleName": module, "MatID": mat_id, "SlotID": 1},
-            {"StartTime": end_time - AUXILIARY_MOVE_DURATION, "EndTime": end_time, "MoveID": move_id_counter + 2, "MoveType": 5, "ModuleName": module, "MatID": mat_id, "SlotID": 1}
-        ])
-        move_id_counter += 3
-    elif step == 6:  # 校准 (AlignMove)
-        moves.extend([
-            {"StartTime": start_time, "EndTime": start_time + AUXILIARY_MOVE_DURATION, "MoveID": move_id_counter, "MoveType": 4, "ModuleName": module, "MatID": mat_id, "SlotID": 1},
-            {"StartTime": start_time + AUXILIARY_MOVE_DURATION, "EndTime": end_time - AUXILIARY_MOVE_DURATION, "MoveID": move_id_counter + 1, "MoveType": 10, "ModuleName": module, "MatID": mat_id, "SlotID": 1},
-            {"StartTime": end_time - AUXILIARY_MOVE_DURATION, "EndTime": end_time, "MoveID": move_id_counter + 2, "MoveType": 5, "ModuleName": module, "MatID": mat_id, "SlotID": 1}
-        ])
-        move_id_counter += 3
-    elif step in [20, 28, 43]:  # 加工 (ProcessMove)
-        moves.extend([
-            {"StartTime": start_time, "EndTime": start_time + AUXILIARY_MOVE_DURATION, "MoveID": move_id_counter, "MoveType": 1, "ModuleName": module, "MatID": mat_id, "SlotID": 1},
-            {"StartTime": start_time + AUXILIARY_MOVE_DURATION, "EndTime": start_time + 2 * AUXILIARY_MOVE_DURATION, "MoveID": move_id_counter + 1, "MoveType": 3, "ModuleName": module, "MatID": mat_id, "SlotID": 1},
-            {"StartTime": start_time + 2 * AUXILIARY_MOVE_DURATION, "EndTime": start_time + 3 * AUXILIARY_MOVE_DURATION, "MoveID": move_id_counter + 2, "MoveType": 2, "ModuleName": module, "MatID": mat_id, "SlotID": 1},
-            {"StartTime": start_time + 3 * AUXILIARY_MOVE_DURATION, "EndTime": start_time + 4 * AUXILIARY_MOVE_DURATION, "MoveID": move_id_counter + 3, "MoveType": 4, "ModuleName": module, "MatID": mat_id, "SlotID": 1},
-            {"StartTime": start_time + 4 * AUXILIARY_MOVE_DURATION, "EndTime": end_time - AUXILIARY_MOVE_DURATION, "MoveID": move_id_counter + 4, "MoveType": 8, "ModuleName": module, "MatID": mat_id, "SlotID": 1},
-            {"StartTime": end_time - AUXILIARY_MOVE_DURATION, "EndTime": end_time, "MoveID": move_id_counter + 5, "MoveType": 5, "ModuleName": module, "MatID": mat_id, "SlotID": 1}
+        return MoveTemplate([((START, 0), (END, 0), move_type)])
+
+    if kind in MAIN_MOVE_TYPES:
+        return MoveTemplate([
+            ((START, 0), (START, aux), 4),
+            ((START, aux), (END, -aux), MAIN_MOVE_TYPES[kind]),
+            ((END, -aux), (END, 0), 5)
         ])
-        move_id_counter += 6
-    else:  # 其他步骤（传输相关）
-        moves.extend([
-            {"StartTime": start_time, "EndTime": start_time + AUXILIARY_MOVE_DURATION, "MoveID": move_id_counter, "MoveType": 1, "ModuleName": module, "MatID": mat_id, "SlotID": 1},
-            {"StartTime": start_time + AUXILIARY_MOVE_DURATION, "EndTime": start_time + 2 * AUXILIARY_MOVE_DURATION, "MoveID": move_id_counter + 1, "MoveType": 3, "ModuleName": module, "MatID": mat_id, "SlotID": 1},
-            {"StartTime": start_time + 2 * AUXILIARY_MOVE_DURATION, "EndTime": end_time, "MoveID": move_id_counter + 2, "MoveType": 2, "ModuleName": module, "MatID": mat_id, "SlotID": 1}
+    if kind == 'process':  # 加工 (ProcessMove)
+        return MoveTemplate([
+            ((START, 0), (START, aux), 1),
+            ((START, aux), (START, 2 * aux), 3),
+            ((START, 2 * aux), (START, 3 * aux), 2),
+            ((START, 3 * aux), (START, 4 * aux), 4),
+            ((START, 4 * aux), (END, -aux), 8),
+            ((END, -aux), (END, 0), 5)
         ])
-        move_id_counter += 3
-
-    return moves
-
-# 清洗移动记录函数
-def get_cleaning_move(unit, start_time, end_time):
-    global move_id_counter
-    mat_id = f"CLEAN.{unit}"
-    moves = [
-        {"StartTime": start_time, "EndTime": start_time + AUXILIARY_MOVE_DURATION, "MoveID": move_id_counter, "MoveType": 4, "ModuleName": unit, "MatID": mat_id, "SlotID": 1},
-        {"StartTime": start_time + AUXILIARY_MOVE_DURATION, "EndTime": end_time - AUXILIARY_MOVE_DURATION, "MoveID": move_id_counter + 1, "MoveType": 9, "ModuleName": unit, "MatID": mat_id, "SlotID": 1},
-        {"StartTime": end_time - AUXILIARY_MOVE_DURATION, "EndTime": end_time, "MoveID": move_id_counter + 2, "MoveType": 5, "ModuleName": unit, "MatID": mat_id, "SlotID": 1}
-    ]
-    move_id_counter += 3
-    return moves
-
-# 初始任务分配
-for i in range(NUM_WAFERS):
-    step = wafer_tasks[i].popleft()
-    unit = step_units[step]
-    start_time = unit_available[unit]
-    end_time = start_time + step_durations[step]
-    unit_available[unit] = end_time
-    unit_last_used[unit] = end_time
-    if unit in pm_wafer_count:
-        pm_wafer_count[unit] += 1
-    wafer_paths[i].append((step, start_time, end_time))
-    unit_usage[unit].append((start_time, end_time, i + 1, step))
-    move_list.extend(get_move_types(step, unit, start_time, end_time, i))
-    heappush(event_queue, (end_time, i, step, 'wafer'))
-
-# 模拟执行
-max_completion_time = 0
-while event_queue:
-    current_time, wafer_id, completed_step, event_type = heappop(event_queue)
-    max_completion_time = max(max_completion_time, current_time)
-
-    if event_type == 'wafer':
-        if not wafer_tasks[wafer_id]:
-            continue
-        next_step = wafer_tasks[wafer_id].popleft()
-        unit = step_units[next_step]
-        start_time = max(current_time, unit_available[unit])
-
-        # 检查PM模块的空闲时间
-        if unit in ['PM7', 'PM8']:
-            idle_time = current_time - unit_last_used[unit]
-            if idle_time >= IDLE_THRESHOLD and start_time >= current_time:
-                clean_start = current_time
-                clean_end = clean_start + IDLE_CLEAN_DURATION
-                unit_available[unit] = clean_end
-                unit_last_used[unit] = clean_end
-                unit_usage[unit].append((clean_start, clean_end, 0, 'clean'))
-                move_list.extend(get_cleaning_move(unit, clean_start, clean_end))
-                cleaning_log.append({
-                    'unit': unit,
-                    'reason': 'idle',
-                    'start_time': clean_start,
-                    'end_time': clean_end
-                })
-                print(f"模块 {unit} 在 {clean_start:.1f} 秒因空闲 {idle_time:.1f} 秒开始清洗，持续 {IDLE_CLEAN_DURATION} 秒")
-                start_time = max(start_time, clean_end)
-
-        # 检查PM模块的晶圆计数
-        if unit in pm_wafer_count:
-            if pm_wafer_count[unit] >= WAFER_COUNT_THRESHOLD:
-                clean_start = max(current_time, unit_available[unit])
-                clean_end = clean_start + WAFER_COUNT_CLEAN_DURATION
-                unit_available[unit] = clean_end
-                unit_last_used[unit] = clean_end
-                unit_usage[unit].append((clean_start, clean_end, 0, 'clean'))
-                move_list.extend(get_cleaning_move(unit, clean_start, clean_end))
-                cleaning_log.append({
-                    'unit': unit,
-                    'reason': 'wafer_count',
-                    'start_time': clean_start,
-                    'end_time': clean_end,
-                    'wafer_count': pm_wafer_count[unit]
-                })
-                print(f"模块 {unit} 在 {clean_start:.1f} 秒因处理 {pm_wafer_count[unit]} 个晶圆开始清洗，持续 {WAFER_COUNT_CLEAN_DURATION} 秒")
-                pm_wafer_count[unit] = 0
-                start_time = max(start_time, clean_end)
-
-        # 分配下一步
-        if start_time > current_time:
-            delay = start_time - current_time
-            conflict_log.append({
-                'wafer_id': wafer_id + 1,
-                'step': next_step,
-                'unit': unit,
-                'conflict_time': current_time,
-                'delay': delay
-            })
-            print(f"晶圆 {wafer_id + 1} 在步骤 {next_step} 延迟 {delay:.1f} 秒")
-
-        end_time = start_time + step_durations[next_step]
-        unit_available[unit] = end_time
-        unit_last_used[unit] = end_time
-        if unit in pm_wafer_count:
-            pm_wafer_count[unit] += 1
-        wafer_paths[wafer_id].append((next_step, start_time, end_time))
-        unit_usage[unit].append((start_time, end_time, wafer_id + 1, next_step))
-        move_list.extend(get_move_types(next_step, unit, start_time, end_time, wafer_id))
-        heappush(event_queue, (end_time, wafer_id, next_step, 'wafer'))
-
-# 写入 JSON 文件
-with open('task_1_wafer_trajectory.json', 'w') as f:
-    json.dump({"MoveList": move_list}, f, indent=4)
+    # 其他步骤（传输相关）
+    return MoveTemplate([
+        ((START, 0), (START, aux), 1),
+        ((START, aux), (START, 2 * aux), 3),
+        ((START, 2 * aux), (END, 0), 2)
+    ])
+
+
+def compile_move_templates(recipe):
+    # 按步骤编号排列的动作模板
+    return [build_move_template(kind, duration, move_type) for kind, duration, move_type
+            in zip(recipe.step_kind, recipe.step_duration_list(), recipe.step_move_type)]
+
+
+MOVE_TEMPLATES = compile_move_templates(RECIPE)
+
+# 清洗动作 (CleanMove)
+CLEANING_TEMPLATE = MoveTemplate([
+    ((START, 0), (START, AUXILIARY_MOVE_DURATION), 4),
+    ((START, AUXILIARY_MOVE_DURATION), (END, -AUXILIARY_MOVE_DURATION), 9),
+    ((END, -AUXILIARY_MOVE_DURATION), (END, 0), 5)
+])
+
+
+# 可重入的仿真引擎：所有运行状态都挂在实例上，reset() 后即可再次运行。
+# 模块、步骤都按配方编译后的整数编号索引，日志和占用区间里记录的也是编号，
+# 只有写轨迹和打印报告时才换成名称
+class Task1Simulator:
+    __slots__ = (
+        'num_wafers', 'idle_threshold', 'wafer_count_threshold', 'release_interval', 'record', 'reporter',
+        'recipe', 'templates', 'step_duration', 'step_unit', 'unit_cleaning', 'profiler', 'validator', 'maintenance',
+        '_push', '_emit',
+        'unit_available', 'unit_last_used', 'pm_wafer_count', 'wafer_pos', 'wafer_paths',
+        'sink', 'move_list', 'event_queue', 'unit_events', 'conflict_log', 'cleaning_log', 'unit_usage',
+        'move_id_counter', 'max_completion_time', 'events_processed'
+    )
+
+    def __init__(self, num_wafers=NUM_WAFERS, idle_threshold=IDLE_THRESHOLD,
+                 wafer_count_threshold=WAFER_COUNT_THRESHOLD, record=True, reporter=None, recipe=None,
+                 profiler=None, validator=None, release_interval=0, maintenance=None):
+        self.num_wafers = num_wafers
+        self.idle_threshold = idle_threshold
+        self.wafer_count_threshold = wafer_count_threshold
+        # 投片间隔（秒）：为 0 时所有晶圆在 0 时刻一起排队（原行为），否则第 i 片在 i * 间隔时刻投入
+        self.release_interval = release_interval
+        self.record = record  # 是否记录动作、路径和占用区间（基准测试时关闭）
+        self.reporter = reporter  # report.Reporter，汇总冲突延迟、清洗和周期时间，为空时不统计
+        self.recipe = recipe = recipe or RECIPE
+        self.templates = MOVE_TEMPLATES if recipe is RECIPE else compile_move_templates(recipe)
+        self.step_duration = recipe.step_duration_list()
+        self.step_unit = [cands[0] for cands in recipe.step_candidates]  # task1 每步只有一个执行单元
+        self.unit_cleaning = list(recipe.unit_cleaning)
+        self.profiler = profiler  # instrumentation.Profiler，为空时不计时
+        self.validator = validator  # validator.Validator，模拟过程中逐步检查占用和 JIT 约束
+        self.maintenance = maintenance  # maintenance 中的清洗策略，为空时按原规则被动清洗
+        self.reset()
+
+    def reset(self):
+        n = self.num_wafers
+        num_units = len(self.recipe.unit_names)
+        self.unit_available = [0] * num_units
+        self.unit_last_used = [0] * num_units  # 跟踪模块最后使用时间
+        self.pm_wafer_count = [0] * num_units  # 跟踪每个PM处理的晶圆数（仅需清洗的模块使用）
+        self.wafer_pos = [0] * n  # 每片晶圆在路线中的下一步位置
+        self.wafer_paths = [[] for _ in range(n)] if self.record else None
+        self.sink = None
+        self.move_list = None
+        # 事件 (时间, 晶圆, 步骤, 队列号)。同一模块上的预约按时间先后排定，完成事件天然有序，
+        # 所以每个模块（以及投片）各用一个 FIFO 队列，堆里只放各队列的队首，
+        # 堆的大小不随晶圆数增长；出堆顺序与所有事件放在一个堆里时完全相同
+        self.event_queue = []
+        self.unit_events = [deque() for _ in range(num_units + 1)]  # 最后一个队列为投片事件
+        self.conflict_log = []
+        self.cleaning_log = []
+        self.unit_usage = [[] for _ in range(num_units)]
+        self.move_id_counter = 0
+        self.max_completion_time = 0
+        self.events_processed = 0
+
+    def get_move_types(self, step, unit, start_time, end_time, wafer_id):
+        template = self.templates[step]
+        self.sink.add_step(template, start_time, end_time, self.move_id_counter, self.recipe.unit_names[unit],
+                           f"{wafer_id + 1}.{self.recipe.step_names[step]}", 1)
+        self.move_id_counter += template.size
+
+    def get_cleaning_move(self, unit, start_time, end_time):
+        name = self.recipe.unit_names[unit]
+        self.sink.add_step(CLEANING_TEMPLATE, start_time, end_time, self.move_id_counter, name,
+                           f"CLEAN.{name}", 1)
+        self.move_id_counter += CLEANING_TEMPLATE.size
+
+    def _clean(self, unit, clean_start, clean_end, reason, **extra):
+        self.unit_available[unit] = clean_end
+        self.unit_last_used[unit] = clean_end
+        if self.record:
+            self.unit_usage[unit].append((clean_start, clean_end, 0, 'clean'))
+        if self.validator is not None:
+            self.validator.occupy(unit, clean_start, clean_end, 'clean')
+        if self.sink is not None:
+            self.get_cleaning_move(unit, clean_start, clean_end)
+        if self.reporter is not None:
+            self.reporter.cleaning(unit, reason, clean_start, clean_end, extra)
+        self.cleaning_log.append({
+            'unit': unit,
+            'reason': reason,
+            'start_time': clean_start,
+            'end_time': clean_end,
+            **extra
+        })
+
+    def _assign(self, wafer_id, step, unit, start_time):
+        end_time = start_time + self.step_duration[step]
+        self.unit_available[unit] = end_time
+        self.unit_last_used[unit] = end_time
+        if self.unit_cleaning[unit]:
+            self.pm_wafer_count[unit] += 1
+        if self.validator is not None:
+            self.validator.step(wafer_id + 1, unit, start_time, end_time)
+        if self.record:
+            self.wafer_paths[wafer_id].append((step, start_time, end_time))
+            self.unit_usage[unit].append((start_time, end_time, wafer_id + 1, step))
+        if self.sink is not None:
+            self._emit(step, unit, start_time, end_time, wafer_id)
+        if self.reporter is not None and self.reporter.trace_steps:
+            self.reporter.step(wafer_id, step, unit, start_time, end_time)
+        queue = self.unit_events[unit]
+        if not queue:
+            self._push(self.event_queue, (end_time, wafer_id, step, unit))
+        elif end_time <= queue[-1][0] and (end_time, wafer_id) < queue[-1][:2]:
+            # 模块可用时间只增不减，只有零时长步骤才会与队尾同刻且晶圆号更小；放不进有序队列的事件单独进堆
+            self._push(self.event_queue, (end_time, wafer_id, step, None))
+            return
+        queue.append((end_time, wafer_id, step, unit))
+
+    def pending_events(self):
+        # 所有尚未处理的事件（顺序不定），供清洗策略预测模块下一次被请求的时间
+        for queue in self.unit_events:
+            yield from queue
+        for event in self.event_queue:
+            if event[3] is None:
+                yield event
+
+    def run(self, sink=None):
+        # sink 为空且开启记录时，动作保存在内存中的列式 move_list（MoveStore）
+        self.reset()
+        if sink is None and self.record:
+            sink = self.move_list = MoveStore()
+        self.sink = sink
+        if self.validator is not None:
+            self.validator.reset()
+        if self.reporter is not None:
+            self.reporter.reset(self)
+        profiler = self.profiler
+        if profiler is None:
+            self._push, self._emit = heappush, self.get_move_types
+            return self._simulate(heappop, self._clean)
+
+        # 开启计时：把热路径上的调用换成计时包装
+        self._push = profiler.timed_heappush()
+        self._emit = profiler.timed('emit', self.get_move_types)
+        profiler.start()
+        try:
+            makespan = self._simulate(profiler.timed('heap_pop', heappop), profiler.timed('cleaning', self._clean))
+        finally:
+            profiler.stop()
+        profiler.count('events', self.events_processed)
+        profiler.count('dispatch_calls', sum(self.wafer_pos))
+        profiler.count('moves_emitted', self.move_id_counter)
+        profiler.count('cleanings', len(self.cleaning_log))
+        return makespan
+
+    def _simulate(self, heappop, clean):
+        route = self.recipe.route.tolist()
+        num_steps = len(route)
+        step_unit = self.step_unit
+        unit_cleaning = self.unit_cleaning
+        wafer_pos = self.wafer_pos
+        unit_available = self.unit_available
+        unit_last_used = self.unit_last_used
+        pm_wafer_count = self.pm_wafer_count
+        event_queue = self.event_queue
+        unit_events = self.unit_events
+        push = self._push
+        reporter = self.reporter
+        maintenance = self.maintenance
+        if maintenance is not None:
+            maintenance.bind(self, clean)
+
+        # 初始任务分配
+        if self.release_interval:
+            # 按间隔投片：投片事件与完成事件一样进入事件堆，由下面的循环分配第一步
+            releases = unit_events[-1]
+            releases.extend((i * self.release_interval, i, -1, len(unit_events) - 1) for i in range(self.num_wafers))
+            if releases:
+                push(event_queue, releases[0])
+        else:
+            for i in range(self.num_wafers):
+                step = route[0]
+                wafer_pos[i] = 1
+                unit = step_unit[step]
+                self._assign(i, step, unit, unit_available[unit])
+
+        # 模拟执行
+        max_completion_time = 0
+        events_processed = 0
+        while event_queue:
+            current_time, wafer_id, completed_step, stream = heappop(event_queue)
+            if stream is not None:
+                queue = unit_events[stream]
+                queue.popleft()
+                if queue:
+                    push(event_queue, queue[0])
+            events_processed += 1
+            if current_time > max_completion_time:
+                max_completion_time = current_time
+
+            if maintenance is not None and completed_step >= 0 and unit_cleaning[step_unit[completed_step]]:
+                maintenance.on_release(step_unit[completed_step], current_time, wafer_id)
+            pos = wafer_pos[wafer_id]
+            if pos >= num_steps:
+                if reporter is not None:
+                    reporter.wafer_done(wafer_id, wafer_id * self.release_interval, current_time)
+                continue
+            next_step = route[pos]
+            wafer_pos[wafer_id] = pos + 1
+            unit = step_unit[next_step]
+            start_time = max(current_time, unit_available[unit])
+
+            if unit_cleaning[unit] and maintenance is not None:
+                start_time = maintenance.on_request(unit, current_time, start_time, wafer_id)
+            elif unit_cleaning[unit]:
+                # 检查PM模块的空闲时间
+                idle_time = current_time - unit_last_used[unit]
+                if idle_time >= self.idle_threshold and start_time >= current_time:
+                    clean_start = current_time
+                    clean_end = clean_start + IDLE_CLEAN_DURATION
+                    clean(unit, clean_start, clean_end, 'idle', wafer_id=wafer_id + 1)
+                    start_time = max(start_time, clean_end)
+
+                # 检查PM模块的晶圆计数
+                if pm_wafer_count[unit] >= self.wafer_count_threshold:
+                    clean_start = max(current_time, unit_available[unit])
+                    clean_end = clean_start + WAFER_COUNT_CLEAN_DURATION
+                    clean(unit, clean_start, clean_end, 'wafer_count',
+                          wafer_count=pm_wafer_count[unit], wafer_id=wafer_id + 1)
+                    pm_wafer_count[unit] = 0
+                    start_time = max(start_time, clean_end)
+
+            # 分配下一步
+            if start_time > current_time:
+                delay = start_time - current_time
+                if self.record:
+                    self.conflict_log.append({
+                        'wafer_id': wafer_id + 1,
+                        'step': next_step,
+                        'unit': unit,
+                        'conflict_time': current_time,
+                        'delay': delay
+                    })
+                if reporter is not None:
+                    reporter.conflict(wafer_id, next_step, unit, current_time, delay)
+
+            self._assign(wafer_id, next_step, unit, start_time)
+
+        self.max_completion_time = max_completion_time
+        self.events_processed = events_processed
+        return max_completion_time
+
+    def unit_usage_by_name(self):
+        return {name: usage for name, usage in zip(self.recipe.unit_names, self.unit_usage)}
+
+    def write_trajectory(self, path='task_1_wafer_trajectory.json', fmt=None):
+        with open_sink(path, fmt) as sink:
+            self.move_list.write_to(sink)
+
+
+def lower_bound(sim):
+    # 按配方推出的总完成时间下界（bounds.py），计数清洗按阈值计入需清洗的模块
+    return makespan_lower_bound(sim.recipe, sim.num_wafers, sim.release_interval,
+                                cleaning_threshold=sim.wafer_count_threshold,
+                                cleaning_duration=WAFER_COUNT_CLEAN_DURATION)
+
 
 # 检查模块占用重叠
 def check_overlap(unit_usage):
@@ -257,44 +374,81 @@ def check_overlap(unit_usage):
                 })
     return overlap_issues
 
-# 输出晶圆轨迹
-for i in range(NUM_WAFERS):
-    print(f"\n晶圆 {i + 1} 的执行路径:")
-    for step, st, et in wafer_paths[i]:
-        print(f"  步骤 {step:<2} 开始: {st:<8.1f} 结束: {et:<8.1f}")
-
-# 输出总完成时间
-print(f"\n总完成时间: {max_completion_time:.1f} 秒")
-
-# 输出冲突日志
-print("\n模块冲突日志:")
-if conflict_log:
-    for conflict in conflict_log:
-        print(f"晶圆 {conflict['wafer_id']:<3} 步骤 {conflict['step']:<2} "
-              f"模块 {conflict['unit']:<4} 冲突时间: {conflict['conflict_time']:<8.1f} "
-              f"延迟: {conflict['delay']:.1f} 秒")
-else:
-    print("无模块冲突。")
-
-# 输出清洗日志
-print("\n清洗日志:")
-if cleaning_log:
-    for clean in cleaning_log:
-        print(f"模块 {clean['unit']:<4} 因 {clean['reason']:<12} "
-              f"开始: {clean['start_time']:<8.1f} 结束: {clean['end_time']:<8.1f}")
-else:
-    print("无清洗事件。")
-
-# 输出重叠检查
-overlap_issues = check_overlap(unit_usage)
-print("\n模块占用重叠检查:")
-if overlap_issues:
-    print("发现模块重叠：")
-    for issue in overlap_issues:
-        print(f"模块 {issue['unit']:<4} 冲突：")
-        print(f"  晶圆 {issue['wafer1']:<3} 步骤 {issue['step1']:<2} "
-              f"开始: {issue['time1_start']:<8.1f} 结束: {issue['time1_end']:<8.1f}")
-        print(f"  晶圆 {issue['wafer2']:<3} 步骤 {issue['step2']:<2} "
-              f"开始: {issue['time2_start']:<8.1f} 结束: {issue['time2_end']:<8.1f}")
-else:
-    print("无模块重叠，模拟可行。")
\ No newline at end of file
+
+def print_report(sim):
+    # 汇总只在运行结束后输出一次；逐事件明细见 report.EventLog
+    def step_label(step):
+        return step if step == 'clean' else sim.recipe.step_names[step]
+
+    # 输出总完成时间
+    print(f"\n总完成时间: {sim.max_completion_time:.1f} 秒")
+
+    # 输出冲突延迟、清洗和周期时间汇总
+    if sim.reporter is not None:
+        print_summary(sim.reporter)
+
+    # 输出重叠检查
+    overlap_issues = check_overlap(sim.unit_usage_by_name())
+    print("\n模块占用重叠检查:")
+    if overlap_issues:
+        print("发现模块重叠：")
+        for issue in overlap_issues:
+            print(f"模块 {issue['unit']:<4} 冲突：")
+            print(f"  晶圆 {issue['wafer1']:<3} 步骤 {step_label(issue['step1']):<2} "
+                  f"开始: {issue['time1_start']:<8.1f} 结束: {issue['time1_end']:<8.1f}")
+            print(f"  晶圆 {issue['wafer2']:<3} 步骤 {step_label(issue['step2']):<2} "
+                  f"开始: {issue['time2_start']:<8.1f} 结束: {issue['time2_end']:<8.1f}")
+    else:
+        print("无模块重叠，模拟可行。")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Task1 晶圆调度仿真')
+    parser.add_argument('--format', choices=sorted(FORMAT_EXTENSIONS), default='json',
+                        help='轨迹输出格式：紧凑 JSON、NDJSON 或二进制列式文件')
+    parser.add_argument('--output', default=None, help='轨迹输出路径')
+    parser.add_argument('--profile', default=None, metavar='DIR',
+                        help='记录各阶段耗时和计数，写出 DIR/profile.json')
+    parser.add_argument('--cprofile', action='store_true', help='配合 --profile 额外写出 DIR/profile.pstats')
+    parser.add_argument('--validate', action='store_true', help='模拟过程中检查模块占用和 JIT 约束并输出违例统计')
+    parser.add_argument('--fail-fast', action='store_true', help='配合 --validate，遇到第一个违例即停止')
+    parser.add_argument('--bound', action='store_true', help='输出总完成时间的解析下界、瓶颈模块和最优性差距')
+    parser.add_argument('--events', default=None, metavar='PATH',
+                        help='逐事件明细写入 JSONL 文件（以 .gz 结尾时压缩），默认不写')
+    parser.add_argument('--event-level', choices=[k for k in EVENT_LEVELS if k != 'off'], default='conflict',
+                        help='明细级别：cleaning 仅清洗，conflict 再加冲突延迟，step 再加每步分配')
+    args = parser.parse_args()
+    output = args.output or 'task_1_wafer_trajectory' + FORMAT_EXTENSIONS[args.format]
+
+    profiler = None
+    if args.profile:
+        os.makedirs(args.profile, exist_ok=True)
+        profiler = Profiler('task1', cprofile=args.cprofile)
+    validator = Validator.from_recipe(RECIPE, fail_fast=args.fail_fast) if args.validate else None
+    reporter = Reporter(EventLog(args.events, args.event_level))
+    sim = Task1Simulator(reporter=reporter, profiler=profiler, validator=validator)
+    # 边模拟边写出轨迹文件
+    with open_sink(output, args.format) as sink, reporter.events:
+        try:
+            sim.run(sink)
+        except ConstraintViolation as e:
+            print(f"约束违例，提前终止：{e.violation}")
+            raise SystemExit(1)
+        if profiler is not None:
+            profiler.close_sink(sink)
+    print_report(sim)
+    if validator is not None:
+        report = validator.report()
+        print(f"\n约束检查（驻留≤{validator.dwell_limit}秒，转移≤{validator.transfer_limit}秒）：共 {report['violations']} 处违例")
+        for kind, n in report['by_kind'].items():
+            print(f"  {kind:<12} {n}")
+    if args.bound:
+        bound = lower_bound(sim)
+        gap = optimality_gap(sim.max_completion_time, bound['lower_bound'])
+        print(f"\n总完成时间下界: {bound['lower_bound']:.1f} 秒（瓶颈 {bound['bottleneck']}，"
+              f"单片关键路径 {bound['critical_path']:.1f} 秒），最优性差距 {gap:.2%}")
+        for name, value in list(bound['resources'].items())[:5]:
+            print(f"  {name:<8} {value:>10.1f}")
+    if profiler is not None:
+        profiler.write(os.path.join(args.profile, 'profile.json'))
+        profiler.dump_stats(os.path.join(args.profile, 'profile.pstats'))
@@ -1,53 +1,41 @@
-from collections import deque
+import argparse
+from contextlib import nullcontext
+import copy
 from heapq import heappush, heappop
 import json
+import os
 import random
 import math
 import statistics
-import matplotlib.pyplot as plt
 from tqdm import tqdm
 from multiprocessing import Pool
-import copy
 import logging
-
-# 设置中文支持
-plt.rcParams['font.sans-serif'] = ['SimHei']  # 使用 SimHei 字体支持中文
-plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
+from dispatch import SlotIndex
+from instrumentation import Profiler, merge_pstats, merge_reports
+from validator import ConstraintViolation
+from bounds import makespan_lower_bound, optimality_gap
+from recipe import compile_recipe, default_recipe_path, load_recipe
+from replication import (EXPERIMENT_SEED, MAX_REPLICAS, MIN_REPLICAS, ROUND, TARGET_CI, converged, mean_ci,
+                         paired_difference, replica_seed, std_ci)
+from stochastic import SCENARIO_MODELS
+from trajectory import FORMAT_EXTENSIONS, open_sink
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Module definitions (unchanged)
-step_durations = {
-    'LP1': 5, 'TM1': 6, 'AL': 8, 'LLA': 15, 'LLB': 15, 'LLC': 15, 'LLD': 70,
-    'PM7': 70, 'PM8': 70, 'PM3': 200, 'PM1': 200, 'PM10': 200, 'TM2': 13, 'TM3': 11.5
-}
+# Module definitions, compiled from recipes/task2.json. The engine runs on the recipe's
+# integer unit/step IDs; the name-keyed tables below are derived from it for callers
+RECIPE = load_recipe(default_recipe_path('task2'))
+step_durations = dict(zip(RECIPE.unit_names, RECIPE.unit_duration_list()))
 module_action_durations = {'LLA': 2, 'LLB': 2, 'LLC': 2, 'LLD': 5}
-steps = [
-    'LP1', 'TM1', 'AL', 'LLA/LLB', 'TM2', 'PM7/PM8', 'TM2', 'LLC',
-    'TM3', 'PM3', 'TM3', 'LLD', 'TM3', 'PM1', 'TM3', 'LLD', 'TM2',
-    'PM10', 'TM2', 'LLD', 'TM2', 'LLA/LLB', 'TM1', 'LP1'
-]
-units = ['LP1', 'TM1', 'AL', 'LLA', 'LLB', 'LLC', 'LLD', 'PM7', 'PM8', 'PM3', 'PM1', 'PM10', 'TM2', 'TM3']
-unit_slots = {
-    unit: {1: {'available_time': 0, 'wafer_id': None}, 2: {'available_time': 0, 'wafer_id': None}}
-    if unit in ['LLA', 'LLB', 'LLC', 'LLD', 'TM1', 'TM2', 'TM3'] else {1: {'available_time': 0, 'wafer_id': None}}
-    for unit in units
-}
-unit_slot_queue_length = {
-    unit: {1: 0, 2: 0} if unit in ['LLA', 'LLB', 'LLC', 'LLD', 'TM1', 'TM2', 'TM3'] else {1: 0}
-    for unit in units
-}
-max_slot_queue_length = {
-    unit: {1: 0, 2: 0} if unit in ['LLA', 'LLB', 'LLC', 'LLD', 'TM1', 'TM2', 'TM3'] else {1: 0}
-    for unit in units
-}
-step_units = {
-    'LP1': ['LP1'], 'TM1': ['TM1'], 'AL': ['AL'], 'LLA/LLB': ['LLA', 'LLB'],
-    'TM2': ['TM2'], 'PM7/PM8': ['PM7', 'PM8'], 'LLC': ['LLC'], 'TM3': ['TM3'],
-    'PM3': ['PM3'], 'PM1': ['PM1'], 'LLD': ['LLD'], 'PM10': ['PM10']
-}
+steps = [RECIPE.step_names[g] for g in RECIPE.route]
+units = list(RECIPE.unit_names)
+step_units = {name: [units[u] for u in candidates]
+              for name, candidates in zip(RECIPE.step_names, RECIPE.step_candidates)}
 NUM_WAFERS = 75
+NUM_REPLICAS = 50  # replicas per (scenario, mode) in run_validation_experiments without a CI target
+REPRESENTATIVE_REPLICA = 0  # replica whose trajectory is written to disk
+TM_OVERLAP = 4  # a transfer robot may start its next action this many seconds before the last one ends
 default_params = {
     'w1': 0.5, 'w2': 0.3, 'w3': 0.2, 'time_window': 20,
     'module_preference': {'LLA': 0.5, 'LLB': 0.5, 'PM7': 0.5, 'PM8': 0.5},
@@ -55,185 +43,391 @@ default_params = {
     'conflict_penalty': 2.0, 'process_priority': 0.2
 }
 
-def get_move_types(step, module, slot_id, start_time, end_time, wafer_id, move_id_counter):
-    moves = []
+# MoveType per module, compiled once instead of on every call
+module_move_types = {
+    'LP1': 1, 'TM1': 3, 'TM2': 3, 'TM3': 3, 'AL': 10,
+    'LLA': 2, 'LLB': 2, 'LLC': 2, 'LLD': 2, 'PM7': 8, 'PM8': 8,
+    'PM3': 8, 'PM1': 8, 'PM10': 8
+}
+
+def get_move_types(sink, step, module, slot_id, start_time, end_time, wafer_id, move_id_counter):
     mat_id = f"{wafer_id + 1}.{step}"
-    move_type = {
-        'LP1': 1, 'TM1': 3, 'TM2': 3, 'TM3': 3, 'AL': 10,
-        'LLA': 2, 'LLB': 2, 'LLC': 2, 'LLD': 2, 'PM7': 8, 'PM8': 8,
-        'PM3': 8, 'PM1': 8, 'PM10': 8
-    }.get(module, 3)
-    moves.append({
-        "StartTime": start_time,
-        "EndTime": end_time,
-        "MoveID": move_id_counter,
-        "MoveType": move_type,
-        "ModuleName": module,
-        "MatID": mat_id,
-        "SlotID": slot_id
-    })
-    return moves, move_id_counter + 1
+    sink.add(start_time, end_time, move_id_counter, module_move_types.get(module, 3), module, mat_id, slot_id)
+    return move_id_counter + 1
 
-def select_module_and_slot(step, params, adaptive=True, module_score_cache=None):
-    if module_score_cache is None:
-        module_score_cache = {}
-    
-    candidates = step_units[step]
+def pyplot():
+    # pyplot and its font setup load on first use, so pool workers and callers that never
+    # draw a chart (tuning, batch runs, the scheduling service) do not import matplotlib
+    import matplotlib.pyplot as plt
+    # 设置中文支持
+    plt.rcParams['font.sans-serif'] = ['SimHei']  # 使用 SimHei 字体支持中文
+    plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
+    return plt
+
+def trajectory_path(disruption_type, adaptive, output_format='json'):
+    suffix = '_adaptive' if adaptive else ''
+    return f'task_2_wafer_trajectory_{disruption_type}{suffix}{FORMAT_EXTENSIONS[output_format]}'
+
+_table_recipes = {}
+_bounds = {}
+
+def recipe_for(units_by_step, durations):
+    # run_scheduling takes name-keyed tables; the module's own resolve straight to RECIPE,
+    # any other tables are compiled once (slot counts and TM flags come from RECIPE)
+    if units_by_step is step_units and durations is step_durations:
+        return RECIPE
+    key = json.dumps([units_by_step, durations], sort_keys=True)
+    recipe = _table_recipes.get(key)
+    if recipe is None:
+        spec = {
+            'name': RECIPE.name,
+            'units': {unit: {'slots': RECIPE.unit_slots[RECIPE.unit_index[unit]] if unit in RECIPE.unit_index else 1,
+                             'duration': duration,
+                             'transport': unit in RECIPE.unit_index and bool(RECIPE.unit_transport[RECIPE.unit_index[unit]])}
+                      for unit, duration in durations.items()},
+            'steps': {step: {'units': list(candidates)} for step, candidates in units_by_step.items()},
+            'route': steps
+        }
+        recipe = _table_recipes[key] = compile_recipe(spec)
+    return recipe
+
+def lower_bound(recipe=RECIPE, num_wafers=NUM_WAFERS):
+    # Analytical makespan bound of a lot (bounds.makespan_lower_bound), memoized per recipe
+    key = (recipe, num_wafers)
+    bound = _bounds.get(key)
+    if bound is None:
+        bound = _bounds[key] = makespan_lower_bound(recipe, num_wafers, transport_overlap=TM_OVERLAP)
+    return bound
+
+def build_slot_index(recipe, params, slot_available=None):
+    # SlotIndex over the recipe's integer IDs; preferences are looked up by name once here
+    module_pref = {u: params['module_preference'].get(name, 0.5) for u, name in enumerate(recipe.unit_names)}
+    slot_pref = {(u, s): params['slot_preference'].get(name, {}).get(s + 1, 0.5)
+                 for u, name in enumerate(recipe.unit_names) for s in range(recipe.unit_slots[u])}
+    if slot_available is None:
+        slot_available = [[0] * n for n in recipe.unit_slots]
+    return SlotIndex(dict(enumerate(recipe.step_candidates)),
+                     {u: dict(enumerate(available)) for u, available in enumerate(slot_available)},
+                     module_pref, slot_pref)
+
+def select_module_and_slot(step, params, adaptive=True, slot_index=None, rng=random, current_time=0, recipe=None):
+    # step is a compiled step ID; returns (unit ID, 0-based slot)
+    recipe = recipe or RECIPE
+    candidates = recipe.step_candidates[step]
     if not adaptive:
-        unit = random.choice(candidates)
-        slots = [1, 2] if unit in ['LLA', 'LLB', 'LLC', 'LLD', 'TM1', 'TM2', 'TM3'] else [1]
-        return unit, random.choice(slots)
+        unit = rng.choice(candidates)
+        return unit, rng.choice(range(recipe.unit_slots[unit]))
     
-    cache_key = (step, tuple(sorted(params['module_preference'].items())))
-    if cache_key in module_score_cache:
-        return module_score_cache[cache_key]
-    
-    best_score = -float('inf')
-    best_unit, best_slot = None, None
-    for unit in candidates:
-        for slot in unit_slots[unit]:
-            load_factor = sum(max_slot_queue_length[unit].values()) / 10
-            slot_load = unit_slots[unit][slot]['available_time'] / 10000
-            score = (params['module_preference'].get(unit, 0.5) * (1 - load_factor) +
-                     params['slot_preference'].get(unit, {1: 0.5, 2: 0.5})[slot] * (1 - slot_load))
-            if score > best_score:
-                best_score = score
-                best_unit = unit
-                best_slot = slot
-    module_score_cache[cache_key] = (best_unit, best_slot)
-    return best_unit, best_slot
+    # Adaptive: earliest-available slot among the step's candidates, ties broken by the
+    # preference-weighted load score. Without a live index, score the initial (idle) state.
+    if slot_index is None:
+        slot_index = build_slot_index(recipe, params)
+    return slot_index.select(step, current_time)
 
-def handle_disruption(unit, slot, current_time, disruption_type, unit_slots, unit_slot_queue_length):
-    if disruption_type == 'none' or random.random() > 0.05:
-        return False
-    if disruption_type in ['fault', 'mixed']:
-        unit_slots[unit][slot]['available_time'] = current_time + 100
-        unit_slots[unit][slot]['wafer_id'] = None
-        unit_slot_queue_length[unit][slot] = max(0, unit_slot_queue_length[unit][slot] - 1)
-        return True
-    return False
+def handle_disruption(unit, slot, current_time, downtime, slot_available):
+    # The step that just completed drew a fault: its slot goes down for `downtime` seconds.
+    # Steps already booked on the slot keep their times, so availability never moves earlier;
+    # the completed step's queue entry was already released when its event was popped.
+    slot_available[unit][slot] = max(slot_available[unit][slot], current_time + downtime)
 
-def run_scheduling(params, wafer_tasks, step_units, step_durations, disruption_type='none', adaptive=True):
+def run_scheduling(params, wafer_tasks, step_units, step_durations, disruption_type='none', adaptive=True,
+                   sink=None, output_format='json', metrics_only=False, seed=None, makespan_limit=None,
+                   profiler=None, num_wafers=NUM_WAFERS, validator=None, lookahead=None, stochastic=None):
+    # Moves are streamed to `sink`; by default to the per-scenario trajectory file.
+    # metrics_only skips moves, paths and unit usage entirely; with a seed the same
+    # run can be replayed later to materialize its trajectory. Once an event time passes
+    # makespan_limit the run stops and reports that partial makespan with 'aborted'.
+    # An instrumentation.Profiler collects per-phase timings and counters for the run.
+    # A validator.Validator checks slot capacity and JIT limits as steps are scheduled; a
+    # fail-fast one stops the run at the first violation, reported under 'violation'.
+    # In adaptive mode a lookahead.Lookahead replaces greedy dispatch by short rollouts.
+    # Durations and faults come from the scenario's stochastic.StochasticModel (or `stochastic`),
+    # sampled up front from the seed; the random module is only used by random dispatch.
     try:
-        # Initialize local state
-        local_unit_slots = copy.deepcopy(unit_slots)
-        local_unit_slot_queue_length = copy.deepcopy(unit_slot_queue_length)
-        local_max_slot_queue_length = copy.deepcopy(max_slot_queue_length)
-        move_list = []
-        conflict_log = []
-        unit_usage = {unit: [] for unit in units}
-        move_id_counter = 0
-        event_queue = []
-        wafer_paths = [[] for _ in range(NUM_WAFERS)]
-        wafer_tasks = [deque(steps) for _ in range(NUM_WAFERS)]
-        max_completion_time = 0
-        last_tm_action = {unit: 0 for unit in ['TM1', 'TM2', 'TM3']}
-        module_score_cache = {}
-        
-        # Initial task allocation
-        for i in range(NUM_WAFERS):
-            step = wafer_tasks[i].popleft()
-            unit, slot = select_module_and_slot(step, params, adaptive, module_score_cache)
-            local_unit_slot_queue_length[unit][slot] += 1
-            local_max_slot_queue_length[unit][slot] = max(
-                local_max_slot_queue_length[unit][slot], local_unit_slot_queue_length[unit][slot]
-            )
-            start_time = local_unit_slots[unit][slot]['available_time']
-            if unit in ['TM1', 'TM2', 'TM3']:
-                start_time = max(start_time, last_tm_action[unit] - 4)
-                last_tm_action[unit] = start_time + step_durations[unit]
-            end_time = start_time + step_durations[unit]
-            local_unit_slots[unit][slot]['available_time'] = end_time
-            local_unit_slots[unit][slot]['wafer_id'] = i + 1
+        if metrics_only:
+            sink = None
+        elif sink is None:
+            with open_sink(trajectory_path(disruption_type, adaptive, output_format), output_format) as sink:
+                result = run_scheduling(params, wafer_tasks, step_units, step_durations, disruption_type,
+                                        adaptive, sink, seed=seed, makespan_limit=makespan_limit,
+                                        profiler=profiler, num_wafers=num_wafers, validator=validator,
+                                        lookahead=lookahead, stochastic=stochastic)
+                if profiler is not None:
+                    profiler.close_sink(sink)
+                return result
+        rng = random.Random(seed) if seed is not None else random
+        recipe = recipe_for(step_units, step_durations)
+        model = stochastic if stochastic is not None else SCENARIO_MODELS.get(disruption_type)
+        if profiler is None:
+            samples = model.sample(recipe, num_wafers, seed) if model is not None else None
+            return _schedule(params, recipe, samples, adaptive, sink, rng, makespan_limit, num_wafers,
+                             validator=validator, lookahead=lookahead)
+        profiler.start()
+        try:
+            with profiler.phase('sampling'):
+                samples = model.sample(recipe, num_wafers, seed) if model is not None else None
+            result = _schedule(params, recipe, samples, adaptive, sink, rng, makespan_limit, num_wafers,
+                               profiler, validator, lookahead)
+        finally:
+            profiler.stop()
+        profiler.count('events', profiler.calls['heap_pop'])
+        profiler.count('dispatch_calls', profiler.calls['dispatch'])
+        return result
+    except ConstraintViolation as e:
+        return {'makespan': float('inf'), 'num_conflicts': 0, 'load_balance': 0, 'aborted': True,
+                'violation': e.violation}
+    except Exception as e:
+        logging.error(f"Error in run_scheduling (disruption={disruption_type}, adaptive={adaptive}): {str(e)}")
+        return {'makespan': float('inf'), 'num_conflicts': 0, 'load_balance': 0}
+
+def _schedule(params, recipe, samples, adaptive, sink, rng, makespan_limit, num_wafers, profiler=None,
+              validator=None, lookahead=None):
+    # Event loop of run_scheduling on compiled IDs. With a profiler the heap, dispatch,
+    # disruption and emission calls are bound to timed wrappers; otherwise to the plain functions.
+    # With stochastic.Samples, the k-th move of a unit takes sampled_duration[unit][k] and, if
+    # sampled_fault[unit][k], fails at completion; the flag rides in the event's last field.
+    pop, push, select, disrupt, emit = heappop, heappush, select_module_and_slot, handle_disruption, get_move_types
+    if profiler is not None:
+        pop = profiler.timed('heap_pop', heappop)
+        push = profiler.timed_heappush()
+        select = profiler.timed('dispatch', select_module_and_slot)
+        disrupt = profiler.timed('disruption', handle_disruption)
+        emit = profiler.timed('emit', get_move_types)
+    record = sink is not None
+    if validator is not None:
+        validator.reset()
+    route = recipe.route.tolist()
+    route_len = len(route)
+    duration = recipe.unit_duration_list()
+    is_tm = list(recipe.unit_transport)
+    unit_names = recipe.unit_names
+    step_names = recipe.step_names
+    # Initialize local state, indexed [unit][slot] by compiled IDs
+    slot_available = [[0] * n for n in recipe.unit_slots]
+    slot_queue_length = [[0] * n for n in recipe.unit_slots]
+    max_queue_length = [[0] * n for n in recipe.unit_slots]
+    conflict_log = []
+    unit_usage = [[] for _ in unit_names] if record else None
+    move_id_counter = 0
+    event_queue = []
+    wafer_paths = [[] for _ in range(num_wafers)] if record else None
+    wafer_pos = [1] * num_wafers  # index of each wafer's next step in the route
+    max_completion_time = 0
+    last_tm_action = [0] * len(unit_names)
+    sampled = samples is not None
+    if sampled:
+        sampled_duration, sampled_fault, downtime = samples.tables()
+        move_count = [0] * len(unit_names)
+    slot_index = build_slot_index(recipe, params, slot_available) if adaptive else None
+    choose = None
+    if lookahead is not None and adaptive:
+        lookahead.bind(recipe, params, slot_available, slot_queue_length, last_tm_action, wafer_pos, event_queue,
+                       nominal=not sampled)
+        choose = lookahead.choose
+    
+    # Initial task allocation
+    for i in range(num_wafers):
+        step = route[0]
+        unit, slot = select(step, params, adaptive, slot_index, rng, 0, recipe)
+        queue = slot_queue_length[unit]
+        queue[slot] += 1
+        max_queue_length[unit][slot] = max(max_queue_length[unit][slot], queue[slot])
+        start_time = slot_available[unit][slot]
+        if sampled:
+            k = move_count[unit]
+            move_count[unit] = k + 1
+            step_duration, fault = sampled_duration[unit][k], sampled_fault[unit][k]
+        else:
+            step_duration, fault = duration[unit], 0
+        if is_tm[unit]:
+            start_time = max(start_time, last_tm_action[unit] - TM_OVERLAP)
+            last_tm_action[unit] = start_time + step_duration
+        end_time = start_time + step_duration
+        slot_available[unit][slot] = end_time
+        if slot_index is not None:
+            slot_index.update(unit, slot, end_time, sum(queue))
+        if validator is not None:
+            validator.step(i + 1, unit, start_time, end_time, slot + 1)
+        if record:
             wafer_paths[i].append((step, start_time, end_time, unit, slot))
             unit_usage[unit].append((start_time, end_time, i + 1, step, slot))
-            moves, move_id_counter = get_move_types(step, unit, slot, start_time, end_time, i, move_id_counter)
-            move_list.extend(moves)
-            heappush(event_queue, (end_time, i, step, unit, slot, 0))
+            move_id_counter = emit(sink, step_names[step], unit_names[unit], slot + 1,
+                                   start_time, end_time, i, move_id_counter)
+        push(event_queue, (end_time, i, step, unit, slot, fault))
+    
+    # Event loop
+    while event_queue:
+        current_time, wafer_id, completed_step, completed_unit, completed_slot, fault = pop(event_queue)
+        max_completion_time = max(max_completion_time, current_time)
+        if makespan_limit is not None and current_time > makespan_limit:
+            return {'makespan': current_time, 'num_conflicts': len(conflict_log), 'load_balance': 0,
+                    'aborted': True}
+        slot_queue_length[completed_unit][completed_slot] -= 1
         
-        # Event loop
-        step_indices = {wafer_id: 0 for wafer_id in range(NUM_WAFERS)}
-        while event_queue:
-            current_time, wafer_id, completed_step, completed_unit, completed_slot, _ = heappop(event_queue)
-            max_completion_time = max(max_completion_time, current_time)
-            local_unit_slot_queue_length[completed_unit][completed_slot] -= 1
-            local_unit_slots[completed_unit][completed_slot]['wafer_id'] = None
-            step_indices[wafer_id] += 1
-            
-            if handle_disruption(completed_unit, completed_slot, current_time, disruption_type,
-                               local_unit_slots, local_unit_slot_queue_length):
-                continue
-            
-            if not wafer_tasks[wafer_id]:
-                continue
-            
-            next_step = wafer_tasks[wafer_id].popleft()
-            unit, slot = select_module_and_slot(next_step, params, adaptive, module_score_cache)
-            local_unit_slot_queue_length[unit][slot] += 1
-            local_max_slot_queue_length[unit][slot] = max(
-                local_max_slot_queue_length[unit][slot], local_unit_slot_queue_length[unit][slot]
-            )
-            
-            start_time = max(current_time, local_unit_slots[unit][slot]['available_time'])
-            if unit in ['TM1', 'TM2', 'TM3']:
-                start_time = max(start_time, last_tm_action[unit] - 4)
-                last_tm_action[unit] = start_time + step_durations[unit]
-            
-            end_time = start_time + step_durations[unit]
-            local_unit_slots[unit][slot]['available_time'] = end_time
-            local_unit_slots[unit][slot]['wafer_id'] = wafer_id + 1
-            wafer_paths[wafer_id].append((next_step, start_time, end_time, unit, slot))
-            unit_usage[unit].append((start_time, end_time, wafer_id + 1, next_step, slot))
-            moves, move_id_counter = get_move_types(next_step, unit, slot, start_time, end_time, wafer_id, move_id_counter)
-            move_list.extend(moves)
-            
-            heappush(event_queue, (end_time, wafer_id, next_step, unit, slot, 0))
+        if fault:
+            disrupt(completed_unit, completed_slot, current_time, downtime[completed_unit], slot_available)
+        if slot_index is not None:
+            slot_index.update(completed_unit, completed_slot, slot_available[completed_unit][completed_slot],
+                              sum(slot_queue_length[completed_unit]))
+        if fault:
+            if profiler is not None:
+                profiler.count('disruptions')
+            continue
+        
+        pos = wafer_pos[wafer_id]
+        if pos >= route_len:
+            continue
         
-        # Write JSON
-        if adaptive==True:
-            with open(f'task_2_wafer_trajectory_{disruption_type}_adaptive.json', 'w') as f:
-                json.dump({"MoveList": move_list}, f, indent=4)
+        next_step = route[pos]
+        wafer_pos[wafer_id] = pos + 1
+        if choose is not None:
+            unit, slot = choose(next_step, wafer_id, current_time)
         else:
-            with open(f'task_2_wafer_trajectory_{disruption_type}.json', 'w') as f:
-                json.dump({"MoveList": move_list}, f, indent=4)
+            unit, slot = select(next_step, params, adaptive, slot_index, rng, current_time, recipe)
+        queue = slot_queue_length[unit]
+        queue[slot] += 1
+        max_queue_length[unit][slot] = max(max_queue_length[unit][slot], queue[slot])
         
-        return {
-            'makespan': max_completion_time,
-            'num_conflicts': len(conflict_log),
-            'load_balance': sum(sum(v for v in slots.values()) for slots in local_max_slot_queue_length.values())
-        }
-    except Exception as e:
-        logging.error(f"Error in run_scheduling (disruption={disruption_type}, adaptive={adaptive}): {str(e)}")
-        return {'makespan': float('inf'), 'num_conflicts': 0, 'load_balance': 0}
+        start_time = max(current_time, slot_available[unit][slot])
+        if sampled:
+            k = move_count[unit]
+            move_count[unit] = k + 1
+            step_duration, fault = sampled_duration[unit][k], sampled_fault[unit][k]
+        else:
+            step_duration, fault = duration[unit], 0
+        if is_tm[unit]:
+            start_time = max(start_time, last_tm_action[unit] - TM_OVERLAP)
+            last_tm_action[unit] = start_time + step_duration
+        
+        end_time = start_time + step_duration
+        slot_available[unit][slot] = end_time
+        if slot_index is not None:
+            slot_index.update(unit, slot, end_time, sum(queue))
+        if validator is not None:
+            validator.step(wafer_id + 1, unit, start_time, end_time, slot + 1)
+        if record:
+            wafer_paths[wafer_id].append((next_step, start_time, end_time, unit, slot))
+            unit_usage[unit].append((start_time, end_time, wafer_id + 1, next_step, slot))
+            move_id_counter = emit(sink, step_names[next_step], unit_names[unit], slot + 1,
+                                   start_time, end_time, wafer_id, move_id_counter)
+        
+        push(event_queue, (end_time, wafer_id, next_step, unit, slot, fault))
+    
+    if profiler is not None:
+        profiler.count('moves_emitted', move_id_counter)
+    result = {
+        'makespan': max_completion_time,
+        'num_conflicts': len(conflict_log),
+        'load_balance': sum(sum(slots) for slots in max_queue_length),
+        'events': sum(wafer_pos),  # every dispatch pushed exactly one event, and all were processed
+    }
+    if samples is None:
+        # The bound assumes nominal durations and a full lot: sampled durations can beat it and
+        # disrupted wafers leave the lot, so the gap is only reported for deterministic runs
+        bound = lower_bound(recipe, num_wafers)
+        result.update(lower_bound=bound['lower_bound'], bottleneck=bound['bottleneck'],
+                      gap=optimality_gap(max_completion_time, bound['lower_bound']))
+    return result
+
+EVAL_SEED = 0  # common random numbers for every candidate evaluated by the tuner
+PT_EVALUATIONS = 500  # evaluation budget of the parallel tempering tuner (--tuner pt)
+# The tuners search the preferences, the only params the adaptive dispatcher reads. They only
+# break ties between slots with the same effective start, which nominal durations never produce
+# ('none' has nothing to tune), so candidates are evaluated under duration variation.
+TUNING_SCENARIO = 'time_variation'
+
+def canonical_params(params):
+    # Hashable, order-independent form of a params dict, used as the evaluation cache key
+    if isinstance(params, dict):
+        return tuple((k, canonical_params(v)) for k, v in sorted(params.items(), key=lambda kv: str(kv[0])))
+    if isinstance(params, float):
+        return round(params, 12)
+    return params
+
+def evaluate_params(args):
+    # Pool worker: makespan of one candidate, and whether it ran to completion
+    params, scenario, adaptive, seed, makespan_limit = args
+    result = run_scheduling(params, [], step_units, step_durations, scenario, adaptive,
+                            metrics_only=True, seed=seed, makespan_limit=makespan_limit)
+    return result['makespan'], not result.get('aborted', False)
 
-def optimize_parameters():
+def evaluate_candidates(candidates, scenario, adaptive, seed, cache, pool=None):
+    # candidates: [(params, makespan_limit)]. Cache entries are (makespan, exact); an aborted
+    # run only stores a lower bound, which is reused when it already exceeds the new limit.
+    values = [None] * len(candidates)
+    pending = []
+    for i, (params, limit) in enumerate(candidates):
+        key = (canonical_params(params), scenario, adaptive, seed)
+        hit = cache.get(key)
+        if hit is not None and (hit[1] or (limit is not None and hit[0] > limit)):
+            values[i] = hit[0]
+            continue
+        pending.append((i, key, (params, scenario, adaptive, seed, limit)))
+    jobs = [job for _, _, job in pending]
+    outcomes = pool.map(evaluate_params, jobs) if pool is not None and len(jobs) > 1 else map(evaluate_params, jobs)
+    for (i, key, _), (value, exact) in zip(pending, outcomes):
+        old = cache.get(key)
+        if old is None or exact or (not old[1] and value > old[0]):
+            cache[key] = (value, exact)
+        values[i] = value
+    return values
+
+def perturb_preferences(params, rng, spread):
+    # Copy of params with every module and slot preference moved by U(-spread, spread), kept in [0, 1]
+    params = copy.deepcopy(params)
+    prefs = params['module_preference']
+    for unit in prefs:
+        prefs[unit] = min(1.0, max(0.0, prefs[unit] + rng.uniform(-spread, spread)))
+    for slots in params['slot_preference'].values():
+        for slot in slots:
+            slots[slot] = min(1.0, max(0.0, slots[slot] + rng.uniform(-spread, spread)))
+    return params
+
+def optimize_parameters(pool=None, batch_size=None, cache=None, seed=EVAL_SEED, scenario=TUNING_SCENARIO,
+                        adaptive=True, restarts=5, iterations=100):
+    # Simulated annealing over the module and slot preferences of the adaptive dispatcher
+    # (random dispatch reads no params, so there is nothing to tune with adaptive=False).
+    # Each step draws a batch of neighbors of the current params together with their
+    # acceptance draws, evaluates them in parallel, and consumes them in order up to the
+    # first accepted one, which is equivalent to the serial chain.
+    # A neighbor is accepted iff makespan < cost - T*ln(u), so its run is aborted as soon as
+    # the partial makespan passes that limit. There is no early stop against the analytical
+    # lower bound: it only holds for nominal durations, and under 'none' every preference
+    # vector gives the same makespan.
     try:
-        best_params = default_params.copy()
+        rng = random.Random(seed)
+        if cache is None:
+            cache = {}
+        if batch_size is None:
+            batch_size = 4 if pool is not None else 1
+        best_params = default_params
         best_cost = float('inf')
         T = 1000
         alpha = 0.95
         
-        for _ in range(5):
-            params = default_params.copy()
-            params['w1'] = random.uniform(0.4, 0.6)
-            params['w2'] = random.uniform(0.2, 0.4)
-            params['w3'] = 1 - params['w1'] - params['w2']
+        for _ in range(restarts):
+            params = perturb_preferences(default_params, rng, 0.1)
+            cost = evaluate_candidates([(params, None)], scenario, adaptive, seed, cache, pool)[0]
             
-            for _ in range(100):
-                new_params = params.copy()
-                new_params['w1'] += random.uniform(-0.05, 0.05)
-                new_params['w2'] += random.uniform(-0.05, 0.05)
-                new_params['w3'] = max(0, 1 - new_params['w1'] - new_params['w2'])
-                if new_params['w3'] < 0:
-                    continue
-                cost = run_scheduling(params, [], step_units, step_durations, adaptive=False)['makespan']
-                new_cost = run_scheduling(new_params, [], step_units, step_durations, adaptive=False)['makespan']
-                if new_cost < cost or random.random() < math.exp(-(new_cost - cost) / T):
-                    params = new_params
-                    if new_cost < best_cost:
-                        best_cost = new_cost
-                        best_params = new_params
-                T *= alpha
+            remaining = iterations
+            while remaining > 0:
+                batch = []
+                t = T
+                for _ in range(min(batch_size, remaining)):
+                    new_params = perturb_preferences(params, rng, 0.05)
+                    u = rng.random()
+                    batch.append((new_params, cost - t * math.log(u) if u > 0 else float('inf')))
+                    t *= alpha
+                new_costs = evaluate_candidates(batch, scenario, adaptive, seed, cache, pool)
+                for (new_params, limit), new_cost in zip(batch, new_costs):
+                    remaining -= 1
+                    T *= alpha
+                    if new_cost < limit:
+                        params, cost = new_params, new_cost
+                        if new_cost < best_cost:
+                            best_cost = new_cost
+                            best_params = new_params
+                        break
         
         return best_params
     except Exception as e:
@@ -241,15 +435,40 @@ def optimize_parameters():
         return default_params
 
 def run_single_experiment(args):
-    scenario, params, adaptive = args
+    # Only the representative replica of a (scenario, mode) cell writes its trajectory;
+    # all other replicas run in metrics-only mode. With a profile_dir the run is instrumented
+    # and its report travels back to the parent in result['profile'].
+    scenario, mode, params, adaptive, seed, persist, output_format, profile_dir, cprofile = args
     try:
-        result = run_scheduling(params, [], step_units, step_durations, scenario, adaptive)
-        return scenario, result, adaptive, params
+        profiler = Profiler(f'{scenario}/{mode}/{seed}', cprofile) if profile_dir else None
+        result = run_scheduling(params, [], step_units, step_durations, scenario, adaptive,
+                                output_format=output_format, metrics_only=not persist, seed=seed,
+                                profiler=profiler)
+        if profiler is not None:
+            if cprofile:
+                profiler.dump_stats(run_pstats_path(profile_dir, scenario, mode, seed))
+            result = dict(result, profile=profiler.report())
+        return scenario, mode, result
     except Exception as e:
         logging.error(f"Error in run_single_experiment (scenario={scenario}, adaptive={adaptive}): {str(e)}")
-        return scenario, {'makespan': float('inf'), 'num_conflicts': 0, 'load_balance': 0}, adaptive, params
+        return scenario, mode, {'makespan': float('inf'), 'num_conflicts': 0, 'load_balance': 0}
 
-def run_validation_experiments():
+def run_pstats_path(profile_dir, scenario, mode, seed):
+    return os.path.join(profile_dir, f'{scenario}_{mode}_{seed}.pstats')
+
+def run_validation_experiments(output_format='json', engine='scalar', tuner='sa', profile_dir=None, cprofile=False,
+                               target_ci=TARGET_CI, max_replicas=MAX_REPLICAS):
+    # With a profile_dir, every run is instrumented and profile_dir/profile.json gets the
+    # driver's phases (tuning, experiments, plots), all runs merged, and a merge per cell.
+    # cprofile additionally keeps one pstats file per run and merges them into profile.pstats.
+    driver = None
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+        driver = Profiler('run_validation_experiments')
+        driver.start()
+    phase = driver.phase if driver is not None else lambda name: nullcontext()
+    run_reports = {}
+    pstats_paths = []
     scenarios = ['none', 'fault', 'time_variation', 'mixed']
     scenario_labels = {'none': '无干扰', 'fault': '故障', 'time_variation': '时间变化', 'mixed': '混合干扰'}
     modes = ['baseline', 'static', 'adaptive']
@@ -258,22 +477,86 @@ def run_validation_experiments():
         mode: {s: {'makespan': [], 'num_conflicts': [], 'load_balance': []} for s in scenarios}
         for mode in modes
     }
-    static_params = optimize_parameters()
-    
-    tasks = [(s, default_params, False) for s in scenarios] * 50 + \
-            [(s, static_params, False) for s in scenarios] * 50 + \
-            [(s, static_params, True) for s in scenarios] * 50
-    
+    # One pool serves both the parameter search and the experiment sweep
     with Pool(4) as pool:
-        for scenario, result, adaptive, params in tqdm(pool.imap_unordered(run_single_experiment, tasks),
-                                                    total=len(tasks), desc="运行实验"):
-            mode = 'baseline' if params == default_params and not adaptive else \
-                   'static' if params == static_params and not adaptive else 'adaptive'
-            results[mode][scenario]['makespan'].append(result['makespan'])
-            results[mode][scenario]['num_conflicts'].append(result['num_conflicts'])
-            results[mode][scenario]['load_balance'].append(result['load_balance'])
+        with phase('tuning'):
+            if tuner == 'pt':
+                from tuning import parallel_tempering
+                static_params = parallel_tempering(4, max_evaluations=PT_EVALUATIONS, pool=pool)['best_params']
+            else:
+                static_params = optimize_parameters(pool)
+        mode_setup = {
+            'baseline': (default_params, False),
+            'static': (static_params, False),
+            'adaptive': (static_params, True)
+        }
+    
+        # Replica r of scenario s runs with replica_seed(si, r) in every mode (common random
+        # numbers). Cells run in rounds until the CIs of their makespan mean and std are within
+        # target_ci (replication.py); without a target every cell runs NUM_REPLICAS replicas.
+        def round_size(s, m):
+            done = results[m][s]['makespan']
+            if target_ci is None:
+                return 0 if done else NUM_REPLICAS
+            if len(done) >= max_replicas or converged([x for x in done if x != float('inf')], target_ci):
+                return 0
+            return min(ROUND if done else MIN_REPLICAS, max_replicas - len(done))
+
+        if engine == 'batch':
+            from batch_sim import run_scheduling_batch
+        progress = tqdm(desc="运行实验", unit="run")
+        while True:
+            rounds = []
+            for m in modes:
+                for si, s in enumerate(scenarios):
+                    k = round_size(s, m)
+                    if k:
+                        rounds.append((si, s, m, len(results[m][s]['makespan']), k))
+            if not rounds:
+                break
+            if engine == 'batch':
+                # All replicas of a round advance together in one vectorized call; the representative
+                # trajectory is still produced by a single seeded run_scheduling
+                for si, s, m, first, k in rounds:
+                    params, adaptive = mode_setup[m]
+                    with phase('batch_engine'):
+                        batch = run_scheduling_batch(params, k, s, adaptive, seed=[EXPERIMENT_SEED, si],
+                                                     first_replica=first)
+                    for key in ('makespan', 'num_conflicts', 'load_balance'):
+                        results[m][s][key].extend(batch[key].tolist())
+                    progress.update(k)
+                continue
+            # Baseline shares the static trajectory file name, so only static/adaptive persist one
+            tasks = [(s, m, mode_setup[m][0], mode_setup[m][1], replica_seed(si, r),
+                      m != 'baseline' and r == REPRESENTATIVE_REPLICA, output_format, profile_dir, cprofile)
+                     for si, s, m, first, k in rounds for r in range(first, first + k)]
+            with phase('experiments'):
+                # imap keeps submission order, so every cell's results stay in replica order
+                for scenario, mode, result in pool.imap(run_single_experiment, tasks):
+                    results[mode][scenario]['makespan'].append(result['makespan'])
+                    results[mode][scenario]['num_conflicts'].append(result['num_conflicts'])
+                    results[mode][scenario]['load_balance'].append(result['load_balance'])
+                    if 'profile' in result:
+                        run_reports.setdefault((scenario, mode), []).append(result['profile'])
+                    progress.update(1)
+            if profile_dir:
+                pstats_paths.extend(run_pstats_path(profile_dir, s, m, seed) for s, m, _, _, seed, *_ in tasks)
+        progress.close()
+
+        if engine == 'batch':
+            for si, s in enumerate(scenarios):
+                seed = replica_seed(si, REPRESENTATIVE_REPLICA)
+                for m in modes[1:]:
+                    params, adaptive = mode_setup[m]
+                    with phase('representative_runs'):
+                        _, _, result = run_single_experiment((s, m, params, adaptive, seed, True, output_format,
+                                                              profile_dir, cprofile))
+                    if 'profile' in result:
+                        run_reports.setdefault((s, m), []).append(result['profile'])
+                        pstats_paths.append(run_pstats_path(profile_dir, s, m, seed))
     
     # 计算统计数据
+    bound = lower_bound()['lower_bound']
     summary = {}
     for s in scenarios:
         summary[s] = {}
@@ -283,8 +566,18 @@ def run_validation_experiments():
                 'makespan_mean': statistics.mean(makespan_data) if makespan_data else 0,
                 'makespan_std': statistics.stdev(makespan_data) if len(makespan_data) > 1 else 0,
                 'conflicts_mean': statistics.mean(results[m][s]['num_conflicts']) if results[m][s]['num_conflicts'] else 0,
-                'load_balance_mean': statistics.mean(results[m][s]['load_balance']) if results[m][s]['load_balance'] else 0
+                'load_balance_mean': statistics.mean(results[m][s]['load_balance']) if results[m][s]['load_balance'] else 0,
+                'replicas': len(results[m][s]['makespan']),
+                'makespan_mean_ci': list(mean_ci(makespan_data)) if makespan_data else [0, 0],
+                'makespan_std_ci': list(std_ci(makespan_data)) if makespan_data else [0, 0]
             }
+            if s == 'none':
+                # Only nominal durations are comparable with the analytical bound
+                summary[s][m]['gap_mean'] = statistics.mean(makespan_data) / bound - 1 if makespan_data else 0
+            if m != 'baseline':
+                # Same seeds in every mode, so differences are taken replica by replica
+                summary[s][m]['vs_baseline'] = paired_difference(results[m][s]['makespan'],
+                                                                 results['baseline'][s]['makespan'])
     
     # 绘制四个参数的图表
     parameters = [
@@ -294,32 +587,68 @@ def run_validation_experiments():
         ('load_balance_mean', '负载均衡均值', '负载均衡均值', 'task_2_load_balance_mean.png')
     ]
     
-    for param_key, param_title, y_label, filename in parameters:
-        plt.figure(figsize=(10, 6))
-        x = range(len(scenarios))
-        width = 0.25
+    with phase('plots'):
+        plt = pyplot()
+        for param_key, param_title, y_label, filename in parameters:
+            plt.figure(figsize=(10, 6))
+            x = range(len(scenarios))
+            width = 0.25
         
-        for i, mode in enumerate(modes):
-            values = []
-            for scenario in scenarios:
-                value = summary[scenario][mode][param_key]
-                values.append(value if value else 0)
-            plt.bar([xi + width * i for xi in x], values, width, label=mode_labels[mode])
+            for i, mode in enumerate(modes):
+                values = []
+                for scenario in scenarios:
+                    value = summary[scenario][mode][param_key]
+                    values.append(value if value else 0)
+                plt.bar([xi + width * i for xi in x], values, width, label=mode_labels[mode])
         
-        plt.xlabel('场景')
-        plt.ylabel(y_label)
-        plt.title(param_title)
-        plt.xticks([xi + width for xi in x], [scenario_labels[s] for s in scenarios])
-        plt.legend()
-        plt.tight_layout()
-        plt.savefig(filename)
-        plt.close()
+            plt.xlabel('场景')
+            plt.ylabel(y_label)
+            plt.title(param_title)
+            plt.xticks([xi + width for xi in x], [scenario_labels[s] for s in scenarios])
+            plt.legend()
+            plt.tight_layout()
+            plt.savefig(filename)
+            plt.close()
+    
+    if driver is not None:
+        driver.stop()
+        report = {
+            'driver': driver.report(),
+            'runs': merge_reports([r for reports in run_reports.values() for r in reports], 'runs'),
+            'cells': {f'{s}/{m}': merge_reports(reports, f'{s}/{m}') for (s, m), reports in sorted(run_reports.items())}
+        }
+        with open(os.path.join(profile_dir, 'profile.json'), 'w') as f:
+            json.dump(report, f, indent=4)
+        if cprofile:
+            merge_pstats(pstats_paths, os.path.join(profile_dir, 'profile.pstats'))
     
     return summary
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Task 2 scheduling experiments')
+    parser.add_argument('--format', choices=sorted(FORMAT_EXTENSIONS), default='json',
+                        help='trajectory output format: compact JSON, NDJSON or binary columnar')
+    parser.add_argument('--engine', choices=['scalar', 'batch'], default='scalar',
+                        help='scalar: one run_scheduling per replica on a process pool; '
+                             'batch: all replicas of a cell vectorized with NumPy')
+    parser.add_argument('--tuner', choices=['sa', 'pt'], default='sa',
+                        help='sa: simulated annealing over the dispatch preferences; '
+                             'pt: parallel tempering over the dispatch preferences')
+    parser.add_argument('--profile', default=None, metavar='DIR',
+                        help='instrument every run and write per-phase timings and counters to DIR/profile.json')
+    parser.add_argument('--cprofile', action='store_true',
+                        help='with --profile, also keep a pstats file per run and merge them into DIR/profile.pstats')
+    parser.add_argument('--target-ci', type=float, default=TARGET_CI,
+                        help='run replicas per (scenario, mode) until the CIs of the makespan mean and std are '
+                             'within this fraction of the mean')
+    parser.add_argument('--max-replicas', type=int, default=MAX_REPLICAS, help='replica cap per (scenario, mode)')
+    parser.add_argument('--fixed-replicas', action='store_true',
+                        help=f'run exactly {NUM_REPLICAS} replicas per (scenario, mode) instead')
+    args = parser.parse_args()
     try:
-        summary = run_validation_experiments()
+        summary = run_validation_experiments(args.format, args.engine, args.tuner, args.profile, args.cprofile,
+                                             None if args.fixed_replicas else args.target_ci,
+                                             args.max_replicas)
         print(json.dumps(summary, indent=4))
     except Exception as e:
         logging.error(f"Error in main: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,49 @@
+import pytest
+
+import task1
+from analyze import TrajectoryStats, analyze, analyze_shard, columnar_shards, resolve_recipe, text_shards
+from trajectory import ColumnarSink, open_sink
+
+
+def write(tmp_path, fmt, num_wafers=12):
+    path = str(tmp_path / f'task1.{fmt}')
+    sink = ColumnarSink(path, chunk_rows=64) if fmt == 'columnar' else open_sink(path, fmt)
+    with sink:
+        task1.Task1Simulator(num_wafers=num_wafers, record=False).run(sink)
+    return path
+
+
+def sharded(path, fmt, num_shards, recipe):
+    transport = [u for u, t in zip(recipe.unit_names, recipe.unit_transport) if t]
+    shards = columnar_shards(path, num_shards) if fmt == 'columnar' else text_shards(path, fmt, num_shards)
+    assert len(shards) > 1
+    parts = [analyze_shard((path, fmt, shard, i == 0, transport)) for i, shard in enumerate(shards)]
+    stats = parts[0]
+    for part in parts[1:]:
+        stats.merge(part)
+    return stats.report(dict(zip(recipe.unit_names, recipe.unit_slots)))
+
+
+@pytest.mark.parametrize('fmt', ['json', 'ndjson', 'columnar'])
+def test_shard_merge_matches_single_pass(tmp_path, fmt):
+    recipe = resolve_recipe('task1')
+    path = write(tmp_path, fmt)
+    single = analyze(path, fmt, jobs=1, recipe=recipe)
+    sim = task1.Task1Simulator(num_wafers=12)
+    sim.run()
+    assert single['moves'] == len(sim.move_list)
+    assert single['wafers'] == 12
+    for num_shards in (2, 5):
+        assert sharded(path, fmt, num_shards, recipe) == single
+
+
+def test_parallel_analysis_matches_single_pass(tmp_path):
+    recipe = resolve_recipe('task1')
+    path = write(tmp_path, 'ndjson')
+    assert analyze(path, jobs=3, recipe=recipe) == analyze(path, jobs=1, recipe=recipe)
+
+
+def test_empty_trajectory(tmp_path):
+    path = str(tmp_path / 'empty.ndjson')
+    open_sink(path, 'ndjson').close()
+    assert analyze(path, jobs=4) == TrajectoryStats([]).report()
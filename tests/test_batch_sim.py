@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+import batch_sim
+import task2
+from stochastic import SCENARIO_MODELS
+
+
+@pytest.mark.parametrize('num_wafers', [1, 20, task2.NUM_WAFERS])
+def test_batch_matches_scalar_without_disruptions(num_wafers):
+    # Without sampled durations or faults, adaptive dispatch is deterministic: every replica
+    # of the lockstep engine must reproduce the scalar engine's schedule
+    scalar = task2.run_scheduling(task2.default_params, [], task2.step_units, task2.step_durations, 'none', True,
+                                  metrics_only=True, seed=0, num_wafers=num_wafers)
+    batch = batch_sim.run_scheduling_batch(task2.default_params, 3, 'none', True, seed=0, num_wafers=num_wafers)
+    np.testing.assert_array_equal(batch['makespan'], scalar['makespan'])
+    np.testing.assert_array_equal(batch['load_balance'], scalar['load_balance'])
+
+
+def test_batch_replicas_are_independent_of_batch_size():
+    # Replica r draws from the r-th child of the seed, however many replicas a call runs
+    whole = batch_sim.run_scheduling_batch(task2.default_params, 4, 'fault', True, seed=7, num_wafers=20)
+    tail = batch_sim.run_scheduling_batch(task2.default_params, 2, 'fault', True, seed=7, num_wafers=20,
+                                          first_replica=2)
+    np.testing.assert_array_equal(whole['makespan'][2:], tail['makespan'])
+
+
+@pytest.mark.parametrize('scenario', ['fault', 'time_variation', 'mixed'])
+def test_batch_matches_scalar_on_the_same_samples(scenario):
+    # Replica 0 of the batch and a scalar run fed the same pre-sampled durations and faults
+    stream = batch_sim._streams(5)[0].spawn(1)[0]
+    samples = SCENARIO_MODELS[scenario].sample(batch_sim.RECIPE, task2.NUM_WAFERS, stream)
+
+    class Fixed:
+        def sample(self, recipe, num_wafers, seed):
+            return samples
+
+    scalar = task2.run_scheduling(task2.default_params, [], task2.step_units, task2.step_durations, scenario, True,
+                                  metrics_only=True, seed=0, stochastic=Fixed())
+    batch = batch_sim.run_scheduling_batch(task2.default_params, 1, scenario, True, seed=5)
+    assert batch['makespan'][0] == scalar['makespan']
+    assert batch['load_balance'][0] == scalar['load_balance']
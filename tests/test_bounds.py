@@ -0,0 +1,37 @@
+import math
+
+import pytest
+
+import task1
+import task2
+from bounds import makespan_lower_bound, optimality_gap
+
+
+@pytest.mark.parametrize('num_wafers', [1, 10, task1.NUM_WAFERS, 300])
+@pytest.mark.parametrize('release_interval', [0, 500])
+def test_task1_bound_is_below_the_makespan(num_wafers, release_interval):
+    sim = task1.Task1Simulator(num_wafers=num_wafers, record=False, release_interval=release_interval)
+    makespan = sim.run()
+    bound = task1.lower_bound(sim)['lower_bound']
+    assert 0 < bound <= makespan
+
+
+@pytest.mark.parametrize('num_wafers', [1, 10, task2.NUM_WAFERS, 300])
+@pytest.mark.parametrize('adaptive', [False, True])
+def test_task2_bound_is_below_the_makespan(num_wafers, adaptive):
+    result = task2.run_scheduling(task2.default_params, [], task2.step_units, task2.step_durations, 'none',
+                                  adaptive, metrics_only=True, seed=0, num_wafers=num_wafers)
+    assert 0 < result['lower_bound'] <= result['makespan']
+    assert result['gap'] == pytest.approx(result['makespan'] / result['lower_bound'] - 1)
+
+
+def test_single_wafer_bound_is_the_critical_path():
+    bound = makespan_lower_bound(task2.RECIPE, 1, transport_overlap=task2.TM_OVERLAP)
+    assert bound['lower_bound'] == bound['critical_path']
+
+
+def test_optimality_gap():
+    assert optimality_gap(110, 100) == pytest.approx(0.1)
+    assert optimality_gap(100, 100) == 0
+    assert math.isinf(optimality_gap(math.inf, 100))
+    assert math.isinf(optimality_gap(100, 0))
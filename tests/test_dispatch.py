@@ -0,0 +1,43 @@
+import random
+
+import pytest
+
+from dispatch import SlotIndex
+
+
+def linear_select(candidates, available, load, module_pref, slot_pref, now):
+    # The scan SlotIndex replaced: earliest effective start, then best load score, then candidate order
+    def key(i):
+        unit, slot = candidates[i]
+        score = module_pref[unit] * (1 - load[unit] / 10) + slot_pref[unit, slot]
+        return max(available[unit, slot], now), -score, i
+    return candidates[min(range(len(candidates)), key=key)]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_slot_index_matches_linear_scan(seed):
+    rng = random.Random(seed)
+    units = [f'PM{i}' for i in range(6)]
+    unit_slots = {u: {s: rng.choice([0, 5, 10]) for s in range(1, rng.randint(1, 3) + 1)} for u in units}
+    step_units = {'A': units[:4], 'B': units[2:], 'C': units[5:]}
+    module_pref = {u: rng.choice([0.2, 0.5, 0.8]) for u in units}
+    slot_pref = {(u, s): rng.choice([0.1, 0.5]) for u in units for s in unit_slots[u]}
+    index = SlotIndex(step_units, unit_slots, module_pref, slot_pref)
+    available = {(u, s): t for u in units for s, t in unit_slots[u].items()}
+    load = dict.fromkeys(units, 0)
+    candidates = {step: [(u, s) for u in members for s in unit_slots[u]] for step, members in step_units.items()}
+
+    now = 0
+    for _ in range(2000):
+        # Coarse times and loads so that ties on effective start and score are common
+        now += rng.choice([0, 0, 5, 10])
+        step = rng.choice(list(step_units))
+        unit, slot = index.select(step, now)
+        assert (unit, slot) == linear_select(candidates[step], available, load, module_pref, slot_pref, now)
+        available[unit, slot] = max(now, available[unit, slot]) + rng.choice([5, 10, 70])
+        load[unit] = rng.randint(0, 4)
+        index.update(unit, slot, available[unit, slot], load[unit])
+        if rng.random() < 0.3:
+            other = rng.choice(units)
+            load[other] = rng.randint(0, 4)
+            index.update(other, load=load[other])
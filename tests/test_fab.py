@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from fab import _run_lot, random_fab, simulate_fab
+from trajectory import ListSink
+
+
+@pytest.fixture(scope='module')
+def fab():
+    tools, lots = random_fab({'task1': 1, 'task2': 2}, num_lots=6, lot_size=4, shift=3600, seed=5)
+    return tools, lots, simulate_fab(tools, lots)
+
+
+def lot_rows(result, lot):
+    rows = result.moves[result.moves['lot'] == lot]
+    return rows[np.argsort(rows['move_id'], kind='stable')]
+
+
+def test_lot_moves_match_a_direct_run(fab):
+    tools, lots, result = fab
+    assert len(result.lot_metrics) == len(lots)
+    for m in result.lot_metrics:
+        i = next(k for k, lot in enumerate(lots) if lot['name'] == m['lot'])
+        t = next(k for k, tool in enumerate(tools) if tool['name'] == m['tool'])
+        sink = ListSink()
+        makespan, _ = _run_lot(lots[i], sink)
+        assert m['end'] == m['start'] + makespan and m['moves'] == len(sink.moves)
+        rows = lot_rows(result, i)
+        assert set(rows['tool'].tolist()) == {t}
+        steps, modules = result.steps[t], result.modules[t]
+        got = [(r['start'], r['end'], int(r['move_id']), int(r['move_type']), modules[r['module']],
+                f"{r['wafer']}.{steps[r['step']]}" if r['wafer'] else steps[r['step']], int(r['slot'])) for r in rows]
+        expected = [(x['StartTime'] + m['start'], x['EndTime'] + m['start'], x['MoveID'], x['MoveType'],
+                     x['ModuleName'], x['MatID'], x['SlotID']) for x in sink.moves]
+        assert got == expected
+
+
+def test_lots_on_a_tool_run_back_to_back_after_release(fab):
+    tools, lots, result = fab
+    by_tool = {}
+    for m in result.lot_metrics:
+        release = next(lot['release'] for lot in lots if lot['name'] == m['lot'])
+        assert m['start'] >= release and m['wait'] == m['start'] - release
+        by_tool.setdefault(m['tool'], []).append((m['start'], m['end']))
+    for spans in by_tool.values():
+        spans.sort()
+        assert all(end <= start for (_, end), (start, _) in zip(spans, spans[1:]))
+    assert result.makespan == max(m['end'] for m in result.lot_metrics)
+    assert np.all(np.diff(result.moves['start']) >= 0)
+
+
+def test_parallel_run_fills_the_same_buffer(fab):
+    tools, lots, result = fab
+    parallel = simulate_fab(tools, lots, jobs=2)
+    assert np.array_equal(parallel.moves, result.moves)
+    assert parallel.modules == result.modules and parallel.steps == result.steps
+
+
+def test_merged_trajectory(fab):
+    _, _, result = fab
+    sink = ListSink()
+    assert result.write(sink) == len(result.moves) == len(sink.moves)
+    assert [x['MoveID'] for x in sink.moves] == list(range(len(sink.moves)))
+    assert all(x['MatID'].startswith('L') and '/' in x['MatID'] for x in sink.moves)
+
+
+def test_unknown_or_unserved_recipe():
+    tools, lots = random_fab({'task2': 1}, num_lots=1, lot_size=2)
+    with pytest.raises(ValueError):
+        simulate_fab(tools + [{'name': 'X', 'recipe': 'task3'}], lots)
+    with pytest.raises(ValueError):
+        simulate_fab(tools, [dict(lots[0], recipe='task1')])
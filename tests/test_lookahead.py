@@ -0,0 +1,37 @@
+import pytest
+
+import task2
+from lookahead import Lookahead
+from validator import Validator
+
+
+def run(num_wafers, scenario='none', lookahead=None, validator=None):
+    return task2.run_scheduling(task2.default_params, [], task2.step_units, task2.step_durations, scenario, True,
+                                metrics_only=True, seed=0, num_wafers=num_wafers, lookahead=lookahead,
+                                validator=validator)
+
+
+@pytest.mark.parametrize('num_wafers', [10, 30])
+def test_width_one_is_greedy_dispatch(num_wafers):
+    greedy = run(num_wafers)
+    lookahead = Lookahead(width=1)
+    result = run(num_wafers, lookahead=lookahead)
+    assert (result['makespan'], result['load_balance']) == (greedy['makespan'], greedy['load_balance'])
+    assert lookahead.report()['changed'] == 0
+
+
+@pytest.mark.parametrize('num_wafers', [5, 20, 30])
+@pytest.mark.parametrize('width', [2, 3])
+def test_full_rollout_is_never_worse_than_greedy(num_wafers, width):
+    v = Validator.from_recipe(task2.RECIPE, check_jit=False)
+    result = run(num_wafers, lookahead=Lookahead(depth=None, width=width), validator=v)
+    assert result['makespan'] <= run(num_wafers)['makespan']
+    assert v.report()['violations'] == 0
+
+
+def test_time_budget_still_evaluates_the_greedy_choice():
+    lookahead = Lookahead(time_budget=0)
+    result = run(10, lookahead=lookahead)
+    assert result['makespan'] == run(10)['makespan']
+    report = lookahead.report()
+    assert report['rollouts'] == report['decisions'] and report['budget_hits'] == report['decisions']
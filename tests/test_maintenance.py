@@ -0,0 +1,55 @@
+import pytest
+
+import task1
+from maintenance import POLICIES, OpportunisticPolicy, StaggeredPolicy, evaluate_policies
+from validator import Validator
+
+NUM_WAFERS = 75
+
+
+def run(policy, **kwargs):
+    sim = task1.Task1Simulator(num_wafers=NUM_WAFERS, maintenance=policy, **kwargs)
+    return sim, sim.run()
+
+
+def test_reactive_policy_matches_the_inline_rule():
+    plain, makespan = run(None)
+    reactive, reactive_makespan = run(POLICIES['reactive']())
+    assert reactive_makespan == makespan
+    assert list(reactive.move_list) == list(plain.move_list)
+    assert reactive.cleaning_log == plain.cleaning_log
+
+
+@pytest.mark.parametrize('name', sorted(POLICIES))
+def test_every_policy_produces_a_valid_schedule(name):
+    v = Validator.from_recipe(task1.RECIPE, check_jit=False)
+    sim, _ = run(POLICIES[name](), validator=v)
+    assert v.report()['violations'] == 0
+    assert any(c['reason'] == 'wafer_count' for c in sim.cleaning_log)
+
+
+def test_opportunistic_cleans_early_in_idle_windows():
+    policy = OpportunisticPolicy()
+    sim, _ = run(policy)
+    early = [c for c in sim.cleaning_log if c.get('opportunistic')]
+    assert early
+    assert all(policy.min_count <= c['wafer_count'] < sim.wafer_count_threshold for c in early)
+
+
+def test_staggered_offsets_the_first_count_cleaning():
+    sim, _ = run(StaggeredPolicy())
+    threshold = sim.wafer_count_threshold
+    first = {}
+    for c in sim.cleaning_log:
+        if c['reason'] == 'wafer_count':
+            first.setdefault(c['unit'], c['wafer_count'])
+    cleaning = [u for u, c in enumerate(task1.RECIPE.unit_cleaning) if c]
+    assert [first[u] for u in cleaning] == [threshold - k * threshold // len(cleaning) for k in range(len(cleaning))]
+
+
+def test_evaluate_policies_reports_each_policy():
+    results = evaluate_policies(num_wafers=NUM_WAFERS)
+    assert [r['policy'] for r in results] == list(POLICIES)
+    for r in results:
+        assert r['makespan'] == run(POLICIES[r['policy']]())[1]
+        assert r['throughput'] == pytest.approx(NUM_WAFERS / r['makespan'] * 3600)
@@ -0,0 +1,52 @@
+import numpy as np
+
+import task1
+from movestore import END, START, MoveStore, MoveTemplate
+from trajectory import ListSink
+
+TEMPLATE = MoveTemplate([
+    ((START, 0), (START, 1), 4),
+    ((START, 1), (END, -1), 9),
+    ((END, -1), (END, 0), 5),
+])
+
+
+def test_template_times_are_offsets_from_the_step_bounds():
+    assert TEMPLATE.size == 3
+    assert list(TEMPLATE.move_types) == [4, 9, 5]
+    assert TEMPLATE.times(10, 40.5) == ([10, 11, 39.5], [11, 39.5, 40.5])
+
+
+def test_add_step_matches_the_generic_expansion():
+    store, reference = MoveStore(), ListSink()
+    for sink in (store, reference):
+        sink.add_step(TEMPLATE, 0, 30, 0, 'PM7', '1.20', 1)
+        sink.add(30, 31, 3, 2, 'TM2', '1.21', 2)
+        sink.add_step(TEMPLATE, 31, 101, 4, 'PM7', 'CLEAN.PM7', 1)
+    # ListSink expands a template move by move (MoveSink.add_step); MoveStore appends whole columns
+    assert len(store) == 7
+    assert list(store) == reference.moves
+    assert [store[i] for i in range(len(store))] == reference.moves
+    assert store.module_names == ['PM7', 'TM2'] and store.mat_ids == ['1.20', '1.21', 'CLEAN.PM7']
+
+
+def test_write_to_and_numpy_views():
+    store = MoveStore()
+    store.add_step(TEMPLATE, 5, 20, 7, 'LLA', '2.3', 2)
+    copy = ListSink()
+    store.write_to(copy)
+    assert copy.moves == list(store)
+    columns = store.as_numpy()
+    np.testing.assert_array_equal(columns['StartTime'], [5, 6, 19])
+    np.testing.assert_array_equal(columns['MoveID'], [7, 8, 9])
+    np.testing.assert_array_equal(columns['SlotID'], [2, 2, 2])
+    assert store.nbytes() == 3 * (8 + 8 + 8 + 1 + 1 + 2 + 4)
+
+
+def test_task1_templates_expand_every_step():
+    sim = task1.Task1Simulator(num_wafers=2)
+    sim.run()
+    moves = list(sim.move_list)
+    assert [m['MoveID'] for m in moves] == list(range(len(moves)))
+    assert len(moves) == sim.move_id_counter
+    assert all(m['StartTime'] <= m['EndTime'] for m in moves)
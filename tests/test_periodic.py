@@ -0,0 +1,36 @@
+import pytest
+
+import task1
+from periodic import PROBE_WAFERS, bottleneck_interval, cross_check, find_steady_state
+from trajectory import ListSink
+
+
+@pytest.fixture(scope='module')
+def steady():
+    return find_steady_state()
+
+
+def test_release_interval_is_not_below_the_bottleneck(steady):
+    assert steady.release_interval >= bottleneck_interval()
+    assert steady.period == steady.period_wafers * steady.release_interval
+
+
+def test_generated_schedule_matches_the_event_engine(steady):
+    sizes = (PROBE_WAFERS // 2, PROBE_WAFERS + 1, PROBE_WAFERS + steady.period_wafers + 3)
+    assert cross_check(steady, sizes) == {n: 0 for n in sizes}
+
+
+def test_written_trajectory_matches_the_event_engine(steady):
+    n = PROBE_WAFERS + steady.period_wafers + 3
+    schedule = steady.generate(n)
+    sim = task1.Task1Simulator(num_wafers=n, release_interval=steady.release_interval)
+    assert schedule.makespan == sim.run()
+    counts = {}
+    for c in sim.cleaning_log:
+        counts[c['reason']] = counts.get(c['reason'], 0) + 1
+    assert schedule.cleaning_count() == counts
+    sink = ListSink()
+    schedule.write(sink)
+    # MoveIDs are numbered in write order rather than event order; everything else must match
+    key = lambda m: (m['StartTime'], m['EndTime'], m['ModuleName'], m['MatID'], m['MoveType'])
+    assert sorted(map(key, sink.moves)) == sorted(map(key, sim.move_list))
@@ -0,0 +1,112 @@
+import json
+import os
+import pickle
+
+import pytest
+
+import recipe
+import task2
+from recipe import Recipe, load_recipe
+
+SPEC = {
+    'name': 'mini',
+    'units': {'LP': {'slots': 1, 'duration': 5}, 'TM': {'slots': 2, 'duration': 6.5, 'transport': True},
+              'PMA': {'slots': 1, 'duration': 70, 'cleaning': True}, 'PMB': {'slots': 1, 'duration': 70}},
+    'steps': {'LP': {'units': ['LP']}, 'TM': {'units': ['TM']}, 'PM': {'units': ['PMA', 'PMB']}},
+    'route': ['LP', {'steps': ['TM', 'PM'], 'repeat': 2}, 'TM', 'LP'],
+}
+
+TOML = '''
+name = "mini"
+route = ["LP", {steps = ["TM", "PM"], repeat = 2}, "TM", "LP"]
+
+[units.LP]
+slots = 1
+duration = 5
+
+[units.TM]
+slots = 2
+duration = 6.5
+transport = true
+
+[units.PMA]
+slots = 1
+duration = 70
+cleaning = true
+
+[units.PMB]
+slots = 1
+duration = 70
+
+[steps.LP]
+units = ["LP"]
+
+[steps.TM]
+units = ["TM"]
+
+[steps.PM]
+units = ["PMA", "PMB"]
+'''
+
+
+def fields(compiled):
+    # repr, because the NaN durations of unused columns never compare equal
+    return {name: repr(getattr(compiled, name)) for name in Recipe.__slots__ if name != 'source_hash'}
+
+
+@pytest.fixture(autouse=True)
+def fresh_memo(monkeypatch):
+    # load_recipe memoizes by digest in-process; each test starts without it
+    monkeypatch.setattr(recipe, '_loaded', {})
+
+
+def test_json_and_toml_compile_to_the_same_tables(tmp_path):
+    json_path = tmp_path / 'mini.json'
+    json_path.write_text(json.dumps(SPEC))
+    toml_path = tmp_path / 'mini.toml'
+    toml_path.write_text(TOML)
+    from_json = load_recipe(str(json_path), cache_dir=str(tmp_path / 'cache'))
+    from_toml = load_recipe(str(toml_path), cache_dir=str(tmp_path / 'cache'))
+    assert fields(from_json) == fields(from_toml)
+    assert from_json.unit_duration_list() == [5, 6.5, 70, 70]
+    assert [from_json.step_names[s] for s in from_json.route] == ['LP', 'TM', 'PM', 'TM', 'PM', 'TM', 'LP']
+    assert from_json.step_mask[from_json.step_index['PM']] == 0b1100
+
+
+def test_compiled_recipe_round_trips_through_the_pickle_cache(tmp_path):
+    path = tmp_path / 'mini.json'
+    path.write_text(json.dumps(SPEC))
+    cache_dir = tmp_path / 'cache'
+    compiled = load_recipe(str(path), cache_dir=str(cache_dir))
+    [cache_file] = os.listdir(cache_dir)
+    assert cache_file == f'{compiled.source_hash}.pickle'
+
+    recipe._loaded.clear()
+    cached = load_recipe(str(path), cache_dir=str(cache_dir))
+    assert cached is not compiled and fields(cached) == fields(compiled)
+    with open(cache_dir / cache_file, 'rb') as f:
+        assert fields(pickle.load(f)) == fields(compiled)
+
+    # Editing the recipe changes its digest, so the stale compiled form is not reused
+    path.write_text(json.dumps({**SPEC, 'route': ['LP', 'TM', 'LP']}))
+    edited = load_recipe(str(path), cache_dir=str(cache_dir))
+    assert list(edited.route) == [0, 1, 0]
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_corrupt_cache_file_is_recompiled(tmp_path):
+    path = tmp_path / 'mini.json'
+    path.write_text(json.dumps(SPEC))
+    cache_dir = tmp_path / 'cache'
+    compiled = load_recipe(str(path), cache_dir=str(cache_dir))
+    (cache_dir / f'{compiled.source_hash}.pickle').write_bytes(b'not a pickle')
+    recipe._loaded.clear()
+    assert fields(load_recipe(str(path), cache_dir=str(cache_dir))) == fields(compiled)
+
+
+def test_default_task2_recipe_matches_module_tables():
+    compiled = load_recipe(recipe.default_recipe_path('task2'))
+    units = compiled.unit_names
+    assert {name: [units[u] for u in candidates]
+            for name, candidates in zip(compiled.step_names, compiled.step_candidates)} == task2.step_units
+    assert dict(zip(units, compiled.unit_duration_list())) == task2.step_durations
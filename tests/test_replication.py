@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+from replication import MIN_REPLICAS, chi2_quantile, converged, mean_ci, paired_difference, replica_seed, std_ci, t_quantile
+
+
+@pytest.mark.parametrize('df, expected', [(5, 2.571), (9, 2.262), (30, 2.042)])
+def test_t_quantile(df, expected):
+    assert t_quantile(0.975, df) == pytest.approx(expected, rel=5e-3)
+
+
+@pytest.mark.parametrize('p, df, expected', [(0.025, 9, 2.700), (0.975, 9, 19.023), (0.975, 50, 71.420)])
+def test_chi2_quantile(p, df, expected):
+    assert chi2_quantile(p, df) == pytest.approx(expected, rel=1e-2)
+
+
+def test_converged_needs_min_replicas():
+    assert not converged([100.0] * (MIN_REPLICAS - 1))
+    assert converged([100.0] * MIN_REPLICAS)
+
+
+def test_converged_tracks_relative_spread():
+    rng = random.Random(0)
+    tight = [16000 + rng.gauss(0, 50) for _ in range(MIN_REPLICAS)]
+    loose = [16000 + rng.gauss(0, 2000) for _ in range(MIN_REPLICAS)]
+    assert converged(tight)
+    assert not converged(loose)
+    # The half-widths shrink with more replicas until the target is met
+    assert converged(loose + [16000 + rng.gauss(0, 2000) for _ in range(4000)], target=0.02)
+
+
+def test_intervals_contain_the_estimates():
+    values = [1.0, 2.0, 4.0, 3.0, 5.0]
+    low, high = mean_ci(values)
+    assert low < 3.0 < high
+    low, high = std_ci(values)
+    assert low < 1.58 < high
+    assert std_ci([1.0]) == (0, float('inf'))
+
+
+def test_paired_difference_skips_failed_replicas():
+    diff = paired_difference([10.0, float('inf'), 12.0], [9.0, 8.0, 10.0, 7.0])
+    assert diff['replicas'] == 2 and diff['mean_diff'] == 1.5
+
+
+def test_replica_seeds_are_distinct_and_stable():
+    seeds = {replica_seed(s, r) for s in range(4) for r in range(50)}
+    assert len(seeds) == 200
+    assert replica_seed(1, 2) == replica_seed(1, 2)
@@ -0,0 +1,63 @@
+import gzip
+import json
+
+import pytest
+
+import task1
+from report import EventLog, Reporter
+
+NUM_WAFERS = 25
+
+
+def run(reporter, release_interval=0):
+    sim = task1.Task1Simulator(num_wafers=NUM_WAFERS, reporter=reporter, release_interval=release_interval)
+    return sim, sim.run()
+
+
+@pytest.mark.parametrize('release_interval', [0, 200])
+def test_summary_counts_match_the_simulator_logs(release_interval):
+    reporter = Reporter()
+    sim, makespan = run(reporter, release_interval)
+    summary = reporter.summary()
+    assert summary['makespan'] == makespan
+    delays = summary['delays'].values()
+    assert sum(d['count'] for d in delays) == len(sim.conflict_log)
+    assert sum(d['total'] for d in delays) == pytest.approx(sum(c['delay'] for c in sim.conflict_log))
+    assert all(sum(d['histogram']) == d['count'] for d in delays)
+    counts = {}
+    for c in sim.cleaning_log:
+        counts[c['reason']] = counts.get(c['reason'], 0) + 1
+    assert {reason: c['count'] for reason, c in summary['cleanings'].items()} == counts
+    cycle = sorted(path[-1][2] - i * release_interval for i, path in enumerate(sim.wafer_paths))
+    assert summary['cycle_time']['wafers'] == NUM_WAFERS
+    assert (summary['cycle_time']['min'], summary['cycle_time']['max']) == (cycle[0], cycle[-1])
+    assert summary['events_written'] == 0
+
+
+@pytest.mark.parametrize('level,kinds', [('cleaning', {'cleaning'}), ('conflict', {'cleaning', 'conflict'}),
+                                         ('step', {'cleaning', 'conflict', 'step'})])
+def test_event_log_writes_events_up_to_its_level(tmp_path, level, kinds):
+    path = str(tmp_path / 'events.jsonl.gz')
+    with EventLog(path, level, buffer_events=7) as events:
+        reporter = Reporter(events)
+        sim, _ = run(reporter)
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert reporter.summary()['events_written'] == len(records)
+    by_kind = {}
+    for r in records:
+        by_kind[r['event']] = by_kind.get(r['event'], 0) + 1
+    assert set(by_kind) == kinds
+    assert by_kind['cleaning'] == len(sim.cleaning_log)
+    if 'conflict' in kinds:
+        assert by_kind['conflict'] == len(sim.conflict_log)
+    if 'step' in kinds:
+        assert by_kind['step'] == sum(len(path) for path in sim.wafer_paths)
+
+
+def test_event_log_off_opens_nothing(tmp_path):
+    path = tmp_path / 'events.jsonl'
+    log = EventLog(str(path), 'off')
+    assert not log.enabled('cleaning') and log.f is None
+    log.close()
+    assert not path.exists()
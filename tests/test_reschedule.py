@@ -0,0 +1,47 @@
+import pytest
+
+from reschedule import Replanner, check_against_engine, random_events
+
+NUM_WAFERS = 30
+NO_CHECKPOINTS = 10 ** 9  # every apply() then replays the lot from t=0
+
+
+@pytest.mark.parametrize('adaptive', [True, False])
+def test_plan_matches_the_engine(adaptive):
+    assert check_against_engine(adaptive=adaptive, seed=3)
+
+
+@pytest.mark.parametrize('kind', ['fault', 'duration', 'mixed'])
+@pytest.mark.parametrize('adaptive', [True, False])
+def test_replan_from_checkpoints_matches_a_straight_run(kind, adaptive):
+    replanner = Replanner(adaptive=adaptive, seed=1, num_wafers=NUM_WAFERS, checkpoint_every=20)
+    straight = Replanner(adaptive=adaptive, seed=1, num_wafers=NUM_WAFERS, checkpoint_every=NO_CHECKPOINTS)
+    replanner.plan()
+    straight.plan()
+    replayed = 0
+    for event in random_events(replanner, 8, kind, seed=2):
+        r = replanner.apply(event)
+        straight.apply(event)
+        assert replanner.moves == straight.moves
+        assert r['makespan'] == replanner.makespan == straight.makespan
+        replayed += r['replayed_events']
+    assert not straight.checkpoints
+    assert replayed < 8 * len(straight.moves)
+
+
+def test_fault_delays_moves_out_of_the_window():
+    replanner = Replanner(num_wafers=NUM_WAFERS)
+    replanner.plan()
+    _, _, _, unit, slot, start, end = replanner.moves[len(replanner.moves) // 2]
+    name = replanner.recipe.unit_names[unit]
+    r = replanner.apply({'kind': 'fault', 'unit': name, 'slot': slot + 1, 'time': start, 'repair': 100})
+    assert r['changed'] and r['makespan'] >= r['changed'][0]['new']['StartTime']
+    for _, _, _, u, s, t0, t1 in replanner.moves:
+        if (u, s) == (unit, slot):
+            assert t1 <= start or t0 >= start + 100
+
+
+def test_unknown_event_kind():
+    replanner = Replanner(num_wafers=5)
+    with pytest.raises(ValueError):
+        replanner.apply({'kind': 'strike', 'unit': 'PM7', 'time': 0})
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from service import RESULT_FILE, ResultCache, _tree_size
+
+
+def put(cache, key, payload_bytes):
+    directory = cache.staging(key)
+    with open(os.path.join(directory, 'trajectory.mcol'), 'wb') as f:
+        f.write(b'x' * payload_bytes)
+    cache.put(key, directory, {'metrics': {'makespan': 1}})
+
+
+def on_disk(cache):
+    return sum(_tree_size(os.path.join(cache.root, key)) for key in cache.index)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path), 3500)
+
+
+def test_size_accounting_matches_disk(cache):
+    for key in 'abc':
+        put(cache, key, 1000)
+    assert list(cache.index) == ['a', 'b', 'c']
+    assert cache.size == on_disk(cache)
+    with open(cache.path('b', 'chart.png'), 'wb') as f:
+        f.write(b'y' * 10)
+    cache.add_file('b', 'chart.png')
+    assert cache.size == on_disk(cache)
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    for key in 'abc':
+        put(cache, key, 1000)
+    assert cache.get('a') == {'metrics': {'makespan': 1}}
+    put(cache, 'd', 1000)
+    assert list(cache.index) == ['c', 'a', 'd']
+    assert not os.path.exists(os.path.join(cache.root, 'b'))
+    assert cache.size == on_disk(cache) <= cache.max_bytes
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 0, 1)
+    assert cache.get('b') is None and cache.misses == 1
+
+
+def test_entry_larger_than_the_cache_is_kept_alone(cache):
+    put(cache, 'a', 1000)
+    put(cache, 'big', 5000)
+    assert list(cache.index) == ['big']
+
+
+def test_pinned_entries_are_not_evicted(cache):
+    for key in 'abc':
+        put(cache, key, 1000)
+    cache.pin('a')
+    put(cache, 'd', 1000)
+    assert list(cache.index) == ['a', 'c', 'd']
+    cache.unpin('a')
+    assert cache.pinned == {}
+
+
+def test_index_and_order_survive_a_restart(cache, tmp_path):
+    for key in 'abc':
+        put(cache, key, 1000)
+    os.utime(cache.path('a', RESULT_FILE), (2e9, 2e9))
+    os.makedirs(os.path.join(cache.staging_root, 'orphan'))
+    reopened = ResultCache(str(tmp_path), cache.max_bytes)
+    assert list(reopened.index) == ['b', 'c', 'a']
+    assert reopened.size == cache.size
+    assert os.listdir(reopened.staging_root) == []
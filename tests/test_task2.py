@@ -0,0 +1,28 @@
+import pytest
+
+import task2
+from validator import Validator
+
+
+def run(scenario, adaptive, seed, **kwargs):
+    return task2.run_scheduling(task2.default_params, [], task2.step_units, task2.step_durations, scenario,
+                                adaptive, metrics_only=True, seed=seed, **kwargs)
+
+
+@pytest.mark.parametrize('scenario', ['fault', 'mixed'])
+@pytest.mark.parametrize('adaptive', [False, True])
+@pytest.mark.parametrize('seed', range(3))
+def test_faults_never_double_book_a_slot(scenario, adaptive, seed):
+    # A fault takes its slot down after the steps already booked on it, never under them
+    validator = Validator.from_recipe(task2.RECIPE, check_jit=False)
+    result = run(scenario, adaptive, seed, validator=validator)
+    assert result['makespan'] > 0
+    assert validator.report()['by_kind'] == {}
+
+
+def test_fault_keeps_later_bookings():
+    slot_available = [[0, 0], [500, 0]]
+    task2.handle_disruption(1, 0, 200, 100, slot_available)
+    assert slot_available[1][0] == 500
+    task2.handle_disruption(1, 1, 200, 100, slot_available)
+    assert slot_available[1][1] == 300
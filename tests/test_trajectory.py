@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+import task1
+from trajectory import (COLUMNAR_MAGIC, ColumnarSink, ListSink, format_for_path, iter_columnar_chunks, open_sink,
+                        read_columnar)
+
+MOVES = [
+    (0, 1, 0, 4, 'PM7', '1.20', 1),
+    (0.1, 2.5, 1, 9, 'PM7', '1.20', 1),
+    (1e-3, 70.25, 2, 5, 'TM2', '12.CLEAN', 2),
+    (3, 4, 3, 10, '模块', 'CLEAN.PM8', 1),
+]
+
+
+def expected():
+    sink = ListSink()
+    for move in MOVES:
+        sink.add(*move)
+    return sink.moves
+
+
+def read(path, fmt):
+    if fmt == 'json':
+        with open(path) as f:
+            return json.load(f)['MoveList']
+    if fmt == 'ndjson':
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+    return list(read_columnar(path))
+
+
+@pytest.mark.parametrize('fmt', ['json', 'ndjson', 'columnar'])
+def test_sinks_round_trip(tmp_path, fmt):
+    path = str(tmp_path / f'moves.{fmt}')
+    with open_sink(path, fmt) as sink:
+        for move in MOVES:
+            sink.add(*move)
+    assert read(path, fmt) == expected()
+
+
+@pytest.mark.parametrize('fmt', ['json', 'ndjson', 'columnar'])
+def test_empty_trajectory(tmp_path, fmt):
+    path = str(tmp_path / f'empty.{fmt}')
+    open_sink(path, fmt).close()
+    assert read(path, fmt) == []
+
+
+def test_columnar_chunks_carry_their_own_string_tables(tmp_path):
+    path = str(tmp_path / 'moves.mcol')
+    with ColumnarSink(path, chunk_rows=3) as sink:
+        for move in MOVES * 2:
+            sink.add(*move)
+    with open(path, 'rb') as f:
+        assert f.read(len(COLUMNAR_MAGIC)) == COLUMNAR_MAGIC
+    chunks = list(iter_columnar_chunks(path))
+    assert [len(columns['MoveID']) for columns, _ in chunks] == [3, 3, 2]
+    assert list(read_columnar(path)) == expected() * 2
+
+
+def test_format_for_path():
+    assert format_for_path('a.json') == 'json'
+    assert format_for_path('a.ndjson') == format_for_path('a.jsonl') == 'ndjson'
+    assert format_for_path('a.mcol') == 'columnar'
+    assert format_for_path('a.txt') == 'json'
+    with pytest.raises(ValueError):
+        open_sink('a.json', 'csv')
+
+
+@pytest.mark.parametrize('fmt', ['json', 'ndjson', 'columnar'])
+def test_task1_streamed_trajectory_matches_the_in_memory_one(tmp_path, fmt):
+    sim = task1.Task1Simulator(num_wafers=3)
+    sim.run()
+    path = str(tmp_path / f'task1.{fmt}')
+    with open_sink(path, fmt) as sink:
+        task1.Task1Simulator(num_wafers=3, record=False).run(sink)
+    assert read(path, fmt) == list(sim.move_list)
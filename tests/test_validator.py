@@ -0,0 +1,72 @@
+import pytest
+
+import task1
+import task2
+from validator import ConstraintViolation, Validator
+
+# Units: 0 a one-slot process module, 1 a two-slot process module, 2 a transfer robot
+NAMES = ('PM', 'LL', 'TM')
+
+
+def validator(**kwargs):
+    return Validator(NAMES, (1, 2, 1), (False, False, True), **kwargs)
+
+
+def test_overlapping_booking_breaks_capacity():
+    v = validator()
+    v.step(1, 0, 0, 10)
+    v.step(2, 0, 10, 20)  # back to back is fine
+    v.step(3, 0, 15, 25)
+    report = v.report()
+    assert report['by_kind'] == {'capacity': 1}
+    assert report['records'][0]['occupants'] == [2] and report['records'][0]['unit'] == 'PM'
+
+
+def test_two_slot_unit_is_checked_per_slot():
+    v = validator()
+    v.step(1, 1, 0, 10, slot=1)
+    v.step(2, 1, 0, 10, slot=2)
+    assert v.report()['violations'] == 0
+    v.step(3, 1, 5, 8, slot=1)
+    assert v.report()['by_kind'] == {'slot_overlap': 1, 'capacity': 1}
+
+
+def test_dwell_and_transfer_limits():
+    v = validator()
+    v.step(1, 0, 0, 10)
+    v.step(1, 2, 26, 30)  # picked up 16 s after finishing: dwell > 15
+    v.step(1, 1, 30, 40, slot=1)
+    v.step(2, 1, 100, 105, slot=2)
+    v.step(2, 2, 105, 120)
+    v.step(2, 2, 120, 136)
+    v.step(2, 0, 136, 150)  # 31 s from pickup at 105 to placement at 136: transfer > 30
+    assert v.report()['by_kind'] == {'dwell': 1, 'transfer': 1}
+    dwell, transfer = v.report()['records']
+    assert dwell['wait'] == 16 and transfer['duration'] == 31
+
+
+def test_fail_fast_raises_on_the_first_violation():
+    v = validator(fail_fast=True)
+    v.step(1, 0, 0, 10)
+    with pytest.raises(ConstraintViolation) as e:
+        v.step(2, 0, 5, 15)
+    assert e.value.violation['kind'] == 'capacity'
+
+
+def test_occupants_range_and_point_queries():
+    v = validator()
+    v.step(1, 0, 0, 10)
+    v.occupy(0, 10, 40, 'clean')
+    assert [iv[2] for iv in v.occupants('PM', 5, 15)] == [1, 'clean']
+    assert [iv[2] for iv in v.occupants(0, 10)] == ['clean']
+    assert v.occupants('PM', 40) == []
+
+
+def test_engines_schedule_without_capacity_violations():
+    v = Validator.from_recipe(task1.RECIPE, check_jit=False)
+    task1.Task1Simulator(num_wafers=task1.NUM_WAFERS, record=False, validator=v).run()
+    assert v.report()['violations'] == 0
+    v = Validator.from_recipe(task2.RECIPE, check_jit=False)
+    task2.run_scheduling(task2.default_params, [], task2.step_units, task2.step_durations, 'none', True,
+                         metrics_only=True, seed=0, validator=v)
+    assert v.report()['violations'] == 0
@@ -0,0 +1,244 @@
+import json
+import struct
+import sys
+from array import array
+
+# 轨迹字段（与 MoveList 中每条记录的键一致）
+MOVE_FIELDS = ("StartTime", "EndTime", "MoveID", "MoveType", "ModuleName", "MatID", "SlotID")
+
+# 列式文件格式：
+#   文件头 MAGIC
+#   若干数据块，每块：
+#     块头 <IIQ>：行数 n、字符串表条目数 m、字符串表字节数
+#     定宽列（小端）：StartTime f64[n]、EndTime f64[n]、MoveID i64[n]、MoveType i32[n]、
+#                      ModuleName u32[n]、MatID u32[n]、SlotID i32[n]
+#     字符串表：m 个 <H 长度 + UTF-8 字节>，ModuleName/MatID 列存放的是块内索引
+# 每块自带字符串表，写入端只需缓存一个块，峰值内存与晶圆数无关。
+COLUMNAR_MAGIC = b'MOVECOL1'
+CHUNK_HEADER = struct.Struct('<IIQ')
+COLUMN_TYPECODES = (
+    ('StartTime', 'd'), ('EndTime', 'd'), ('MoveID', 'q'), ('MoveType', 'i'),
+    ('ModuleName', 'I'), ('MatID', 'I'), ('SlotID', 'i')
+)
+DEFAULT_CHUNK_ROWS = 65536
+
+FORMAT_EXTENSIONS = {'json': '.json', 'ndjson': '.ndjson', 'columnar': '.mcol'}
+
+_MOVE_JSON = '{"StartTime":%r,"EndTime":%r,"MoveID":%d,"MoveType":%d,"ModuleName":%s,"MatID":%s,"SlotID":%d}'
+
+
+class MoveSink:
+    # 轨迹输出接口：调度引擎逐条 add() 或按模板 add_step()，结束时 close()
+    __slots__ = ()
+
+    def add(self, start_time, end_time, move_id, move_type, module, mat_id, slot_id):
+        raise NotImplementedError
+
+    def add_step(self, template, start_time, end_time, move_id, module, mat_id, slot_id):
+        # template 为 movestore.MoveTemplate，一步展开为若干连续 MoveID 的动作
+        starts, ends = template.times(start_time, end_time)
+        for k, move_type in enumerate(template.move_types):
+            self.add(starts[k], ends[k], move_id + k, move_type, module, mat_id, slot_id)
+
+    def extend(self, moves):
+        for m in moves:
+            self.add(m["StartTime"], m["EndTime"], m["MoveID"], m["MoveType"],
+                     m["ModuleName"], m["MatID"], m["SlotID"])
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class ListSink(MoveSink):
+    # 内存中的字典列表，保持原有 move_list 行为
+    def __init__(self):
+        self.moves = []
+
+    def add(self, start_time, end_time, move_id, move_type, module, mat_id, slot_id):
+        self.moves.append({
+            "StartTime": start_time,
+            "EndTime": end_time,
+            "MoveID": move_id,
+            "MoveType": move_type,
+            "ModuleName": module,
+            "MatID": mat_id,
+            "SlotID": slot_id
+        })
+
+    def extend(self, moves):
+        self.moves.extend(moves)
+
+
+class _TextSink(MoveSink):
+    def __init__(self, path, buffering=1 << 20):
+        self.path = path
+        self.f = open(path, 'w', buffering=buffering)
+        self.count = 0
+        self._quoted = {}
+
+    def _quote(self, s):
+        # 模块名等短字符串反复出现，缓存其 JSON 表示
+        q = self._quoted.get(s)
+        if q is None:
+            q = json.dumps(s)
+            if len(self._quoted) < 4096:
+                self._quoted[s] = q
+        return q
+
+    def _line(self, start_time, end_time, move_id, move_type, module, mat_id, slot_id):
+        return _MOVE_JSON % (start_time, end_time, move_id, move_type,
+                             self._quote(module), json.dumps(mat_id), slot_id)
+
+
+class JsonSink(_TextSink):
+    # 紧凑 JSON，保持 {"MoveList": [...]} 结构，边生成边写
+    def __init__(self, path, buffering=1 << 20):
+        super().__init__(path, buffering)
+        self.f.write('{"MoveList":[')
+
+    def add(self, start_time, end_time, move_id, move_type, module, mat_id, slot_id):
+        line = self._line(start_time, end_time, move_id, move_type, module, mat_id, slot_id)
+        self.f.write(',' + line if self.count else line)
+        self.count += 1
+
+    def close(self):
+        if not self.f.closed:
+            self.f.write(']}')
+            self.f.close()
+
+
+class NdjsonSink(_TextSink):
+    # 每行一条动作记录
+    def add(self, start_time, end_time, move_id, move_type, module, mat_id, slot_id):
+        self.f.write(self._line(start_time, end_time, move_id, move_type, module, mat_id, slot_id) + '\n')
+        self.count += 1
+
+    def close(self):
+        if not self.f.closed:
+            self.f.close()
+
+
+class ColumnarSink(MoveSink):
+    # 二进制列式文件，按块缓冲后写出
+    def __init__(self, path, chunk_rows=DEFAULT_CHUNK_ROWS):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.f = open(path, 'wb')
+        self.f.write(COLUMNAR_MAGIC)
+        self.count = 0
+        self._new_chunk()
+
+    def _new_chunk(self):
+        self.columns = [array(tc) for _, tc in COLUMN_TYPECODES]
+        self.strings = {}
+
+    def _intern(self, s):
+        idx = self.strings.get(s)
+        if idx is None:
+            idx = self.strings[s] = len(self.strings)
+        return idx
+
+    def add(self, start_time, end_time, move_id, move_type, module, mat_id, slot_id):
+        c = self.columns
+        c[0].append(start_time)
+        c[1].append(end_time)
+        c[2].append(move_id)
+        c[3].append(move_type)
+        c[4].append(self._intern(module))
+        c[5].append(self._intern(mat_id))
+        c[6].append(slot_id)
+        self.count += 1
+        if len(c[0]) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        n = len(self.columns[0])
+        if not n:
+            return
+        table = bytearray()
+        for s in self.strings:
+            b = s.encode('utf-8')
+            table += struct.pack('<H', len(b)) + b
+        self.f.write(CHUNK_HEADER.pack(n, len(self.strings), len(table)))
+        for col in self.columns:
+            if sys.byteorder != 'little':
+                col.byteswap()
+            self.f.write(col.tobytes())
+        self.f.write(table)
+        self._new_chunk()
+
+    def close(self):
+        if not self.f.closed:
+            self.flush()
+            self.f.close()
+
+
+def iter_columnar_chunks(path):
+    # 逐块读取列式文件，返回 (列字典, 字符串表)
+    with open(path, 'rb') as f:
+        if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError(f"{path} 不是列式轨迹文件")
+        while True:
+            header = f.read(CHUNK_HEADER.size)
+            if not header:
+                return
+            n, m, table_size = CHUNK_HEADER.unpack(header)
+            columns = {}
+            for name, tc in COLUMN_TYPECODES:
+                col = array(tc)
+                col.frombytes(f.read(n * col.itemsize))
+                if sys.byteorder != 'little':
+                    col.byteswap()
+                columns[name] = col
+            table = f.read(table_size)
+            strings = []
+            pos = 0
+            for _ in range(m):
+                (length,) = struct.unpack_from('<H', table, pos)
+                pos += 2
+                strings.append(table[pos:pos + length].decode('utf-8'))
+                pos += length
+            yield columns, strings
+
+
+def read_columnar(path):
+    # 将列式文件还原为逐条的动作字典
+    for columns, strings in iter_columnar_chunks(path):
+        for row in zip(*(columns[name] for name, _ in COLUMN_TYPECODES)):
+            yield {
+                "StartTime": row[0],
+                "EndTime": row[1],
+                "MoveID": row[2],
+                "MoveType": row[3],
+                "ModuleName": strings[row[4]],
+                "MatID": strings[row[5]],
+                "SlotID": row[6]
+            }
+
+
+def format_for_path(path):
+    # 按扩展名推断格式，无法识别时视为 JSON
+    for name, ext in FORMAT_EXTENSIONS.items():
+        if path.endswith(ext) or (name == 'ndjson' and path.endswith('.jsonl')):
+            return name
+    return 'json'
+
+
+def open_sink(path, fmt=None):
+    # 按格式名或扩展名选择输出方式
+    if fmt is None:
+        fmt = format_for_path(path)
+    if fmt == 'json':
+        return JsonSink(path)
+    if fmt == 'ndjson':
+        return NdjsonSink(path)
+    if fmt == 'columnar':
+        return ColumnarSink(path)
+    raise ValueError(f"未知的轨迹格式: {fmt}")
@@ -0,0 +1,176 @@
+import argparse
+import copy
+import json
+import math
+import os
+import random
+import time
+from multiprocessing import Pool
+
+from task2 import EVAL_SEED, TUNING_SCENARIO, default_params, evaluate_candidates
+
+# Searchable dispatch parameters: (path into the params dict, lower bound, upper bound).
+# Only the preferences are searched: they are the only params a dispatcher reads, through the
+# load score module_pref * (1 - load / 10) + slot_pref of dispatch.SlotIndex and batch_sim.
+# w1/w2/w3, time_window, conflict_penalty and process_priority are read by neither engine, so
+# searching them would only spend moves on no-ops. The score only breaks ties between slots
+# with the same effective start, which nominal durations never produce, so the search runs on
+# a stochastic scenario by default (task2.TUNING_SCENARIO); random dispatch reads no params.
+PARAM_BOUNDS = (
+    [(('module_preference', unit), 0.0, 1.0) for unit in default_params['module_preference']] +
+    [(('slot_preference', unit, slot), 0.0, 1.0)
+     for unit, slots in default_params['slot_preference'].items() for slot in slots]
+)
+
+# Each worker process keeps its own evaluation cache across rounds
+_worker_cache = {}
+
+
+def params_to_vector(params):
+    vector = []
+    for path, _, _ in PARAM_BOUNDS:
+        value = params
+        for key in path:
+            value = value[key]
+        vector.append(float(value))
+    return vector
+
+
+def vector_to_params(vector):
+    params = copy.deepcopy(default_params)
+    for (path, _, _), value in zip(PARAM_BOUNDS, vector):
+        target = params
+        for key in path[:-1]:
+            target = target[key]
+        target[path[-1]] = value
+    return params
+
+
+def propose(vector, rng, step_scale):
+    # Gaussian move on a random subset of coordinates, clipped to the bounds
+    new = list(vector)
+    for i, (_, lo, hi) in enumerate(PARAM_BOUNDS):
+        if rng.random() < 0.3:
+            new[i] = min(hi, max(lo, new[i] + rng.gauss(0, step_scale * (hi - lo))))
+    return new
+
+
+def advance_chain(args):
+    # Pool worker: run `steps` Metropolis steps of one chain at a fixed temperature.
+    # Acceptance draws come first, so a candidate run is aborted once it passes
+    # cost - T*ln(u), exactly as in optimize_parameters.
+    vector, cost, temperature, steps, step_scale, chain_seed, scenario, adaptive, eval_seed = args
+    rng = random.Random(chain_seed)
+    best_vector, best_cost = vector, cost
+    evaluations = 0
+    accepted = 0
+    for _ in range(steps):
+        candidate = propose(vector, rng, step_scale)
+        u = rng.random()
+        limit = cost - temperature * math.log(u) if u > 0 else float('inf')
+        new_cost = evaluate_candidates([(vector_to_params(candidate), limit)], scenario, adaptive,
+                                       eval_seed, _worker_cache)[0]
+        evaluations += 1
+        if new_cost < limit:
+            vector, cost = candidate, new_cost
+            accepted += 1
+            if cost < best_cost:
+                best_vector, best_cost = vector, cost
+    return vector, cost, best_vector, best_cost, evaluations, accepted
+
+
+def parallel_tempering(num_chains=None, t_min=1.0, t_max=500.0, exchange_interval=10, step_scale=0.1,
+                       max_evaluations=None, time_budget=None, scenario=TUNING_SCENARIO, adaptive=True,
+                       seed=0, eval_seed=EVAL_SEED, pool=None):
+    # One chain per core on a geometric temperature ladder. Between rounds of
+    # exchange_interval local steps, adjacent chains swap states with the usual
+    # Metropolis criterion. Stops when either budget (evaluation count or
+    # wall-clock seconds) is exhausted and returns the best params with a trace.
+    if max_evaluations is None and time_budget is None:
+        raise ValueError("parallel_tempering needs max_evaluations or time_budget")
+    num_chains = num_chains or os.cpu_count() or 1
+    own_pool = pool is None
+    if own_pool:
+        pool = Pool(num_chains)
+    try:
+        rng = random.Random(seed)
+        if num_chains > 1:
+            ratio = (t_max / t_min) ** (1 / (num_chains - 1))
+            temperatures = [t_min * ratio ** i for i in range(num_chains)]
+        else:
+            temperatures = [t_min]
+        start_vector = params_to_vector(default_params)
+        start_cost = evaluate_candidates([(default_params, None)], scenario, adaptive, eval_seed, {})[0]
+        states = [(start_vector, start_cost)] * num_chains
+        best_vector, best_cost = start_vector, start_cost
+        evaluations = 1
+        swaps_attempted = swaps_accepted = 0
+        trace = [{'round': 0, 'evaluations': evaluations, 'elapsed': 0.0, 'best_cost': best_cost,
+                  'chain_costs': [start_cost] * num_chains}]
+        started = time.perf_counter()
+        round_idx = 0
+
+        while True:
+            if max_evaluations is not None and evaluations >= max_evaluations:
+                break
+            if time_budget is not None and time.perf_counter() - started >= time_budget:
+                break
+            round_idx += 1
+            steps = exchange_interval
+            if max_evaluations is not None:
+                steps = max(1, min(steps, math.ceil((max_evaluations - evaluations) / num_chains)))
+            jobs = [(vector, cost, temperatures[c], steps, step_scale, f"{seed}:{c}:{round_idx}",
+                     scenario, adaptive, eval_seed) for c, (vector, cost) in enumerate(states)]
+            outcomes = pool.map(advance_chain, jobs)
+            states = []
+            for vector, cost, chain_best_vector, chain_best_cost, chain_evals, _ in outcomes:
+                states.append((vector, cost))
+                evaluations += chain_evals
+                if chain_best_cost < best_cost:
+                    best_vector, best_cost = chain_best_vector, chain_best_cost
+
+            # Replica exchange between neighbouring temperatures, alternating even/odd pairs
+            for i in range(round_idx % 2, num_chains - 1, 2):
+                swaps_attempted += 1
+                (_, cost_i), (_, cost_j) = states[i], states[i + 1]
+                delta = (cost_i - cost_j) * (1 / temperatures[i] - 1 / temperatures[i + 1])
+                if delta >= 0 or rng.random() < math.exp(delta):
+                    states[i], states[i + 1] = states[i + 1], states[i]
+                    swaps_accepted += 1
+
+            trace.append({'round': round_idx, 'evaluations': evaluations,
+                          'elapsed': time.perf_counter() - started, 'best_cost': best_cost,
+                          'chain_costs': [cost for _, cost in states]})
+
+        return {
+            'best_params': vector_to_params(best_vector),
+            'best_cost': best_cost,
+            'evaluations': evaluations,
+            'temperatures': temperatures,
+            'swap_acceptance': swaps_accepted / swaps_attempted if swaps_attempted else 0.0,
+            'trace': trace
+        }
+    finally:
+        if own_pool:
+            pool.close()
+            pool.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parallel tempering search over the dispatch preferences')
+    parser.add_argument('--chains', type=int, default=None, help='number of chains (default: one per core)')
+    parser.add_argument('--max-evals', type=int, default=None, help='evaluation budget')
+    parser.add_argument('--time-budget', type=float, default=None, help='wall-clock budget in seconds')
+    parser.add_argument('--scenario', default=TUNING_SCENARIO)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--trace', default=None, help='write the convergence trace to this JSON file')
+    args = parser.parse_args()
+    if args.max_evals is None and args.time_budget is None:
+        args.max_evals = 400
+
+    result = parallel_tempering(args.chains, max_evaluations=args.max_evals, time_budget=args.time_budget,
+                                scenario=args.scenario, seed=args.seed)
+    if args.trace:
+        with open(args.trace, 'w') as f:
+            json.dump(result['trace'], f)
+    print(json.dumps({k: v for k, v in result.items() if k != 'trace'}, indent=4))
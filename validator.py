@@ -0,0 +1,148 @@
+from bisect import bisect_left, bisect_right
+
+# JIT limits from the contest rules: a finished wafer may wait at most DWELL_LIMIT seconds in a
+# node before it is picked up, and the hand-off from pickup to placement in the next node (all
+# consecutive transport steps in between) may take at most TRANSFER_LIMIT seconds.
+DWELL_LIMIT = 15
+TRANSFER_LIMIT = 30
+MAX_RECORDS = 1000  # violations kept in full; all of them are still counted
+
+
+class ConstraintViolation(Exception):
+    # Raised by a fail-fast Validator; `violation` is the record that triggered it
+    def __init__(self, violation):
+        super().__init__(f"{violation['kind']} violation on {violation['unit']} at t={violation['time']}")
+        self.violation = violation
+
+
+class UnitIntervals:
+    # Occupancy intervals (start, end, owner, slot) of one unit, sorted by start. Engines add
+    # them in nearly increasing start order, so insertion is an append in the common case.
+    # Range queries only scan starts in [t1 - max_length, t2).
+    __slots__ = ('starts', 'intervals', 'max_length')
+
+    def __init__(self):
+        self.starts = []
+        self.intervals = []
+        self.max_length = 0
+
+    def add(self, start, end, owner, slot=None):
+        item = (start, end, owner, slot)
+        if not self.starts or start >= self.starts[-1]:
+            self.starts.append(start)
+            self.intervals.append(item)
+        else:
+            i = bisect_right(self.starts, start)
+            self.starts.insert(i, start)
+            self.intervals.insert(i, item)
+        if end - start > self.max_length:
+            self.max_length = end - start
+
+    def overlapping(self, t1, t2):
+        # Intervals with start < t2 and end > t1; t1 == t2 asks who occupies the unit at that instant
+        lo = bisect_right(self.starts, t1 - self.max_length)
+        hi = bisect_right(self.starts, t2) if t1 == t2 else bisect_left(self.starts, t2)
+        return [iv for iv in self.intervals[lo:hi] if iv[1] > t1]
+
+    def __len__(self):
+        return len(self.intervals)
+
+
+class Validator:
+    # Incremental constraint checker fed by the engines while they schedule:
+    #   step(wafer, unit, start, end, slot)  a wafer step; checks capacity, slot and JIT limits
+    #   occupy(unit, start, end, owner)      any other occupancy, e.g. a cleaning
+    # Units are integer IDs (names only appear in violation records). Violations are recorded
+    # as they happen; with fail_fast the first one raises ConstraintViolation instead.
+    def __init__(self, unit_names, unit_capacity, unit_transport, dwell_limit=DWELL_LIMIT,
+                 transfer_limit=TRANSFER_LIMIT, fail_fast=False, check_jit=True, max_records=MAX_RECORDS):
+        self.unit_names = tuple(unit_names)
+        self.unit_capacity = list(unit_capacity)
+        self.unit_transport = [bool(t) for t in unit_transport]
+        self.dwell_limit = dwell_limit
+        self.transfer_limit = transfer_limit
+        self.fail_fast = fail_fast
+        self.check_jit = check_jit
+        self.max_records = max_records
+        self.reset()
+
+    @classmethod
+    def from_recipe(cls, recipe, **kwargs):
+        return cls(recipe.unit_names, recipe.unit_slots, recipe.unit_transport, **kwargs)
+
+    def reset(self):
+        self.units = [UnitIntervals() for _ in self.unit_names]
+        self.wafer_state = {}  # wafer -> (end of last step, its unit, pickup time of the current hand-off)
+        self.violations = []
+        self.counts = {}
+
+    def _violation(self, kind, unit, time, **detail):
+        record = {'kind': kind, 'unit': self.unit_names[unit], 'time': time, **detail}
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        if len(self.violations) < self.max_records:
+            self.violations.append(record)
+        if self.fail_fast:
+            raise ConstraintViolation(record)
+
+    def occupy(self, unit, start, end, owner, slot=None):
+        intervals = self.units[unit]
+        capacity = self.unit_capacity[unit]
+        overlaps = intervals.overlapping(start, end) if len(intervals) else ()
+        if overlaps:
+            if slot is not None:
+                for other in overlaps:
+                    if other[3] == slot:
+                        self._violation('slot_overlap', unit, start, owner=owner, other=other[2], slot=slot,
+                                        interval=(start, end), other_interval=other[:2])
+                        break
+            if len(overlaps) >= capacity and self._peak(overlaps, start, end) + 1 > capacity:
+                self._violation('capacity', unit, start, owner=owner, capacity=capacity,
+                                occupants=[iv[2] for iv in overlaps], interval=(start, end))
+        intervals.add(start, end, owner, slot)
+
+    @staticmethod
+    def _peak(overlaps, start, end):
+        # Highest number of the given intervals running at once inside [start, end)
+        points = []
+        for s, e, _, _ in overlaps:
+            points.append((max(s, start), 1))
+            points.append((min(e, end), -1))
+        points.sort()
+        current = peak = 0
+        for _, delta in points:
+            current += delta
+            if current > peak:
+                peak = current
+        return peak
+
+    def step(self, wafer, unit, start, end, slot=None):
+        self.occupy(unit, start, end, wafer, slot)
+        if not self.check_jit:
+            return
+        transport = self.unit_transport[unit]
+        state = self.wafer_state.get(wafer)
+        pickup = None
+        if state is not None:
+            prev_end, prev_unit, pickup = state
+            prev_transport = self.unit_transport[prev_unit]
+            if not prev_transport:
+                wait = start - prev_end
+                if wait > self.dwell_limit:
+                    self._violation('dwell', prev_unit, prev_end, wafer=wafer, wait=wait, limit=self.dwell_limit)
+                pickup = start
+            elif not transport and pickup is not None:
+                transfer = start - pickup
+                if transfer > self.transfer_limit:
+                    self._violation('transfer', unit, pickup, wafer=wafer, duration=transfer,
+                                    limit=self.transfer_limit)
+        self.wafer_state[wafer] = (end, unit, pickup)
+
+    def occupants(self, unit, t1, t2=None):
+        # Who occupies `unit` (ID or name) between t1 and t2, or at instant t1
+        if isinstance(unit, str):
+            unit = self.unit_names.index(unit)
+        return self.units[unit].overlapping(t1, t1 if t2 is None else t2)
+
+    def report(self):
+        return {'violations': sum(self.counts.values()), 'by_kind': dict(self.counts),
+                'records': list(self.violations)}